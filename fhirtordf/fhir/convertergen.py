@@ -0,0 +1,267 @@
+"""
+Generate specialized FHIR JSON to RDF converter functions from a compiled FHIR metadata vocabulary (see FHIRSchema).
+
+One function is generated for each class reachable from a set of resource types.  The function walks the keys of a
+JSON object of its class, handing each one to a function generated for that property with the predicate URI, literal
+datatype and list handling baked in.  Keys that the class doesn't define are reported to FHIRResource.unknown_key.
+The generated functions are steps of the FHIRResource work stack walk: rather than calling each other, they append
+frames for nested objects to the frames list they are given, and everything else (extensions, references, code
+system arcs, open choice elements, contained resources) goes to the _expand_ methods of the FHIRResource they are
+invoked from.  The generated module is saved in the picklejar cache directory and is only used when it was generated
+from the vocabulary signature that is currently in effect.
+"""
+import hashlib
+import importlib.util
+import os
+import py_compile
+import re
+import uuid
+from typing import Dict, Optional, Tuple, Iterable, Callable, List, Set
+
+from rdflib import URIRef, XSD
+
+from fhirtordf.rdfsupport.namespaces import FHIR
+
+GENERATOR_VERSION = 8
+
+# The highest volume resource types
+DEFAULT_CONVERTER_TYPES = ('Observation', 'Encounter', 'Condition', 'MedicationRequest')
+
+# Predicates that need more than the generated code provides.  These are passed back to FHIRResource.add_val
+_GENERIC_PREDICATES = {FHIR.Narrative.div, FHIR.Bundle.entry}
+
+
+def converter_file_name(cache_directory: str, name: str) -> str:
+    """
+    Return the name of the generated converter module for vocabulary name in cache_directory
+    :param cache_directory: cache directory
+    :param name: file name or URI of the vocabulary
+    :return: module file name
+    """
+    return os.path.join(cache_directory, 'fhirconverters-' + hashlib.sha1(name.encode()).hexdigest()[:16] + '.py')
+
+
+class _Generator:
+    def __init__(self, schema: "FHIRSchema") -> None:
+        self.schema = schema
+        self.constants = dict()         # type: Dict[str, str]
+        self.functions = dict()         # type: Dict[URIRef, str]
+        self.resources = set()          # type: Set[URIRef]
+        self.lines = []                 # type: List[str]
+
+    def uri(self, uri: URIRef) -> str:
+        """ Return the name of the module level constant for uri """
+        name = self.constants.get(str(uri))
+        if name is None:
+            name = '_u{}'.format(len(self.constants))
+            self.constants[str(uri)] = name
+        return name
+
+    def is_generated(self, prop: "FHIRProperty") -> bool:
+        """ Determine whether the range of prop gets its own converter function """
+        return prop.range is not None and not prop.is_atom and not prop.is_primitive and \
+            prop.range not in (FHIR.Resource, FHIR.Element) and prop.predicate not in _GENERIC_PREDICATES
+
+    def datatype(self, t: Optional[URIRef], v: Optional[str] = None) -> str:
+        """
+        Return an expression for the datatype of a literal of type t -- the equivalent of
+        FHIRSchema.primitive_datatype_nostring(t, v)
+        :param t: FHIR type
+        :param v: expression for the value if dates are to be classified by shape
+        """
+        dt = self.schema.primitive_datatype(t) if t is not None else None
+        if dt is None or dt == XSD.string:
+            return 'None'
+        if dt == XSD.dateTime and v:
+            return '(date_datatype({v}) if {v} and FHIRMetaVocEntry.fhir_dates else {c})'.format(v=v, c=self.uri(dt))
+        if dt == XSD.anyURI:
+            return '(None if FHIRMetaVocEntry.fhir_oids else {})'.format(self.uri(dt))
+        return self.uri(dt)
+
+    def reachable(self, resource_types: Iterable[str]) -> None:
+        """ Assign a function name to every class reachable from resource_types """
+        todo = []
+        for resource_type in resource_types:
+            if not self.schema.has_type(FHIR[resource_type]):
+                raise ValueError("Unrecognized FHIR type: {}".format(resource_type))
+            todo.append(FHIR[resource_type])
+            self.resources.add(FHIR[resource_type])
+        while todo:
+            cls = todo.pop()
+            if cls not in self.functions:
+                self.functions[cls] = 'convert_' + re.sub(r'\W', '_', str(cls)[len(str(FHIR)):])
+                todo += [prop.range for prop in self.schema.properties(cls).values() if self.is_generated(prop)]
+
+    def emit(self, indent: int, line: str) -> None:
+        self.lines.append('    ' * indent + line)
+
+    def handler(self, cls: URIRef, k: str) -> str:
+        """ Return the name of the function that converts the value of key k in a JSON object of class cls """
+        return '_{}__{}'.format(self.functions[cls], re.sub(r'\W', '_', k))
+
+    def function(self, cls: URIRef) -> None:
+        fn = self.functions[cls]
+        properties = self.schema.properties(cls)
+        for k, prop in properties.items():
+            self.emit(0, '')
+            self.emit(0, '')
+            self.emit(0, 'def {}(frames, r, subj, val, d):'.format(self.handler(cls, k)))
+            self.property_value(prop)
+        self.emit(0, '')
+        self.emit(0, '')
+        self.emit(0, '_{}_keys = {{'.format(fn))
+        for k in properties:
+            self.emit(1, '{!r}: {},'.format(k, self.handler(cls, k)))
+        self.emit(0, '}')
+        self.emit(0, '')
+        self.emit(0, '')
+        self.emit(0, 'def {}(frames, r, subj, pred, val, root=False):'.format(fn))
+        self.emit(1, 'd = val if type(val) is dict else vars(val)')
+        self.emit(1, 'handlers = _{}_keys'.format(fn))
+        choices = self.schema.choice_properties(cls)
+        if choices:
+            self.emit(1, 'choices = r.schema.choice_properties({})'.format(self.uri(cls)))
+        self.emit(1, 'for k in d:')
+        self.emit(2, 'h = handlers.get(k)')
+        self.emit(2, 'if h is not None:')
+        self.emit(3, 'h(frames, r, subj, val, d)')
+        self.emit(2, "elif k[:1] == '_' and k[1:] in handlers:")
+        self.emit(3, 'if not root and k[1:] not in d:')
+        self.emit(4, 'prop = r.schema.properties({})[k[1:]]'.format(self.uri(cls)))
+        self.emit(4, 'frames.append((r._expand_extension_val, (subj, val, k[1:], prop.predicate)))')
+        if choices:
+            self.emit(2, 'elif k in choices:')
+            self.emit(3, 'prop = choices[k]')
+            self.emit(3, 'r._expand_val(frames, subj, prop.predicate, val, k, prop.range)')
+            self.emit(2, "elif not (k[:1] == '_' and k[1:] in choices):")
+        elif cls in self.resources:
+            # The resourceType of a resource, be it the root or a contained one, names its class
+            self.emit(2, "elif k != 'resourceType':")
+        else:
+            self.emit(2, 'else:')
+        self.emit(3, 'r.unknown_key({}, k)'.format(self.uri(cls)))
+        if self.schema.predicate_type(FHIR.CodeableConcept.coding) == cls:
+            self.emit(1, 'if pred == {}:'.format(self.uri(FHIR.CodeableConcept.coding)))
+            self.emit(2, 'r.add_type_arc(subj, val)')
+
+    def property_value(self, prop: "FHIRProperty") -> None:
+        k = prop.name
+        p = self.uri(prop.predicate)
+        if prop.range is None or prop.range in (FHIR.Resource, FHIR.Element) or \
+                prop.predicate in _GENERIC_PREDICATES:
+            self.emit(1, 'r._expand_val(frames, subj, {}, val, {!r}, None)'.format(p, k))
+            return
+        self.emit(1, 't = r.term_pool')
+        self.emit(1, 'raw = r.raw_literals')
+        self.emit(1, 'node = r.node')
+        self.emit(1, 'x = d[{!r}]'.format(k))
+        self.emit(1, 'if isinstance(x, list):')
+        self.emit(2, 'if r.stats is not None:')
+        self.emit(3, 'r.stats.lists += 1')
+        self.emit(2, 'for i, lv in enumerate(x):')
+        self.emit(3, 'e = node(subj, {}, i)'.format(p))
+        self.emit(3, 'r.add(e, {}, t.index(i))'.format(self.uri(FHIR.index)))
+        self.emit(3, 'if isinstance(lv, JSON_OBJECT_TYPES):')
+        if self.is_generated(prop):
+            self.emit(4, 'frames.append(({}, (r, e, {}, lv)))'.format(self.functions[prop.range], p))
+        else:
+            self.emit(4, 'frames.append((r._expand_value_node, (e, {}, lv, None)))'.format(p))
+        self.emit(3, 'else:')
+        self.emit(4, 'r.add(e, {0}, t.raw_literal(lv, {1}) if raw else t.literal(lv, {1}))'.
+                  format(self.uri(FHIR.value), self.datatype(prop.range)))
+        self.emit(3, 'r.add(subj, {}, e)'.format(p))
+        self.emit(1, 'else:')
+        if prop.is_atom:
+            self.emit(2, 'r.add(subj, {}, t.literal(x))'.format(p))
+            return
+        self.emit(2, 'b = node(subj, {})'.format(p))
+        if prop.is_primitive:
+            self.emit(2, 'r.add(b, {0}, t.raw_literal(x, {1}) if raw else t.literal(str(x), {1}))'.
+                      format(self.uri(FHIR.value), self.datatype(prop.range, 'x')))
+        elif self.is_generated(prop):
+            self.emit(2, 'if isinstance(x, JSON_OBJECT_TYPES):')
+            self.emit(3, 'frames.append(({}, (r, b, {}, x)))'.format(self.functions[prop.range], p))
+            self.emit(2, 'else:')
+            self.emit(3, 'frames.append((r._expand_value_node, (b, {}, x, None)))'.format(p))
+        else:
+            self.emit(2, 'frames.append((r._expand_value_node, (b, {}, x, None)))'.format(p))
+        self.emit(2, 'r.add(subj, {}, b)'.format(p))
+        if prop.predicate == FHIR.Reference.reference:
+            self.emit(2, 'r.add_reference(subj, x)')
+        elif prop.predicate == FHIR.RelatedArtifact.resource:
+            self.emit(2, 'r.add_reference(b, x)')
+        self.emit(2, 'if {!r} in d:'.format('_' + k))
+        self.emit(3, 'frames.append((r._expand_extension_val, (b, val, {!r}, None)))'.format(k))
+
+    def module(self, name: str, sig: Tuple) -> str:
+        for cls in sorted(self.functions):
+            self.function(cls)
+        footer = ['', '', 'CONVERTERS = {']
+        footer += ['    {}: {},'.format(self.uri(cls), self.functions[cls]) for cls in sorted(self.functions)]
+        footer.append('}')
+        header = ['"""',
+                  'FHIR JSON to RDF converters generated by fhirtordf.fhir.convertergen -- do not edit',
+                  '"""',
+                  'from rdflib import URIRef',
+                  '',
+                  'from fhirtordf.fhir.fhirmetavoc import FHIRMetaVocEntry, date_datatype',
+                  'from fhirtordf.loaders.jsondecoder import JSON_OBJECT_TYPES',
+                  '',
+                  'GENERATOR_VERSION = {!r}'.format(GENERATOR_VERSION),
+                  'VOCABULARY = {!r}'.format(name),
+                  'SIGNATURE = {!r}'.format(tuple(sig)),
+                  '']
+        header += ['{} = URIRef({!r})'.format(c, uri) for uri, c in self.constants.items()]
+        return '\n'.join(header + self.lines + footer) + '\n'
+
+
+def generate_converters(schema: "FHIRSchema", name: str, sig: Tuple,
+                        resource_types: Iterable[str] = DEFAULT_CONVERTER_TYPES) -> str:
+    """
+    Generate the source of a converter module
+    :param schema: compiled FHIR metadata vocabulary
+    :param name: name of the vocabulary
+    :param sig: signature of the vocabulary
+    :param resource_types: resource types to generate converters for.  Converters are also generated for every
+    class that can be reached from them
+    :return: python source
+    """
+    generator = _Generator(schema)
+    generator.reachable(resource_types)
+    return generator.module(name, sig)
+
+
+def save_converters(fname: str, source: str) -> None:
+    """
+    Write a converter module along with its byte code.  The byte code is validated against the source hash rather
+    than the modification time, as a module can be regenerated several times within the time stamp resolution.
+    :param fname: module file name
+    :param source: python source
+    """
+    tmp_fname = fname + '.' + str(uuid.uuid4())
+    with open(tmp_fname, 'w') as f:
+        f.write(source)
+    os.replace(tmp_fname, fname)
+    py_compile.compile(fname, doraise=True, invalidation_mode=py_compile.PycInvalidationMode.CHECKED_HASH)
+
+
+def load_converters(fname: str, name: str, sig: Tuple) -> Optional[Dict[URIRef, Callable]]:
+    """
+    Load a converter module
+    :param fname: module file name
+    :param name: name of the vocabulary
+    :param sig: current signature of the vocabulary
+    :return: map from class URI to converter function if the module exists and is current, else None
+    """
+    if not os.path.exists(fname):
+        return None
+    try:
+        spec = importlib.util.spec_from_file_location(os.path.splitext(os.path.basename(fname))[0], fname)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+    except (SyntaxError, ImportError, NameError):
+        return None
+    if getattr(module, 'GENERATOR_VERSION', None) != GENERATOR_VERSION or \
+            getattr(module, 'VOCABULARY', None) != name or getattr(module, 'SIGNATURE', None) != tuple(sig):
+        return None
+    return module.CONVERTERS
@@ -1,12 +1,28 @@
 """
 FHIR Metadata Vocabulary -- a representation for the metadata about a FHIR class URI.
 """
-from typing import Union, Dict, Optional
+import os
+import weakref
+from typing import Union, Dict, Optional, NamedTuple, List, Set, Tuple, Callable, Iterable
 from rdflib import Graph, URIRef, RDFS, RDF, OWL, XSD
 
+from fhirtordf.fhir.convertergen import converter_file_name, load_converters, save_converters, generate_converters, \
+    DEFAULT_CONVERTER_TYPES
+from fhirtordf.fhir.schemaimage import image_file_name, load_schema_image, save_schema_image, SchemaImage
 from fhirtordf.fhir.signature import signature
 from fhirtordf.rdfsupport.namespaces import FHIR, W5
-from fhirtordf.fhir.picklejar import picklejar
+from fhirtordf.rdfsupport.referenceparser import ReferenceParser
+from fhirtordf.fhir.picklejar import picklejarfactory
+
+
+def date_datatype(v: str) -> URIRef:
+    """
+    Classify a FHIR date, dateTime or instant value by its shape
+    :param v: lexical value
+    :return: XSD.gYear, XSD.gYearMonth, XSD.date or XSD.dateTime
+    """
+    return XSD.gYear if len(v) == 4 else XSD.gYearMonth if len(v) == 7 \
+        else XSD.date if (len(v) == 10 or (len(v) > 10 and v[10] in '+-')) else XSD.dateTime
 
 
 class FHIRMetaVocEntry:
@@ -20,13 +36,15 @@ class FHIRMetaVocEntry:
     """
     FHIR metadata vocbulary for a given subject
     """
-    def __init__(self, ontology: Graph, subject: Union[str, URIRef]):
+    def __init__(self, ontology: Union[Graph, "FHIRSchema"], subject: Union[str, URIRef]):
         """
         Represent FHIR metadata for subject
-        :param ontology: FHIR "ontology" (fhir.ttl)
+        :param ontology: FHIR "ontology" (fhir.ttl) or its compiled schema.  A schema answers every question with
+        dictionary lookups, so fhir.ttl doesn't have to be parsed
         :param subject: name or URI of subject in ontology
         """
-        self._o = ontology
+        self._schema = ontology if isinstance(ontology, FHIRSchema) else None
+        self._o = ontology if self._schema is None else None
         self._subj = subject if isinstance(subject, URIRef) else URIRef(FHIR[subject])
 
     @staticmethod
@@ -42,16 +60,13 @@ class FHIRMetaVocEntry:
 
     def predicates(self) -> Dict[str, URIRef]:
         """
-        Return the tag names and corresponding URI's for all properties that can be associated with subject
+        Return the tag names and corresponding URI's for all properties that can be associated with subject.  The
+        inheritance-flattened map is memoized in the compiled schema for the ontology, and is shared with every other
+        entry and FHIRResource using the same ontology, so it must not be modified.
         :return: Map from tag name (JSON object identifier) to corresponding URI
         """
-        rval = dict()
-        for parent in self._o.objects(self._subj, RDFS.subClassOf):
-            if isinstance(parent, URIRef) and not str(parent).startswith(str(W5)):
-                rval.update(**FHIRMetaVocEntry(self._o, parent).predicates())
-        for s in self._o.subjects(RDFS.domain, self._subj):
-            rval[self._to_str(s)] = s
-        return rval
+        schema = self._schema if self._schema is not None else FHIRSchema.for_vocabulary(self._o)
+        return schema.predicates(self._subj)
 
     def predicate_type(self, pred: URIRef) -> URIRef:
         """
@@ -59,9 +74,13 @@ class FHIRMetaVocEntry:
         :param pred: predicate to map
         :return:
         """
+        if self._schema is not None:
+            return self._schema.predicate_type(pred)
         return self._o.value(pred, RDFS.range)
 
     def has_type(self, t: URIRef) -> bool:
+        if self._schema is not None:
+            return self._schema.has_type(t)
         return (t, None, None) in self._o
 
     def is_valid(self, t: URIRef) -> bool:
@@ -79,6 +98,8 @@ class FHIRMetaVocEntry:
         :param t: type to test
         :return:
         """
+        if self._schema is not None:
+            return self._schema.is_primitive(t)
         return FHIR.Primitive in self._o.objects(t, RDFS.subClassOf)
 
     def value_predicate_to_type(self, value_pred: str) -> URIRef:
@@ -106,6 +127,8 @@ class FHIRMetaVocEntry:
         :param pred: type to test
         :return:
         """
+        if self._schema is not None:
+            return self._schema.is_atom(pred)
         if not self.has_type(pred):
             if '.value' in str(pred):               # synthetic values (valueString, valueDate, ...)
                 return False
@@ -119,6 +142,8 @@ class FHIRMetaVocEntry:
         :param t: type
         :return: corresponding data type
         """
+        if self._schema is not None:
+            return self._schema.primitive_datatype(t)
         for sco in self._o.objects(t, RDFS.subClassOf):
             sco_type = self._o.value(sco, RDF.type)
             sco_prop = self._o.value(sco, OWL.onProperty)
@@ -140,32 +165,528 @@ class FHIRMetaVocEntry:
         """
         vt = self.primitive_datatype(t)
         if self.fhir_dates and vt == XSD.dateTime and v:
-            return XSD.gYear if len(v) == 4 else XSD.gYearMonth if len(v) == 7 \
-                else XSD.date if (len(v) == 10 or (len(v) > 10 and v[10] in '+-')) else XSD.dateTime
+            return date_datatype(v)
         # For some reason the oid datatype is represented as a string as well
         if self.fhir_oids and vt == XSD.anyURI:
             vt = None
         return None if vt == XSD.string else vt
 
 
+class CacheInfo(NamedTuple):
+    """ Predicate map cache statistics """
+    hits: int
+    misses: int
+    currsize: int
+
+
+class FHIRProperty(NamedTuple):
+    """ Compiled metadata for a property that can appear on a FHIR class """
+    name: str                           # JSON tag name (e.g. "status")
+    predicate: URIRef                   # Corresponding RDF predicate (e.g. fhir:Account.status)
+    range: Optional[URIRef]             # rdfs:range of predicate
+    is_atom: bool                       # Predicate doesn't use the FHIR value representation
+    is_primitive: bool                  # Range is a FHIR primitive type
+    datatype: Optional[URIRef]          # XSD datatype of range if primitive
+
+
+class FHIRSchema:
+    """
+    A compiled image of the FHIR metadata vocabulary.  The vocabulary graph is scanned once and reduced to a set of
+    dictionaries, so the questions FHIRMetaVocEntry answers with rdflib queries become dictionary lookups.
+
+    Inheritance-flattened predicate maps are memoized per class on first use.  Statistics on their use are available
+    through cache_info()
+
+    converters, if present, maps class URI's to generated converter functions (see convertergen)
+    """
+    _schemas = weakref.WeakKeyDictionary()  # type: weakref.WeakKeyDictionary[Graph, FHIRSchema]
+    compilations = 0                    # Number of vocabulary graphs compiled by for_vocabulary
+
+    def __init__(self, ontology: Optional[Graph] = None):
+        """
+        Compile ontology
+        :param ontology: FHIR "ontology" (fhir.ttl).  If absent, the tables are filled in from a saved image
+        """
+        self._declared = dict()         # type: Dict[URIRef, Dict[str, URIRef]]
+        self._parents = dict()          # type: Dict[URIRef, List[URIRef]]
+        self._ranges = dict()           # type: Dict[URIRef, URIRef]
+        self._atoms = {FHIR.nodeRole}   # type: Set[URIRef]
+        self._primitives = set()        # type: Set[URIRef]
+        self._datatypes = dict()        # type: Dict[URIRef, URIRef]
+        self._types = set()             # type: Set[URIRef]
+        self._date_types = None         # type: Optional[Set[URIRef]]
+        self._value_datatypes = None    # type: Optional[Tuple[Dict[URIRef, URIRef], Dict[URIRef, URIRef]]]
+        self._predicate_maps = dict()   # type: Dict[URIRef, Dict[str, URIRef]]
+        self._properties = dict()       # type: Dict[URIRef, Dict[str, FHIRProperty]]
+        self._choice_types = None       # type: Optional[Dict[str, URIRef]]
+        self._reference_parser = None   # type: Optional[ReferenceParser]
+        self._choices = dict()          # type: Dict[URIRef, Dict[str, FHIRProperty]]
+        self._choice_ranges = dict()    # type: Dict[URIRef, URIRef]
+        self.converters = None          # type: Optional[Dict[URIRef, Callable]]
+        self._shard_classes = dict()    # type: Dict[str, str]
+        self._image = None              # type: Optional[SchemaImage]
+        self._pending = set()           # type: Set[str]
+        self._hits = 0
+        self._misses = 0
+        if ontology is not None:
+            self._compile(ontology)
+
+    @classmethod
+    def for_vocabulary(cls, vocabulary: Union[Graph, "FHIRSchema", "FHIRMetaVoc"]) -> "FHIRSchema":
+        """
+        Return the compiled schema for vocabulary.  Schemas are remembered per graph, so conversions that move back
+        and forth between several vocabularies only compile each of them once.  A schema, along with its memoized
+        predicate maps, is forgotten when its graph goes away
+        :param vocabulary: FHIR metadata vocabulary graph, FHIRMetaVoc or already compiled schema
+        :return: compiled schema
+        """
+        if isinstance(vocabulary, FHIRSchema):
+            return vocabulary
+        if isinstance(vocabulary, FHIRMetaVoc):
+            return vocabulary.schema
+        schema = FHIRSchema._schemas.get(vocabulary)
+        if schema is None:
+            FHIRSchema.compilations += 1
+            schema = FHIRSchema._schemas[vocabulary] = FHIRSchema(vocabulary)
+        return schema
+
+    @staticmethod
+    def clear_cache() -> None:
+        """ Forget every compiled vocabulary """
+        FHIRSchema._schemas.clear()
+
+    def _compile(self, o: Graph) -> None:
+        for s in o.subjects():
+            if isinstance(s, URIRef):
+                self._types.add(s)
+        # Iterate by domain so tag collisions (which exist in some vocabularies) resolve the way FHIRMetaVocEntry does
+        for cls in set(o.objects(None, RDFS.domain)):
+            self._declared[cls] = {FHIRMetaVocEntry._to_str(s): s for s in o.subjects(RDFS.domain, cls)}
+        for s, parent in o.subject_objects(RDFS.subClassOf):
+            if isinstance(parent, URIRef):
+                self._parents.setdefault(s, list())
+                if not str(parent).startswith(str(W5)):
+                    self._parents[s].append(parent)
+                if parent == FHIR.Primitive:
+                    self._primitives.add(s)
+        for s, r in o.subject_objects(RDFS.range):
+            self._ranges.setdefault(s, r)
+        self._atoms.update(o.subjects(RDF.type, OWL.DatatypeProperty))
+        for restriction in o.subjects(OWL.onProperty, FHIR.value):
+            for t in o.subjects(RDFS.subClassOf, restriction):
+                if isinstance(t, URIRef) and t not in self._datatypes:
+                    dt = FHIRMetaVocEntry(o, t).primitive_datatype(t)
+                    if dt is not None:
+                        self._datatypes[t] = dt
+
+    def image_tables(self) -> Tuple[Tuple, Dict[str, Tuple]]:
+        """
+        Return the compiled tables in marshallable form, split into the core tables and a shard for each resource
+        type.  A shard holds the classes whose properties all belong to the resource (the resource itself and its
+        components) along with those properties.  Everything else, including the full list of classes, is core.
+        :return: core tables and shard tables for save_schema_image
+        """
+        self._load_all_shards()
+        fhir = str(FHIR)
+        resources = {str(c)[len(fhir):] for c in self._declared
+                     if str(c).startswith(fhir) and c not in (FHIR.Resource, FHIR.DomainResource) and
+                     FHIR.Resource in self._ancestors(c)}
+        shard_classes = dict()          # type: Dict[str, str]
+        for cls, preds in self._declared.items():
+            prefixes = {str(p)[len(fhir):].split('.', 1)[0] for p in preds.values() if str(p).startswith(fhir)}
+            if str(cls).startswith(fhir) and len(prefixes) == 1 and prefixes <= resources:
+                shard_classes[str(cls)[len(fhir):]] = prefixes.pop()
+
+        def class_shard(cls: URIRef) -> Optional[str]:
+            return shard_classes.get(str(cls)[len(fhir):]) if str(cls).startswith(fhir) else None
+
+        def predicate_shard(pred: URIRef) -> Optional[str]:
+            name = str(pred)[len(fhir):] if str(pred).startswith(fhir) else ''
+            return shard_classes.get(name.split('.', 1)[0]) if '.' in name else None
+
+        tables = {None: ({}, {}, {}, set(), set(), {}, set())}
+        for shard in set(shard_classes.values()):
+            tables[shard] = ({}, {}, {}, set(), set(), {}, set())
+        for cls, preds in self._declared.items():
+            tables[class_shard(cls)][0][cls] = preds
+        for cls, parents in self._parents.items():
+            tables[class_shard(cls)][1][cls] = parents
+        for pred, r in self._ranges.items():
+            tables[predicate_shard(pred)][2][pred] = r
+        for pred in self._atoms:
+            tables[predicate_shard(pred)][3].add(pred)
+        tables[None][4].update(self._primitives)
+        tables[None][5].update(self._datatypes)
+        for t in self._types:
+            tables[predicate_shard(t)][6].add(t)
+        core = self._encode(*tables.pop(None), shard_classes)
+        return core, {shard: self._encode(*shard_tables, {}) for shard, shard_tables in tables.items()}
+
+    @staticmethod
+    def _encode(declared: Dict[URIRef, Dict[str, URIRef]], parents: Dict[URIRef, List[URIRef]],
+                ranges: Dict[URIRef, URIRef], atoms: Set[URIRef], primitives: Set[URIRef],
+                datatypes: Dict[URIRef, URIRef], types: Set[URIRef], shard_classes: Dict[str, str]) -> Tuple:
+        """ Replace every URI with its index in a string table that comes last in the returned tuple """
+        strings = dict()            # type: Dict[str, int]
+
+        def ix(uri: URIRef) -> int:
+            return strings.setdefault(str(uri), len(strings))
+
+        tables = ([(ix(cls), [(k, ix(p)) for k, p in preds.items()]) for cls, preds in declared.items()],
+                  [(ix(s), [ix(p) for p in ps]) for s, ps in parents.items()],
+                  [(ix(p), ix(r)) for p, r in ranges.items()],
+                  [ix(a) for a in atoms],
+                  [ix(t) for t in primitives],
+                  [(ix(t), ix(dt)) for t, dt in datatypes.items()],
+                  [ix(t) for t in types],
+                  shard_classes)
+        return tables + (list(strings),)
+
+    def _merge(self, tables: Tuple) -> None:
+        """ Add the output of _encode to the compiled tables """
+        declared, parents, ranges, atoms, primitives, datatypes, types, shard_classes, strings = tables
+        uris = [URIRef(s) for s in strings]
+        self._declared.update((uris[c], {k: uris[p] for k, p in preds}) for c, preds in declared)
+        self._parents.update((uris[s], [uris[p] for p in ps]) for s, ps in parents)
+        self._ranges.update((uris[p], uris[r]) for p, r in ranges)
+        self._atoms.update(uris[a] for a in atoms)
+        self._primitives.update(uris[t] for t in primitives)
+        self._datatypes.update((uris[t], uris[dt]) for t, dt in datatypes)
+        self._types.update(uris[t] for t in types)
+        self._shard_classes.update(shard_classes)
+
+    @classmethod
+    def from_image(cls, image: SchemaImage, lazy: bool = False) -> "FHIRSchema":
+        """
+        Construct a schema from a saved image
+        :param image: open image
+        :param lazy: True means only load the core tables now and load the shard for a resource type the first time
+        the type, its components or its properties are looked up.  False means load everything and close the image
+        :return: schema
+        """
+        schema = cls()
+        schema._merge(image.tables)
+        if lazy and image.shards:
+            schema._image = image
+            schema._pending = set(image.shards)
+        else:
+            for shard in image.shards:
+                schema._merge(image.shard(shard))
+            image.close()
+        return schema
+
+    @property
+    def pending_shards(self) -> List[str]:
+        """ Resource types whose definitions haven't been loaded from the image yet """
+        return sorted(self._pending)
+
+    def _load_shard(self, uri: URIRef) -> bool:
+        """
+        Load the shard that uri belongs to if it hasn't been loaded yet
+        :param uri: class or predicate URI
+        :return: True if a shard was loaded
+        """
+        name = str(uri)[len(str(FHIR)):] if str(uri).startswith(str(FHIR)) else ''
+        shard = self._shard_classes.get(name.split('.', 1)[0])
+        if shard not in self._pending:
+            return False
+        self._pending.remove(shard)
+        self._merge(self._image.shard(shard))
+        if not self._pending:
+            self._image.close()
+            self._image = None
+        return True
+
+    def _load_all_shards(self) -> None:
+        if self._image is not None:
+            for shard in self.pending_shards:
+                self._merge(self._image.shard(shard))
+            self._pending.clear()
+            self._image.close()
+            self._image = None
+
+    def _has_type(self, t: URIRef) -> bool:
+        return t in self._types or (self._image is not None and self._load_shard(t) and t in self._types)
+
+    def _ancestors(self, subj: URIRef) -> Set[URIRef]:
+        rval = set()
+        for parent in self._parents.get(subj, []):
+            if parent not in rval:
+                rval.add(parent)
+                rval.update(self._ancestors(parent))
+        return rval
+
+    def share_uris(self, uris: Dict[URIRef, URIRef]) -> None:
+        """
+        Replace the URI's in the compiled tables with the instances in uris, adding any that aren't there yet.
+        Schemas for several FHIR releases that share one uris map hold a single copy of their common URI's
+        :param uris: map from URI to its shared instance
+        """
+        self._load_all_shards()
+
+        def u(uri: URIRef) -> URIRef:
+            return uris.setdefault(uri, uri)
+
+        self._declared = {u(c): {k: u(p) for k, p in preds.items()} for c, preds in self._declared.items()}
+        self._parents = {u(s): [u(p) for p in ps] for s, ps in self._parents.items()}
+        self._ranges = {u(p): u(r) for p, r in self._ranges.items()}
+        self._atoms = {u(a) for a in self._atoms}
+        self._primitives = {u(t) for t in self._primitives}
+        self._datatypes = {u(t): u(dt) for t, dt in self._datatypes.items()}
+        self._types = {u(t) for t in self._types}
+        self._date_types = self._value_datatypes = self._choice_types = None
+        self._predicate_maps.clear()
+        self._properties.clear()
+        self._choices.clear()
+        self._choice_ranges.clear()
+
+    def _flattened(self, subj: URIRef) -> Dict[str, URIRef]:
+        rval = self._predicate_maps.get(subj)
+        if rval is None:
+            if self._image is not None:
+                self._load_shard(subj)
+            rval = dict()
+            for parent in self._parents.get(subj, []):
+                rval.update(self._flattened(parent))
+            rval.update(self._declared.get(subj, {}))
+            self._predicate_maps[subj] = rval
+        return rval
+
+    @property
+    def resource_types(self) -> Set[str]:
+        """ Names of the (concrete) resource types in the vocabulary """
+        fhir = str(FHIR)
+        rval = {str(c)[len(fhir):] for c in self._parents
+                if str(c).startswith(fhir) and c not in (FHIR.Resource, FHIR.DomainResource) and
+                FHIR.Resource in self._ancestors(c)}
+        rval.update(self._pending)          # Shards are named for their resource type
+        return rval
+
+    @property
+    def reference_parser(self) -> ReferenceParser:
+        """ Parser for references to the resource types in the vocabulary """
+        if self._reference_parser is None:
+            self._reference_parser = ReferenceParser(self.resource_types)
+        return self._reference_parser
+
+    def cache_info(self) -> CacheInfo:
+        """ Return hit and miss counts for predicates() and properties() and the number of classes compiled """
+        return CacheInfo(self._hits, self._misses, len(self._properties))
+
+    def properties(self, subj: URIRef) -> Dict[str, FHIRProperty]:
+        """
+        Return the tag names and corresponding property descriptions for all properties that can be associated with
+        subj, including inherited ones.  The returned map is shared and must not be modified.
+        :param subj: class URI
+        :return: Map from tag name to compiled property
+        """
+        rval = self._properties.get(subj)
+        if rval is None:
+            self._misses += 1
+            rval = dict()
+            for k, p in self._flattened(subj).items():
+                r = self._ranges.get(p)
+                rval[k] = FHIRProperty(k, p, r, self.is_atom(p), r in self._primitives, self._datatypes.get(r))
+            self._properties[subj] = rval
+        else:
+            self._hits += 1
+        return rval
+
+    def choice_properties(self, subj: URIRef) -> Dict[str, FHIRProperty]:
+        """
+        Return an index of the concrete JSON keys of the open choice elements (value[x] style properties whose range
+        is fhir:Element) of subj.  Choice elements with a fixed set of types are declared individually in the
+        vocabulary and already appear in properties().  The returned map is shared and must not be modified.
+        :param subj: class URI
+        :return: Map from concrete JSON key (e.g. valueQuantity) to the property it is emitted as
+        """
+        rval = self._choices.get(subj)
+        if rval is None:
+            rval = dict()
+            for k, prop in self.properties(subj).items():
+                if prop.range == FHIR.Element:
+                    for type_name, t in self._choice_type_names().items():
+                        p = URIRef(str(prop.predicate) + type_name)
+                        self._choice_ranges[p] = t
+                        rval[k + type_name] = \
+                            FHIRProperty(k + type_name, p, t, False, t in self._primitives, self._datatypes.get(t))
+            self._choices[subj] = rval
+        return rval
+
+    def _choice_type_names(self) -> Dict[str, URIRef]:
+        """
+        Return the map from the type part of a choice key ('Quantity', 'String', ...) to the corresponding FHIR
+        type.  As in value_predicate_to_type, a type whose name matches exactly takes precedence over a primitive.
+        """
+        if self._choice_types is None:
+            self._choice_types = dict()
+            names = sorted(str(t)[len(str(FHIR)):] for t in self._types
+                           if str(t).startswith(str(FHIR)) and '.' not in str(t)[len(str(FHIR)):])
+            for name in names:
+                if name and name[0].isupper():
+                    self._choice_types[name] = FHIR[name]
+            for name in names:
+                if name and name[0].islower():
+                    self._choice_types.setdefault(name[0].upper() + name[1:], FHIR[name])
+        return self._choice_types
+
+    def predicates(self, subj: URIRef) -> Dict[str, URIRef]:
+        """
+        Return the tag names and corresponding URI's for all properties that can be associated with subj.  The
+        returned map is shared and must not be modified.
+        :param subj: class URI
+        :return: Map from tag name (JSON object identifier) to corresponding URI
+        """
+        if subj in self._predicate_maps:
+            self._hits += 1
+        else:
+            self._misses += 1
+        return self._flattened(subj)
+
+    def predicate_type(self, pred: URIRef) -> Optional[URIRef]:
+        """
+        Return the type (range) of pred
+        :param pred: predicate to map
+        :return: range if known
+        """
+        rval = self._ranges.get(pred)
+        if rval is None and self._image is not None and self._load_shard(pred):
+            rval = self._ranges.get(pred)
+        return rval or self._choice_ranges.get(pred)
+
+    def has_type(self, t: URIRef) -> bool:
+        return self._has_type(t)
+
+    def is_valid(self, t: URIRef) -> bool:
+        if not self._has_type(t):
+            raise TypeError("Unrecognized FHIR type: {}".format(t))
+        return True
+
+    def is_primitive(self, t: URIRef) -> bool:
+        return t in self._primitives
+
+    def is_atom(self, pred: URIRef) -> bool:
+        """
+        Determine whether predicate is an 'atomic' type -- i.e it doesn't use a FHIR value representation
+        :param pred: type to test
+        :return:
+        """
+        if not self._has_type(pred):
+            if pred in self._choice_ranges or '.value' in str(pred):    # synthetic values (valueString, ...)
+                return False
+            else:
+                raise TypeError("Unrecognized FHIR predicate: {}".format(pred))
+        return pred in self._atoms
+
+    def value_predicate_to_type(self, value_pred: str) -> URIRef:
+        if value_pred.startswith('value'):
+            vp_datatype = value_pred.replace('value', '')
+            if vp_datatype:
+                if FHIR[vp_datatype] in self._types:
+                    return FHIR[vp_datatype]
+                else:
+                    vp_datatype = vp_datatype[0].lower() + vp_datatype[1:]
+                    if FHIR[vp_datatype] in self._types:
+                        return FHIR[vp_datatype]
+        if self.is_valid(FHIR[value_pred]):
+            return FHIR[value_pred]
+
+    def primitive_datatype(self, t: URIRef) -> Optional[URIRef]:
+        return self._datatypes.get(t)
+
+    def primitive_datatype_nostring(self, t: URIRef, v: Optional[str] = None) -> Optional[URIRef]:
+        """
+        Return the data type for primitive type t, if any, defaulting string to no type.  Honors the
+        FHIRMetaVocEntry fhir_dates and fhir_oids switches
+        :param t: type
+        :param v: value - for munging dates if we're doing FHIR official output
+        :return: corresponding data type
+        """
+        if self._value_datatypes is None:
+            self._build_value_datatypes()
+        if v and t in self._date_types and FHIRMetaVocEntry.fhir_dates:
+            return date_datatype(v)
+        return self._value_datatypes[FHIRMetaVocEntry.fhir_oids].get(t)
+
+    def _build_value_datatypes(self) -> None:
+        """
+        Precompute the literal datatype for every primitive type -- strings don't carry a datatype and, if fhir_oids
+        is set, neither do URI's.  The first table applies when fhir_oids is False, the second when it is True.
+        """
+        with_uris = {t: dt for t, dt in self._datatypes.items() if dt != XSD.string}
+        self._value_datatypes = (with_uris, {t: dt for t, dt in with_uris.items() if dt != XSD.anyURI})
+        self._date_types = {t for t, dt in self._datatypes.items() if dt == XSD.dateTime}
+
+
 class FHIRMetaVoc:
 
-    def __init__(self, mv_file_loc: str="http://hl7.org/FHIR/fhir.ttl", fmt: str="turtle", cache_mv_file=True):
+    def __init__(self, mv_file_loc: str="http://hl7.org/FHIR/fhir.ttl", fmt: str="turtle", cache_mv_file=True,
+                 lazy_load: bool=False):
         """
-        Load a FHIR Metadata Vocabulary image
+        Load a FHIR Metadata Vocabulary image.  When caching is enabled, the compiled schema is saved as a memory
+        mapped image in the picklejar cache directory and fhir.ttl itself is only parsed when its signature changes
+        or the graph is explicitly requested
         :param mv_file_loc: file name or URI of fhir.ttl image
         :param fmt: format of image
         :param cache_mv_file: True means cache an image in ~/.cache/.  False means no cache
+        :param lazy_load: True means that, when the schema comes from the cache, the definitions specific to a
+        resource type are only loaded the first time that resource type is encountered
         """
-        self.g = picklejar().get(mv_file_loc, signature(mv_file_loc)) if cache_mv_file else None
-        if not self.g:
-            self.from_cache = False
-            self.g = Graph()
-            self.g.load(mv_file_loc, format=fmt)
-            if cache_mv_file:
-                picklejar().add(mv_file_loc, signature(mv_file_loc), self.g)
-        else:
-            self.from_cache = True
+        self._mv_file_loc = mv_file_loc
+        self._fmt = fmt
+        self._g = None              # type: Optional[Graph]
+        self._schema = None         # type: Optional[FHIRSchema]
+        self._sig = sig = signature(mv_file_loc) if cache_mv_file else None
+        self._cache_directory = cache_directory = picklejarfactory.cache_directory
+        image_fname = image_file_name(cache_directory, mv_file_loc) \
+            if sig is not None and cache_directory is not None else None
+        if image_fname:
+            image = load_schema_image(image_fname, mv_file_loc, sig)
+            if image is not None:
+                self._schema = FHIRSchema.from_image(image, lazy_load)
+        self.from_cache = self._schema is not None
+        if not self.from_cache:
+            self._schema = FHIRSchema.for_vocabulary(self.g)
+            if image_fname:
+                os.makedirs(cache_directory, exist_ok=True)
+                save_schema_image(image_fname, mv_file_loc, sig, *self._schema.image_tables())
+        if image_fname:
+            self._schema.converters = \
+                load_converters(converter_file_name(cache_directory, mv_file_loc), mv_file_loc, sig)
+
+    @property
+    def g(self) -> Graph:
+        """ The vocabulary graph.  Parsed on first use if the schema came from the cache """
+        if self._g is None:
+            self._g = Graph()
+            self._g.load(self._mv_file_loc, format=self._fmt)
+        return self._g
+
+    @property
+    def schema(self) -> FHIRSchema:
+        """ Compiled image of the vocabulary """
+        return self._schema
+
+    def generate_converters(self, resource_types: Iterable[str] = DEFAULT_CONVERTER_TYPES) -> str:
+        """
+        Generate specialized converter functions for resource_types and the classes they use, save them in the cache
+        directory and attach them to the schema.  From then on, the converters are loaded along with the schema until
+        the vocabulary changes.
+        :param resource_types: resource types to generate converters for
+        :return: name of the generated module
+        """
+        if self._sig is None or self._cache_directory is None:
+            raise ValueError("Converters can only be generated for a cached vocabulary")
+        fname = converter_file_name(self._cache_directory, self._mv_file_loc)
+        os.makedirs(self._cache_directory, exist_ok=True)
+        save_converters(fname, generate_converters(self._schema, self._mv_file_loc, self._sig, resource_types))
+        self._schema.converters = load_converters(fname, self._mv_file_loc, self._sig)
+        return fname
 
     def entry_for(self, subject: Union[str, URIRef]) -> FHIRMetaVocEntry:
-        return FHIRMetaVocEntry(self.g, subject)
+        """
+        Return the metadata for subject.  The entry is backed by the compiled schema, so fhir.ttl isn't parsed
+        :param subject: name or URI of a FHIR class
+        :return: metadata entry
+        """
+        return FHIRMetaVocEntry(self.schema, subject)
@@ -0,0 +1,130 @@
+"""
+Compact on-disk image of a compiled FHIR metadata vocabulary (see FHIRSchema).
+
+Layout:
+    IMAGE_MAGIC | version, header length (struct '<HI') | header (marshal) | core tables (marshal) | shards (marshal)
+
+The header carries the name and signature of the vocabulary the image was compiled from, the length of the core
+tables and the offset and length of each shard.  The core tables hold the datatypes and everything shared between
+resource types, each shard holds the definitions that are specific to one resource type.  The image is memory mapped
+when it is read and shards are only unmarshalled when they are asked for.  An image whose version or signature
+doesn't match is ignored.
+"""
+import hashlib
+import marshal
+import mmap
+import os
+import struct
+import uuid
+from typing import Optional, Tuple, Dict, List
+
+IMAGE_MAGIC = b'FHIRSCHM'
+IMAGE_VERSION = 2
+
+_prefix = struct.Struct('<HI')
+
+
+def image_file_name(cache_directory: str, name: str) -> str:
+    """
+    Return the name of the image file for vocabulary name in cache_directory
+    :param cache_directory: cache directory
+    :param name: file name or URI of the vocabulary
+    :return: image file name
+    """
+    return os.path.join(cache_directory, 'fhirschema-' + hashlib.sha1(name.encode()).hexdigest()[:16] + '.img')
+
+
+def save_schema_image(fname: str, name: str, sig: Tuple, tables: Tuple, shards: Optional[Dict[str, Tuple]]=None) \
+        -> None:
+    """
+    Write an image file
+    :param fname: image file name
+    :param name: name of the vocabulary
+    :param sig: signature of the vocabulary
+    :param tables: compiled core tables (marshallable)
+    :param shards: compiled tables for each shard (marshallable)
+    """
+    core = marshal.dumps(tables)
+    shard_images = [(shard, marshal.dumps(shard_tables)) for shard, shard_tables in (shards or {}).items()]
+    index = dict()
+    offset = 0
+    for shard, image in shard_images:
+        index[shard] = (offset, len(image))
+        offset += len(image)
+    header = marshal.dumps((name, tuple(sig), len(core), index))
+    tmp_fname = fname + '.' + str(uuid.uuid4())
+    with open(tmp_fname, 'wb') as f:
+        f.write(IMAGE_MAGIC)
+        f.write(_prefix.pack(IMAGE_VERSION, len(header)))
+        f.write(header)
+        f.write(core)
+        for _, image in shard_images:
+            f.write(image)
+    os.replace(tmp_fname, fname)
+
+
+class SchemaImage:
+    """ An open image file.  The core tables are read when the image is opened, shards when they are requested """
+    def __init__(self, mm: mmap.mmap, base: int, tables: Tuple, index: Dict[str, Tuple[int, int]]) -> None:
+        self._mm = mm
+        self._base = base
+        self._index = index
+        self.tables = tables
+
+    @property
+    def shards(self) -> List[str]:
+        return list(self._index.keys())
+
+    def shard(self, name: str) -> Tuple:
+        """
+        Read the tables for shard name
+        :param name: shard name
+        :return: compiled tables for shard
+        """
+        offset, length = self._index[name]
+        start = self._base + offset
+        with memoryview(self._mm) as view:
+            return marshal.loads(view[start:start + length])
+
+    def close(self) -> None:
+        if self._mm is not None:
+            self._mm.close()
+            self._mm = None
+
+
+def load_schema_image(fname: str, name: str, sig: Tuple) -> Optional[SchemaImage]:
+    """
+    Open an image file
+    :param fname: image file name
+    :param name: name of the vocabulary
+    :param sig: current signature of the vocabulary
+    :return: open image if it exists and is current, else None
+    """
+    if not os.path.exists(fname):
+        return None
+    with open(fname, 'rb') as f:
+        if os.fstat(f.fileno()).st_size < len(IMAGE_MAGIC) + _prefix.size:
+            return None
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    image = None
+    try:
+        with memoryview(mm) as view:
+            if view[:len(IMAGE_MAGIC)] != IMAGE_MAGIC:
+                return None
+            offset = len(IMAGE_MAGIC)
+            version, header_len = _prefix.unpack_from(view, offset)
+            if version != IMAGE_VERSION:
+                return None
+            offset += _prefix.size
+            header = marshal.loads(view[offset:offset + header_len])
+            if header[:2] != (name, tuple(sig)):
+                return None
+            offset += header_len
+            core_len, index = header[2:]
+            image = SchemaImage(mm, offset + core_len, marshal.loads(view[offset:offset + core_len]), index)
+            return image
+    except (EOFError, ValueError, TypeError, struct.error):
+        return None
+    finally:
+        if image is None:
+            mm.close()
@@ -0,0 +1,112 @@
+"""
+A registry of compiled FHIR metadata vocabularies, one per FHIR release, that lets a single process convert
+resources from several releases.  Each resource is routed to a release by an explicit option, by the versioned
+profiles in its meta.profile, by a registered profile base or by a hint from the bundle it arrived in.
+"""
+import re
+from typing import Dict, Optional, Union, Iterable, List, Tuple
+
+from rdflib import Graph, URIRef
+
+from fhirtordf.fhir.fhirmetavoc import FHIRMetaVoc, FHIRSchema
+from fhirtordf.loaders.jsondecoder import JSONObject
+
+# Map from FHIR version number (major.minor) to release name
+FHIR_RELEASES = {'1.0': 'DSTU2', '3.0': 'STU3', '4.0': 'R4', '4.3': 'R4B', '5.0': 'R5'}
+
+
+def fhir_release(version: str) -> str:
+    """
+    Normalize a FHIR version or release name
+    :param version: version number (e.g. '4.0.1') or release name (e.g. 'r4')
+    :return: release name (e.g. 'R4').  Versions that aren't in FHIR_RELEASES are returned as is
+    """
+    m = re.match(r'(\d+\.\d+)(\.|$)', version.strip())
+    if m:
+        return FHIR_RELEASES.get(m.group(1), version.strip())
+    return version.strip().upper()
+
+
+class FHIRVocabularyRegistry:
+    """ Compiled FHIR metadata vocabularies keyed by FHIR release.  The URI's in the registered schemas are shared """
+    def __init__(self, default: Optional[str] = None):
+        """
+        Create an empty registry
+        :param default: release to use when one can't be determined.  If absent and only one release is registered,
+        that release is the default
+        """
+        self._schemas = dict()          # type: Dict[str, FHIRSchema]
+        self._profiles = list()         # type: List[Tuple[str, str]]
+        self._uris = dict()             # type: Dict[URIRef, URIRef]
+        self.default = fhir_release(default) if default else None
+
+    def register(self, release: str, vocabulary: Union[str, Graph, FHIRMetaVoc, FHIRSchema],
+                 profiles: Iterable[str] = ()) -> FHIRSchema:
+        """
+        Add a vocabulary to the registry
+        :param release: FHIR release (e.g. 'STU3', 'R4' or '4.0.1')
+        :param vocabulary: file name or URI of fhir.ttl, vocabulary graph, FHIRMetaVoc or compiled schema
+        :param profiles: profile bases (e.g. 'http://hl7.org/fhir/us/core/') that identify resources of this release
+        :return: compiled schema
+        """
+        release = fhir_release(release)
+        schema = FHIRMetaVoc(vocabulary).schema if isinstance(vocabulary, str) else \
+            FHIRSchema.for_vocabulary(vocabulary)
+        schema.share_uris(self._uris)
+        self._schemas[release] = schema
+        self._profiles += [(profile, release) for profile in profiles]
+        self._profiles.sort(key=lambda e: len(e[0]), reverse=True)
+        return schema
+
+    @property
+    def releases(self) -> List[str]:
+        return list(self._schemas.keys())
+
+    def schema(self, release: str) -> FHIRSchema:
+        """
+        Return the compiled vocabulary for release
+        :param release: FHIR release or version
+        :return: compiled schema
+        """
+        release = fhir_release(release)
+        if release not in self._schemas:
+            raise ValueError("Unregistered FHIR release: {}".format(release))
+        return self._schemas[release]
+
+    def detect(self, resource: JSONObject) -> Optional[str]:
+        """
+        Determine the release of a resource from its meta.profile.  A versioned canonical ('...|4.0.1') names the
+        release directly, otherwise the longest matching registered profile base wins
+        :param resource: JSON resource
+        :return: registered release if it can be determined
+        """
+        profiles = resource['meta']['profile'] if 'meta' in resource and 'profile' in resource['meta'] else []
+        for profile in profiles if isinstance(profiles, list) else [profiles]:
+            if '|' in profile:
+                release = fhir_release(profile.rsplit('|', 1)[1])
+                if release in self._schemas:
+                    return release
+            for base, release in self._profiles:
+                if profile.startswith(base):
+                    return release
+        return None
+
+    def release_for(self, resource: JSONObject, release: Optional[str] = None, hint: Optional[str] = None) -> str:
+        """
+        Determine which release to convert resource with
+        :param resource: JSON resource
+        :param release: explicit release -- overrides everything else
+        :param hint: release of the enclosing bundle or collection, if any
+        :return: registered release
+        """
+        if release:
+            release = fhir_release(release)
+        else:
+            release = self.detect(resource) or hint or self.default or \
+                (self.releases[0] if len(self._schemas) == 1 else None)
+            if release is None:
+                raise ValueError("Unable to determine the FHIR release of {} resource".format(
+                    resource['resourceType'] if 'resourceType' in resource else 'an unknown'))
+        if release not in self._schemas:
+            raise ValueError("Unregistered FHIR release: {}".format(release))
+        return release
@@ -1,16 +1,21 @@
 import os
 import sys
 from argparse import Namespace, ArgumentParser
-from typing import List
+from typing import List, Optional
 
 import dirlistproc
 from rdflib import Graph
 
-from fhirtordf.fhir.fhirmetavoc import FHIRMetaVoc
+from fhirtordf.fhir.fhirmetavoc import FHIRMetaVoc, FHIRSchema
 from fhirtordf.fhir.picklejar import picklejarfactory
+from fhirtordf.loaders.conversionstats import ConversionStats
+from fhirtordf.loaders.diagnostics import Diagnostics
+from fhirtordf.loaders.fhirentrypool import EntryPool
 from fhirtordf.loaders.fhirjsonloader import fhir_json_to_rdf
+from fhirtordf.loaders.fhirresourceloader import NODE_IDS
 from fhirtordf import __version__
 from fhirtordf.rdfsupport.rdflibformats import known_formats, suffix_for
+from fhirtordf.rdfsupport.triplesink import WriterSink, GraphSink, bind_prefixes
 
 dirname, _ = os.path.split(os.path.abspath(__file__))
 
@@ -25,8 +30,11 @@ output_formats = known_formats()
 output_formats.remove('nquads')         # Only makes sense for context-aware stores
 output_formats.remove('trix')
 
+# Line based formats that are written statement by statement instead of by serializing a graph.  Value: ASCII only
+STREAMING_FORMATS = {'nt': True, 'ntriples': True, 'nt11': False}
 
-def load_fhir_ontology(opts: Namespace) -> Graph:
+
+def load_fhir_ontology(opts: Namespace) -> FHIRSchema:
     if opts.nocache:
         picklejarfactory.cache_directory = None
     else:
@@ -36,7 +44,7 @@ def load_fhir_ontology(opts: Namespace) -> Graph:
     mv = FHIRMetaVoc(opts.metadatavoc)
     if opts.outfile:
         print("loaded from local cache" if mv.from_cache else "loaded from {}".format(opts.metadatavoc))
-    return mv.g
+    return mv.schema
 
 
 def add_argument(parser: ArgumentParser, *args, **kwargs):
@@ -56,20 +64,59 @@ def proc_file(infile: str, outfile: str, opts: Namespace) -> bool:
     :param opts:
     :return:
     """
-    g = fhir_json_to_rdf(infile, opts.uribase, opts.graph, add_ontology_header=not opts.noontology,
-                         do_continuations=not opts.nocontinuation, replace_narrative_text=bool(opts.nonarrative),
-                         metavoc=opts.fhir_metavoc)
-
-    # If we aren't carrying graph in opts, we're doing a file by file transformation
-    if g:
-        if not opts.graph:
+    def convert(target_graph: Optional[Graph], sink: Optional[WriterSink]):
+        return fhir_json_to_rdf(infile, opts.uribase, target_graph, add_ontology_header=not opts.noontology,
+                                do_continuations=not opts.nocontinuation,
+                                replace_narrative_text=bool(opts.nonarrative), metavoc=opts.fhir_metavoc, sink=sink,
+                                raw_literals=opts.rawliterals, node_ids=opts.nodeids, entry_pool=opts.entry_pool,
+                                stream=opts.stream, stats=opts.conversion_stats,
+                                diagnostics=opts.conversion_diagnostics, prefixes=opts.prefixes)
+
+    if isinstance(opts.graph, WriterSink):
+        g = convert(None, opts.graph)
+    elif opts.format in STREAMING_FORMATS and not opts.graph:
+        with open(outfile, 'w', encoding='utf-8') as out:
+            g = convert(None, streaming_sink(out, opts))
+        if not g:
+            os.remove(outfile)
+    else:
+        g = convert(opts.graph, None)
+        # If we aren't carrying graph in opts, we're doing a file by file transformation
+        if g and not opts.graph:
             serialize_graph(g, outfile, opts)
+    if g:
         return True
     else:
         print("{} : Not a FHIR collection or resource".format(infile))
         return False
 
 
+def streaming_sink(out, opts: Namespace) -> WriterSink:
+    """
+    Return a sink that writes the statements in opts.format to out as they are produced
+    :param out: output text stream
+    :param opts: argparse options
+    :return: sink
+    """
+    return WriterSink(out, ascii_only=STREAMING_FORMATS[opts.format])
+
+
+def report_stats(stats: ConversionStats, opts: Namespace) -> None:
+    if opts.stats:
+        print(stats, file=sys.stderr)
+    if opts.statsjson:
+        with open(opts.statsjson, 'w') as f:
+            stats.write_json(f)
+
+
+def report_diagnostics(diagnostics: Diagnostics, opts: Namespace) -> None:
+    if opts.diagnostics:
+        print(diagnostics, file=sys.stderr)
+    if opts.diagnosticsjson:
+        with open(opts.diagnosticsjson, 'w') as f:
+            diagnostics.write_json(f)
+
+
 def serialize_graph(g: Graph, outfile: str, opts: Namespace) -> None:
     if outfile:
         g.serialize(outfile, format=opts.format)
@@ -81,7 +128,7 @@ def file_filter(ifn: str, indir: str, opts: Namespace) -> bool:
     """
     Determine whether to process ifn.  We con't process:
         1) Anything in a directory having a path element that begins with "_"
-        2) Really, really big files
+        2) Really, really big files (unless they are being streamed)
         3) Temporary lists of know errors
     :param ifn: input file name
     :param indir: input directory
@@ -103,7 +150,7 @@ def file_filter(ifn: str, indir: str, opts: Namespace) -> bool:
         return False
 
     infile = os.path.join(indir, ifn)
-    if not opts.infile and opts.maxsize and os.path.getsize(infile) > (opts.maxsize * 1000):
+    if not opts.infile and opts.maxsize and not opts.stream and os.path.getsize(infile) > (opts.maxsize * 1000):
         return False
 
     return True
@@ -125,6 +172,18 @@ def addargs(parser: ArgumentParser) -> None:
     add_argument(parser, "-sd", "--skipdirs", help="Skip directories", nargs='*')
     add_argument(parser, "-sf", "--skipfns", help="Skip file names containing text", nargs='*')
     add_argument(parser, "--format", help="Output format", choices=output_formats, default="turtle")
+    add_argument(parser, "-rl", "--rawliterals", help="Keep the JSON lexical form of typed literals",
+                 action="store_true")
+    add_argument(parser, "-ni", "--nodeids", help="Identify value nodes by a counter or by their FHIR path",
+                 choices=NODE_IDS)
+    add_argument(parser, "-w", "--workers", help="Convert bundle entries in this many worker processes", type=int)
+    add_argument(parser, "-st", "--stream", help="Convert bundle entries as they are parsed.  Turns off --maxsize",
+                 action="store_true")
+    add_argument(parser, "--stats", help="Print conversion statistics on stderr", action="store_true")
+    add_argument(parser, "--statsjson", help="Write conversion statistics to this file as JSON")
+    add_argument(parser, "--diagnostics", help="Print the parts of the input that were skipped or dropped on stderr",
+                 action="store_true")
+    add_argument(parser, "--diagnosticsjson", help="Write the diagnostics to this file as JSON")
     parser.fromfile_prefix_chars = "@"
 
 
@@ -161,18 +220,46 @@ def main(argv: List[str], default_exit: bool = True) -> bool:
     if dlp.opts.outdir and not os.path.exists(dlp.opts.outdir):
         os.makedirs(dlp.opts.outdir)
 
-    # If we are going to a single output file or stdout, gather all the input
-    dlp.opts.graph = Graph() if (not dlp.opts.outfile and not dlp.opts.outdir) or\
-                                (dlp.opts.outfile and len(dlp.opts.outfile) == 1) else None
+    # If we are going to a single output file or stdout, gather all the input.  Line based formats are streamed to
+    # the output as they are converted
+    gather = (not dlp.opts.outfile and not dlp.opts.outdir) or (dlp.opts.outfile and len(dlp.opts.outfile) == 1)
+    out = None
+    if not gather:
+        dlp.opts.graph = None
+    elif dlp.opts.format in STREAMING_FORMATS:
+        out = open(dlp.opts.outfile[0], 'w', encoding='utf-8') if dlp.opts.outfile else sys.stdout
+        dlp.opts.graph = streaming_sink(out, dlp.opts)
+    else:
+        dlp.opts.graph = Graph()
+    # The prefixes for an aggregate graph are bound once, just before it is serialized
+    dlp.opts.prefixes = dict() if isinstance(dlp.opts.graph, Graph) else None
     dlp.opts.fhir_metavoc = load_fhir_ontology(dlp.opts)
+    dlp.opts.entry_pool = EntryPool(dlp.opts.fhir_metavoc, dlp.opts.workers) if dlp.opts.workers else None
+    dlp.opts.conversion_stats = ConversionStats() if dlp.opts.stats or dlp.opts.statsjson else None
+    dlp.opts.conversion_diagnostics = Diagnostics() if dlp.opts.diagnostics or dlp.opts.diagnosticsjson else None
 
     # If it looks like we're processing a URL as an input file, skip the suffix check
     if dlp.opts.infile and len(dlp.opts.infile) == 1 and not dlp.opts.indir and "://" in dlp.opts.infile[0]:
         dlp.infile_suffix = ""
     dlp.outfile_suffix = '.' + suffix_for(dlp.opts.format)
-    nfiles, nsuccess = dlp.run(proc=proc_file, file_filter_2=file_filter)
+    try:
+        nfiles, nsuccess = dlp.run(proc=proc_file, file_filter_2=file_filter)
+    finally:
+        if dlp.opts.entry_pool is not None:
+            dlp.opts.entry_pool.close()
+        if out is not None:
+            dlp.opts.graph.close()
+            if out is not sys.stdout:
+                out.close()
+    if dlp.opts.conversion_stats is not None:
+        report_stats(dlp.opts.conversion_stats, dlp.opts)
+    if dlp.opts.conversion_diagnostics is not None:
+        report_diagnostics(dlp.opts.conversion_diagnostics, dlp.opts)
     if nfiles:
+        if isinstance(dlp.opts.graph, WriterSink):
+            return nsuccess > 0
         if dlp.opts.graph:
+            bind_prefixes(GraphSink(dlp.opts.graph), dlp.opts.prefixes)
             serialize_graph(dlp.opts.graph, dlp.opts.outfile[0] if dlp.opts.outfile else None, dlp.opts)
         return nsuccess > 0
     return False
@@ -0,0 +1,157 @@
+"""
+Conversion statistics -- how many resources of each type were converted, the time and triples that each type
+accounted for and how well the shared caches did.  Nothing is collected unless a ConversionStats object is passed to
+the loaders.
+"""
+import json
+from time import perf_counter
+from typing import Dict, List, Any, TextIO, Tuple
+
+
+class TypeStats:
+    """ Totals for one resource type """
+    def __init__(self) -> None:
+        self.count = 0
+        self.seconds = 0.0
+        self.triples = 0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return dict(count=self.count, seconds=self.seconds, triples=self.triples)
+
+
+class ConversionStats:
+    """ Statistics for one or more conversions.  Time and triples are charged to the innermost resource being
+    converted, so a Bundle is only charged for the triples that describe the bundle itself """
+    def __init__(self) -> None:
+        self.types = dict()             # type: Dict[str, TypeStats]
+        self.triples = 0                # Triples emitted
+        self.lists = 0                  # JSON arrays converted
+        self.extensions = 0             # Extended ("_" prefixed) elements converted
+        self._stack = []                # type: List[List]
+        self._caches = dict()           # type: Dict[str, Tuple[Any, int, int]]
+        self._merged_caches = dict()    # type: Dict[str, List[int]]
+
+    @property
+    def resources(self) -> int:
+        """ Number of resources converted """
+        return sum(ts.count for ts in self.types.values())
+
+    @property
+    def seconds(self) -> float:
+        """ Total conversion time """
+        return sum(ts.seconds for ts in self.types.values())
+
+    def begin(self, resource_type: str) -> None:
+        """
+        Start timing a resource.  The resource being converted, if any, is suspended until the matching end
+        :param resource_type: FHIR resource type
+        """
+        now = perf_counter()
+        if self._stack:
+            self._charge(self._stack[-1], now)
+        self._stack.append([resource_type, 0.0, 0, now, self.triples])
+
+    def end(self) -> None:
+        """ Finish timing the most recently begun resource """
+        now = perf_counter()
+        entry = self._stack.pop()
+        self._charge(entry, now)
+        ts = self.types.get(entry[0])
+        if ts is None:
+            ts = self.types[entry[0]] = TypeStats()
+        ts.count += 1
+        ts.seconds += entry[1]
+        ts.triples += entry[2]
+        if self._stack:
+            self._stack[-1][3] = now
+            self._stack[-1][4] = self.triples
+
+    def _charge(self, entry: List, now: float) -> None:
+        entry[1] += now - entry[3]
+        entry[2] += self.triples - entry[4]
+
+    def track(self, name: str, cache: Any) -> None:
+        """
+        Report the hits and misses of cache from now on.  Only the first cache tracked under a name counts
+        :param name: name for the report
+        :param cache: object with hits and misses counts or a cache_info() method that returns them (FHIRSchema)
+        """
+        if name not in self._caches:
+            self._caches[name] = (cache, ) + self._counts(cache)
+
+    @staticmethod
+    def _counts(cache: Any) -> Tuple[int, int]:
+        if hasattr(cache, 'cache_info'):
+            info = cache.cache_info()
+            return info.hits, info.misses
+        return cache.hits, cache.misses
+
+    def cache_counts(self) -> Dict[str, Tuple[int, int]]:
+        """ Return the hits and misses of each tracked cache since it was tracked """
+        rval = {name: tuple(c) for name, c in self._merged_caches.items()}
+        for name, (cache, hits, misses) in self._caches.items():
+            now_hits, now_misses = self._counts(cache)
+            prev_hits, prev_misses = rval.get(name, (0, 0))
+            rval[name] = (prev_hits + now_hits - hits, prev_misses + now_misses - misses)
+        return rval
+
+    def merge(self, other: "ConversionStats") -> None:
+        """
+        Add the statistics from another ConversionStats (e.g. from a worker process)
+        :param other: statistics to add
+        """
+        for resource_type, ots in other.types.items():
+            ts = self.types.get(resource_type)
+            if ts is None:
+                ts = self.types[resource_type] = TypeStats()
+            ts.count += ots.count
+            ts.seconds += ots.seconds
+            ts.triples += ots.triples
+        self.triples += other.triples
+        self.lists += other.lists
+        self.extensions += other.extensions
+        for name, (hits, misses) in other.cache_counts().items():
+            counts = self._merged_caches.setdefault(name, [0, 0])
+            counts[0] += hits
+            counts[1] += misses
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # The caches themselves stay behind
+        state = dict(self.__dict__)
+        state['_merged_caches'] = {name: list(c) for name, c in self.cache_counts().items()}
+        state['_caches'] = dict()
+        return state
+
+    def as_dict(self) -> Dict[str, Any]:
+        """ Return the statistics as a JSON compatible dictionary """
+        seconds = self.seconds
+        return dict(resources=self.resources, seconds=seconds, triples=self.triples, lists=self.lists,
+                    extensions=self.extensions,
+                    resources_per_second=self.resources / seconds if seconds else None,
+                    triples_per_second=self.triples / seconds if seconds else None,
+                    types={t: ts.as_dict() for t, ts in sorted(self.types.items())},
+                    caches={name: dict(hits=hits, misses=misses)
+                            for name, (hits, misses) in sorted(self.cache_counts().items())})
+
+    def write_json(self, f: TextIO) -> None:
+        """ Write the statistics to f as JSON """
+        json.dump(self.as_dict(), f, indent=2)
+
+    def __str__(self) -> str:
+        seconds = self.seconds
+        lines = ["{} resources, {} triples in {:.3f}s{}".format(
+                    self.resources, self.triples, seconds,
+                    " ({:.1f} resources/s, {:.0f} triples/s)".format(self.resources / seconds, self.triples / seconds)
+                    if seconds else ''),
+                 "{} lists, {} extensions".format(self.lists, self.extensions)]
+        if self.types:
+            lines.append("{:<32} {:>8} {:>10} {:>10} {:>8}".format("Resource type", "Count", "Seconds", "Triples",
+                                                                   "ms each"))
+            for t, ts in sorted(self.types.items(), key=lambda e: -e[1].seconds):
+                lines.append("{:<32} {:>8} {:>10.3f} {:>10} {:>8.2f}".format(t, ts.count, ts.seconds, ts.triples,
+                                                                            ts.seconds * 1000 / ts.count))
+        for name, (hits, misses) in sorted(self.cache_counts().items()):
+            lookups = hits + misses
+            lines.append("{} cache: {} hits, {} misses ({:.1%} hit rate)".format(
+                name, hits, misses, hits / lookups if lookups else 0.0))
+        return '\n'.join(lines)
@@ -0,0 +1,98 @@
+"""
+Diagnostics -- the parts of the JSON that a conversion skipped or couldn't represent.  Each diagnostic has a code;
+the collector counts them by code and keeps the first few of each as samples.  The loaders only report anything if
+a Diagnostics object is passed to them, and the message for a diagnostic is only formatted if it is going to be kept
+as a sample or handed to a callback.
+"""
+import json
+from collections import Counter
+from typing import Callable, Dict, List, Any, NamedTuple, Optional, TextIO
+
+MISSING_ELEMENT = 'missing-element'     # An element that was expected in the JSON isn't there
+ENTRY_ELEMENT = 'entry-element'         # A Bundle entry element other than fullUrl and resource
+FHIR_COMMENT = 'fhir-comment'           # fhir_comments are dropped
+UNKNOWN_KEY = 'unknown-key'             # A key that the vocabulary doesn't define for its object
+EXTENSION_LIST = 'extension-list'       # A list of extensions for an element that has a single value
+
+DEFAULT_MAX_SAMPLES = 10                # Samples kept per code
+
+
+class Diagnostic(NamedTuple):
+    code: str
+    resource: str                       # URI of the resource being converted
+    message: str
+
+    def __str__(self) -> str:
+        return "{} {}: {}".format(self.code, self.resource, self.message)
+
+
+DiagnosticCallback = Callable[[Diagnostic], None]
+
+
+class Diagnostics:
+    """ Diagnostics for one or more conversions """
+    def __init__(self, max_samples: int=DEFAULT_MAX_SAMPLES, callback: Optional[DiagnosticCallback]=None) -> None:
+        """
+        :param max_samples: number of diagnostics kept for each code
+        :param callback: function called with every diagnostic as it is reported.  Diagnostics merged from worker
+                processes only reach it if they were kept as samples
+        """
+        self.max_samples = max_samples
+        self.callback = callback
+        self.counts = Counter()         # type: Counter[str]
+        self.samples = dict()           # type: Dict[str, List[Diagnostic]]
+
+    def __len__(self) -> int:
+        return sum(self.counts.values())
+
+    def report(self, code: str, resource: Any, fmt: str, *args: Any) -> None:
+        """
+        Count a diagnostic.  fmt.format(*args) is only evaluated if the diagnostic is kept or there is a callback
+        :param code: diagnostic code (e.g. UNKNOWN_KEY)
+        :param resource: resource being converted
+        :param fmt: message format
+        :param args: message arguments
+        """
+        self.counts[code] += 1
+        samples = self.samples.setdefault(code, [])
+        if self.callback is not None or len(samples) < self.max_samples:
+            self._keep(Diagnostic(code, str(resource), fmt.format(*args)), samples)
+
+    def _keep(self, diagnostic: Diagnostic, samples: List[Diagnostic]) -> None:
+        if len(samples) < self.max_samples:
+            samples.append(diagnostic)
+        if self.callback is not None:
+            self.callback(diagnostic)
+
+    def merge(self, other: "Diagnostics") -> None:
+        """
+        Add the diagnostics from another collector (e.g. from a worker process)
+        :param other: diagnostics to add
+        """
+        self.counts.update(other.counts)
+        for code, other_samples in other.samples.items():
+            samples = self.samples.setdefault(code, [])
+            for diagnostic in other_samples:
+                self._keep(diagnostic, samples)
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # The callback stays behind
+        state = dict(self.__dict__)
+        state['callback'] = None
+        return state
+
+    def as_dict(self) -> Dict[str, Any]:
+        """ Return the diagnostics as a JSON compatible dictionary """
+        return {code: dict(count=count, samples=[d._asdict() for d in self.samples.get(code, [])])
+                for code, count in sorted(self.counts.items())}
+
+    def write_json(self, f: TextIO) -> None:
+        """ Write the diagnostics to f as JSON """
+        json.dump(self.as_dict(), f, indent=2)
+
+    def __str__(self) -> str:
+        lines = ["{} diagnostics".format(len(self))]
+        for code, count in sorted(self.counts.items()):
+            lines.append("{}: {}".format(code, count))
+            lines += ["    {}: {}".format(d.resource, d.message) for d in self.samples.get(code, [])]
+        return '\n'.join(lines)
@@ -1,34 +1,157 @@
-from typing import Optional, List
+import itertools
+from typing import Optional, List, Union, Dict, Iterable, Iterator, Tuple
 
-from jsonasobj import JsonObj, load
-from rdflib import Graph
+from rdflib import Graph, URIRef
 
+from fhirtordf.fhir.fhirmetavoc import FHIRSchema
+from fhirtordf.fhir.vocabularyregistry import FHIRVocabularyRegistry
+from fhirtordf.loaders.conversionstats import ConversionStats
+from fhirtordf.loaders.diagnostics import Diagnostics
+from fhirtordf.loaders.fhirentrypool import EntryPool
 from fhirtordf.loaders.fhirresourceloader import FHIRResource
+from fhirtordf.loaders.jsondecoder import JSONObject, JSONDecoder, load_json
+from fhirtordf.loaders.jsonstream import JSONStream
+from fhirtordf.rdfsupport.prettygraph import PrettyGraph
+from fhirtordf.rdfsupport.triplesink import SinkTypes, Triple, as_sink, bind_prefixes
+
+
+def _drain(entries: List[JSONObject]) -> Iterator[JSONObject]:
+    """ Hand out the elements of entries, letting go of each one as it is handed out """
+    for i in range(len(entries)):
+        entry, entries[i] = entries[i], None
+        yield entry
 
 
 class FHIRCollection:
     """ FHIR JSON collection to RDF conversion utility.  This tool takes a collection of json "entry" elements
      and generates a list of FHIRResource elements from the entries in the collection.  The JSON file itself can have
-     an optional collection header.
+     an optional collection header.  Every entry is kept, along with its JSON -- use iter_collection to convert
+     collections that are too large for that.
      """
-    def __init__(self, vocabulary: Graph, json_fname: Optional[str], base_uri: str, data: Optional[JsonObj] = None,
-                 add_ontology_header: Optional[bool] = True, replace_narrative_text: Optional[bool] = False,
-                 target: Optional[Graph] = None):
+    def __init__(self, vocabulary: Union[Graph, FHIRSchema, FHIRVocabularyRegistry], json_fname: Optional[str],
+                 base_uri: str, data: Optional[JSONObject] = None, add_ontology_header: Optional[bool] = True,
+                 replace_narrative_text: Optional[bool] = False, target: Optional[SinkTypes] = None,
+                 fhir_release: Optional[str] = None, raw_literals: bool = False, node_ids: Optional[str] = None,
+                 entry_pool: Optional[EntryPool] = None, json_decoder: Optional[JSONDecoder] = None,
+                 stats: Optional[ConversionStats] = None, diagnostics: Optional[Diagnostics] = None,
+                 prefixes: Optional[Dict[str, str]] = None):
         """
         Convert a JSON collection into RDF.
-        :param vocabulary: fhir metadata vocabulary
+        :param vocabulary: fhir metadata vocabulary, its compiled schema or a registry of vocabularies
         :param json_fname: name or URI of the FHIR json collection to convert
         :param base_uri: URI to use as a base for identifiers
-        :param data: JsonObj to use if json fname is not present
+        :param data: JSON (dictionary or JsonObj) to use if json fname is not present
         :param add_ontology_header: Include the OWL:Ontology declaration
         :param replace_narrative_text: Replace long narrative text with REPLACED_NARRATIVE_TEXT
-        :param target: Target graph -- load everything into this if present
+        :param target: Target graph or triple sink -- load everything into this if present
+        :param fhir_release: FHIR release to convert with if vocabulary is a registry.  Default: detect
+        :param raw_literals: Emit typed literals with the lexical form from the JSON (see FHIRResource)
+        :param node_ids: How value nodes are identified (see FHIRResource)
+        :param entry_pool: If present, and there is a target, convert the entries in this pool of worker processes.
+                self.entries is left empty in this case
+        :param json_decoder: Function that decodes the text of json_fname (see FHIRResource)
+        :param stats: If present, add the statistics for the conversion to it
+        :param diagnostics: If present, report the parts of the JSON that were skipped or dropped to it
+        :param prefixes: If present, add the prefixes that the output uses to it rather than binding them in target
         """
-        collection = load(json_fname) if json_fname else data
+        if json_fname:
+            collection = load_json(json_fname, json_decoder, raw_literals)
+        else:
+            collection = data
+        # The collection header, if any, supplies the release for entries that don't identify their own
+        release_hint = vocabulary.detect(collection) if isinstance(vocabulary, FHIRVocabularyRegistry) else None
+
+        # With a shared target, the prefixes of all the entries are bound once at the end
+        collected = (dict() if prefixes is None else prefixes) if target is not None else None
+        # ... and all of them go through a single sink, so a writer is only wrapped (and flushed) once
+        sink = as_sink(target) if target is not None else None
 
         self.entries = []           # type: List[FHIRResource]
-        for entry in collection.entry:
+        if entry_pool is not None and target is not None:
+            entry_pool.convert(base_uri, [(None, entry['resource']) for entry in collection['entry']
+                                          if 'resource' in entry],
+                               sink, FHIRResource.term_pool, add_ontology_header=add_ontology_header,
+                               replace_narrative_text=replace_narrative_text, fhir_release=fhir_release,
+                               release_hint=release_hint, raw_literals=raw_literals, node_ids=node_ids,
+                               stats=stats, diagnostics=diagnostics, prefixes=collected)
+        else:
+            for entry in collection['entry']:
+                if 'resource' in entry:
+                    self.entries.append(FHIRResource(vocabulary, None, base_uri, data=entry['resource'],
+                                                     add_ontology_header=add_ontology_header,
+                                                     replace_narrative_text=replace_narrative_text, target=sink,
+                                                     fhir_release=fhir_release, release_hint=release_hint,
+                                                     raw_literals=raw_literals, node_ids=node_ids, stats=stats,
+                                                     diagnostics=diagnostics, prefixes=collected))
+        if target is not None and prefixes is None:
+            bind_prefixes(sink, collected)
+        if sink is not None and sink is not target:
+            sink.flush()
+
+
+def iter_collection(vocabulary: Union[Graph, FHIRSchema, FHIRVocabularyRegistry], json_fname: Optional[str],
+                    base_uri: str, data: Optional[JSONObject] = None, add_ontology_header: bool = True,
+                    replace_narrative_text: bool = False, fhir_release: Optional[str] = None,
+                    raw_literals: bool = False, node_ids: Optional[str] = None,
+                    json_decoder: Optional[JSONDecoder] = None, stats: Optional[ConversionStats] = None,
+                    diagnostics: Optional[Diagnostics] = None, prefixes: Optional[Dict[str, str]] = None,
+                    subgraphs: bool = False, stream: bool = False) \
+        -> Iterator[Tuple[URIRef, Union[List[Triple], Graph]]]:
+    """
+    Convert a JSON collection one entry at a time.  Nothing is kept from one entry to the next: the converted resource
+    is dropped as soon as its output has been handed out and, if the collection was read from json_fname, so is the
+    JSON of the entry.  The arguments have the same meaning as the FHIRCollection arguments of the same name
+    :param vocabulary: fhir metadata vocabulary, its compiled schema or a registry of vocabularies
+    :param json_fname: name or URI of the FHIR json collection to convert
+    :param base_uri: URI to use as a base for identifiers
+    :param data: JSON (dictionary or JsonObj) to use if json fname is not present
+    :param add_ontology_header: Include the OWL:Ontology declaration
+    :param replace_narrative_text: Replace long narrative text with REPLACED_NARRATIVE_TEXT
+    :param fhir_release: FHIR release to convert with if vocabulary is a registry.  Default: detect
+    :param raw_literals: Emit typed literals with the lexical form from the JSON (see FHIRResource)
+    :param node_ids: How value nodes are identified (see FHIRResource)
+    :param json_decoder: Function that decodes the text of json_fname (see FHIRResource)
+    :param stats: If present, add the statistics for the conversion to it
+    :param diagnostics: If present, report the parts of the JSON that were skipped or dropped to it
+    :param prefixes: If present, add the prefixes that the output uses to it
+    :param subgraphs: True means yield a graph, with the prefixes it uses bound, for each entry rather than a list
+    :param stream: True means parse the entries of json_fname one at a time (see JSONStream) rather than loading it.
+                   With a registry, a collection whose meta follows its entries is loaded first
+    :return: (resource URI, triples or graph) for each entry that has a resource
+    """
+    def convert(entries: Iterable[JSONObject], header: JSONObject) \
+            -> Iterator[Tuple[URIRef, Union[List[Triple], Graph]]]:
+        release_hint = vocabulary.detect(header) if isinstance(vocabulary, FHIRVocabularyRegistry) else None
+        for entry in entries:
             if 'resource' in entry:
-                self.entries.append(FHIRResource(vocabulary, None, base_uri, data=entry.resource,
-                                                 add_ontology_header=add_ontology_header,
-                                                 replace_narrative_text=replace_narrative_text, target=target))
+                output = PrettyGraph() if subgraphs else []
+                used = dict()
+                resource = FHIRResource(vocabulary, None, base_uri, data=entry['resource'],
+                                        add_ontology_header=add_ontology_header,
+                                        replace_narrative_text=replace_narrative_text,
+                                        target=output if subgraphs else output.append, fhir_release=fhir_release,
+                                        release_hint=release_hint, raw_literals=raw_literals, node_ids=node_ids,
+                                        stats=stats, diagnostics=diagnostics, prefixes=used)
+                if subgraphs:
+                    bind_prefixes(resource.sink, used)
+                if prefixes is not None:
+                    prefixes.update(used)
+                yield resource.resource_uri, output
+
+    if json_fname and stream:
+        with JSONStream(json_fname, json_decoder, raw_literals) as js:
+            entries = js.entries()
+            first = next(entries, None)
+            if first is not None and isinstance(vocabulary, FHIRVocabularyRegistry) and 'meta' not in js.header:
+                # The release is detected from meta, which may still follow the entries -- read them all first
+                yield from convert(_drain(list(itertools.chain([first], entries))), js.header)
+            elif first is not None:
+                yield from convert(itertools.chain([first], entries), js.header)
+            else:
+                # Not a Bundle -- whatever entries there are were decoded into the header
+                yield from convert(_drain(js.header.get('entry', [])), js.header)
+    elif json_fname:
+        collection = load_json(json_fname, json_decoder, raw_literals)
+        yield from convert(_drain(collection['entry']), collection)
+    else:
+        yield from convert(data['entry'], data)
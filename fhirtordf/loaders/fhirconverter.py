@@ -0,0 +1,106 @@
+"""
+A conversion session.  The vocabulary, target and options are resolved once and every resource converted in the
+session goes to the same target, so a service that converts a stream of small resources only pays for walking them.
+The prefixes that the output uses are collected as it goes and bound in the target once, when it is flushed or its
+graph is asked for.
+"""
+from typing import Optional, Union, Iterable, Dict
+
+from rdflib import Graph
+
+from fhirtordf.fhir.fhirmetavoc import FHIRMetaVoc, FHIRSchema
+from fhirtordf.fhir.vocabularyregistry import FHIRVocabularyRegistry
+from fhirtordf.loaders.conversionstats import ConversionStats
+from fhirtordf.loaders.diagnostics import Diagnostics
+from fhirtordf.loaders.fhirentrypool import EntryPool
+from fhirtordf.loaders.fhirresourceloader import FHIRResource
+from fhirtordf.loaders.jsondecoder import JSONDecoder, JSONObject, load_json
+from fhirtordf.rdfsupport.prettygraph import PrettyGraph
+from fhirtordf.rdfsupport.triplesink import SinkTypes, TripleSink, as_sink, bind_prefixes
+
+
+class FHIRConverter:
+    """ Convert any number of FHIR JSON resources into one target """
+    def __init__(self, vocabulary: Optional[Union[Graph, FHIRMetaVoc, FHIRSchema, FHIRVocabularyRegistry]]=None,
+                 base_uri: str="http://hl7.org/fhir/", target: Optional[SinkTypes]=None,
+                 add_ontology_header: bool=True, replace_narrative_text: bool=False, fhir_release: Optional[str]=None,
+                 raw_literals: bool=False, node_ids: Optional[str]=None, entry_pool: Optional[EntryPool]=None,
+                 json_decoder: Optional[JSONDecoder]=None, stats: Optional[ConversionStats]=None,
+                 diagnostics: Optional[Diagnostics]=None) -> None:
+        """
+        Start a session.  The arguments have the same meaning as the FHIRResource arguments of the same name
+        :param vocabulary: FHIR metadata vocabulary, compiled schema or vocabulary registry.  Default: FHIRMetaVoc()
+        :param base_uri: base for the resource URIs
+        :param target: graph or triple sink that every resource goes to.  Default: a new graph
+        :param add_ontology_header: add an owl:Ontology declaration for each resource
+        :param replace_narrative_text: replace long narrative text with boilerplate
+        :param fhir_release: FHIR release to convert with if vocabulary is a registry.  Default: detect
+        :param raw_literals: emit typed literals with the lexical form from the JSON
+        :param node_ids: how value nodes are identified
+        :param entry_pool: if present, convert_many and the entries of bundles use this pool of worker processes
+        :param json_decoder: decoder for resources that are passed as file names or URLs
+        :param stats: if present, add the statistics for every conversion to it
+        :param diagnostics: if present, report the parts of the JSON that were skipped or dropped to it
+        """
+        if vocabulary is None:
+            vocabulary = FHIRMetaVoc().schema
+        elif isinstance(vocabulary, FHIRMetaVoc):
+            vocabulary = vocabulary.schema
+        elif not isinstance(vocabulary, (FHIRSchema, FHIRVocabularyRegistry)):
+            vocabulary = FHIRSchema.for_vocabulary(vocabulary)
+        self.vocabulary = vocabulary
+        self.base_uri = base_uri + ('/' if base_uri[-1] not in '/#' else '')
+        self.sink = as_sink(PrettyGraph() if target is None else target)
+        self.raw_literals = raw_literals
+        self.json_decoder = json_decoder
+        self.entry_pool = entry_pool
+        self.prefixes = dict()              # type: Dict[str, str]
+        self._bound = dict()                # type: Dict[str, str]
+        self._options = dict(add_ontology_header=add_ontology_header, replace_narrative_text=replace_narrative_text,
+                             fhir_release=fhir_release, raw_literals=raw_literals, node_ids=node_ids,
+                             stats=stats, diagnostics=diagnostics)
+
+    @property
+    def graph(self) -> Optional[Graph]:
+        """ The target graph, with the prefixes used so far bound in it -- None if the target is some other sink """
+        self.bind_prefixes()
+        return self.sink.graph
+
+    def bind_prefixes(self) -> None:
+        """ Bind the prefixes that the conversions have used since the last call in the target """
+        if self.prefixes != self._bound:
+            bind_prefixes(self.sink, {k: v for k, v in self.prefixes.items() if self._bound.get(k) != v})
+            self._bound = dict(self.prefixes)
+
+    def convert(self, data: Union[str, JSONObject]) -> FHIRResource:
+        """
+        Convert a resource
+        :param data: the resource -- a dictionary, a JsonObj or the name or URL of a JSON file
+        :return: the converted resource
+        """
+        if isinstance(data, str):
+            data = load_json(data, self.json_decoder, self.raw_literals)
+        return FHIRResource(self.vocabulary, None, self.base_uri, data, target=self.sink, entry_pool=self.entry_pool,
+                            prefixes=self.prefixes, **self._options)
+
+    def convert_many(self, resources: Iterable[Union[str, JSONObject]]) -> Union[Graph, TripleSink]:
+        """
+        Convert a sequence of resources.  The resources aren't kept -- each one can be dropped as soon as it has been
+        converted.  With an entry pool, they are converted by the workers in the order that they appear
+        :param resources: resources to convert (see convert)
+        :return: target graph or, if the target isn't a graph, the sink
+        """
+        if self.entry_pool is not None:
+            resources = ((None, load_json(r, self.json_decoder, self.raw_literals) if isinstance(r, str) else r)
+                         for r in resources)
+            self.entry_pool.convert(self.base_uri, resources, self.sink, FHIRResource.term_pool, prefixes=self.prefixes,
+                                    **self._options)
+        else:
+            for resource in resources:
+                self.convert(resource)
+        return self.graph if self.sink.graph is not None else self.sink
+
+    def flush(self) -> None:
+        """ Bind the prefixes used so far and pass on anything that the sink has buffered """
+        self.bind_prefixes()
+        self.sink.flush()
@@ -0,0 +1,173 @@
+"""
+Convert the entries of a bundle or collection in a pool of worker processes.  Each worker holds the vocabulary
+(inherited when the pool is forked, otherwise passed to it once when it starts), converts a batch of entry resources
+and sends back the triples in a compact form -- a table of the distinct terms in the batch plus three term indices
+per triple.  The parent adds the decoded triples to the target graph or sink in the order the entries appear.
+"""
+import itertools
+import multiprocessing
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Union, Optional, List, Tuple, Dict, Any, Iterable
+
+from rdflib import Graph, URIRef, BNode, Literal, Namespace
+from rdflib.term import Node
+
+from fhirtordf.fhir.fhirmetavoc import FHIRSchema
+from fhirtordf.fhir.vocabularyregistry import FHIRVocabularyRegistry
+from fhirtordf.loaders.conversionstats import ConversionStats
+from fhirtordf.loaders.diagnostics import Diagnostics
+from fhirtordf.loaders.jsondecoder import JSONObject
+from fhirtordf.rdfsupport.termpool import TermPool
+from fhirtordf.rdfsupport.triplesink import TripleSink, Triple, bind_prefixes
+
+DEFAULT_BATCH_SIZE = 50                 # Entries sent to a worker at a time
+
+EncodedTerm = Union[str, Tuple]
+EncodedBatch = Tuple[List[EncodedTerm], List[int], Dict[str, str]]
+
+_vocabulary = None                      # The vocabulary in a worker process
+
+
+class _BatchSink(TripleSink):
+    """ Encode the triples and prefixes of a batch of entries """
+    def __init__(self) -> None:
+        self.terms = []                 # type: List[EncodedTerm]
+        self.triples = []               # type: List[int]
+        self.prefixes = dict()          # type: Dict[str, str]
+        self._index = dict()            # type: Dict[Node, int]
+
+    def _term(self, term: Node) -> int:
+        idx = self._index.get(term)
+        if idx is None:
+            idx = self._index[term] = len(self.terms)
+            if isinstance(term, Literal):
+                self.terms.append((str(term), str(term.datatype) if term.datatype else None, term.language))
+            elif isinstance(term, BNode):
+                self.terms.append((str(term), ))
+            else:
+                self.terms.append(str(term))
+        return idx
+
+    def add(self, triple: Triple) -> None:
+        self.triples.extend(self._term(t) for t in triple)
+
+    def bind(self, prefix: str, namespace: Namespace) -> None:
+        self.prefixes.setdefault(prefix, str(namespace))
+
+
+def _init_worker(vocabulary: Union[Graph, FHIRSchema, FHIRVocabularyRegistry]) -> None:
+    global _vocabulary
+    _vocabulary = vocabulary
+
+
+def _convert_batch(base_uri: str, batch: List[Tuple[Optional[URIRef], JSONObject]], options: Dict[str, Any],
+                   collect_stats: bool, max_samples: Optional[int]) \
+        -> Tuple[EncodedBatch, Optional[ConversionStats], Optional[Diagnostics]]:
+    from fhirtordf.loaders.fhirresourceloader import FHIRResource
+
+    sink = _BatchSink()
+    stats = ConversionStats() if collect_stats else None
+    diagnostics = Diagnostics(max_samples) if max_samples is not None else None
+    for resource_uri, data in batch:
+        FHIRResource(_vocabulary, None, base_uri, data, target=sink, resource_uri=resource_uri, stats=stats,
+                     diagnostics=diagnostics, prefixes=sink.prefixes, **options)
+    return (sink.terms, sink.triples, sink.prefixes), stats, diagnostics
+
+
+def decode_batch(batch: EncodedBatch, sink: TripleSink, term_pool: TermPool, raw_literals: bool=False,
+                 prefixes: Optional[Dict[str, str]]=None) -> None:
+    """
+    Add the triples of an encoded batch to sink and bind its prefixes
+    :param batch: output of a worker
+    :param sink: target sink
+    :param term_pool: pool to take the URIs and literals from
+    :param raw_literals: True means rebuild typed literals without parsing them (see FHIRResource)
+    :param prefixes: if present, add the prefixes to it instead of binding them in sink
+    """
+    terms, triples, batch_prefixes = batch
+    decoded = []                        # type: List[Node]
+    for term in terms:
+        if isinstance(term, str):
+            decoded.append(term_pool.uri(term))
+        elif len(term) == 1:
+            decoded.append(BNode(term[0]))
+        else:
+            lexical, datatype, language = term
+            if language:
+                decoded.append(Literal(lexical, lang=language))
+            elif datatype and raw_literals:
+                decoded.append(term_pool.raw_literal(lexical, term_pool.uri(datatype)))
+            else:
+                decoded.append(term_pool.literal(lexical, term_pool.uri(datatype) if datatype else None))
+    if prefixes is not None:
+        prefixes.update(batch_prefixes)
+    else:
+        bind_prefixes(sink, batch_prefixes)
+    add = sink.add
+    for i in range(0, len(triples), 3):
+        add((decoded[triples[i]], decoded[triples[i + 1]], decoded[triples[i + 2]]))
+
+
+class EntryPool:
+    """ A pool of processes that convert bundle and collection entries """
+    def __init__(self, vocabulary: Union[Graph, FHIRSchema, FHIRVocabularyRegistry], workers: Optional[int]=None,
+                 batch_size: int=DEFAULT_BATCH_SIZE) -> None:
+        """
+        Start the pool.  The pool must be used with the same vocabulary as the conversions that it serves
+        :param vocabulary: FHIR metadata vocabulary, compiled schema or registry of vocabularies
+        :param workers: number of worker processes.  Default: the number of CPUs
+        :param batch_size: number of entries sent to a worker at a time
+        """
+        self.batch_size = batch_size
+        self.workers = workers or os.cpu_count() or 1
+        methods = multiprocessing.get_all_start_methods()
+        # Forked workers inherit the vocabulary instead of receiving a copy of it
+        context = multiprocessing.get_context('fork' if 'fork' in methods else None)
+        self._executor = ProcessPoolExecutor(self.workers, mp_context=context, initializer=_init_worker,
+                                             initargs=(vocabulary, ))
+
+    def convert(self, base_uri: str, resources: Iterable[Tuple[Optional[URIRef], JSONObject]], sink: TripleSink,
+                term_pool: TermPool, **options) -> None:
+        """
+        Convert resources and add the results to sink.  resources is consumed as the workers get through it -- no more
+        than two batches per worker are outstanding at a time
+        :param base_uri: base URI for the resources
+        :param resources: (resource URI or None to take it from the resource id, resource JSON) for each entry
+        :param sink: target sink
+        :param term_pool: pool for the terms in the results
+        :param options: additional FHIRResource arguments.  The statistics, diagnostics and prefixes collected by the
+                workers for stats, diagnostics and prefixes arguments are added to them
+        """
+        raw_literals = options.get('raw_literals', False)
+        stats = options.pop('stats', None)          # type: Optional[ConversionStats]
+        diagnostics = options.pop('diagnostics', None)  # type: Optional[Diagnostics]
+        prefixes = options.pop('prefixes', None)        # type: Optional[Dict[str, str]]
+        max_samples = diagnostics.max_samples if diagnostics is not None else None
+        resources = iter(resources)
+        pending = deque()
+        while True:
+            batch = list(itertools.islice(resources, self.batch_size))
+            if batch:
+                pending.append(self._executor.submit(_convert_batch, base_uri, batch, options, stats is not None,
+                                                     max_samples))
+            if pending and (not batch or len(pending) > 2 * self.workers):
+                encoded, batch_stats, batch_diagnostics = pending.popleft().result()
+                decode_batch(encoded, sink, term_pool, raw_literals, prefixes)
+                if stats is not None:
+                    stats.merge(batch_stats)
+                if diagnostics is not None:
+                    diagnostics.merge(batch_diagnostics)
+            elif not batch:
+                break
+
+    def close(self) -> None:
+        """ Shut the worker processes down """
+        self._executor.shutdown()
+
+    def __enter__(self) -> "EntryPool":
+        return self
+
+    def __exit__(self, *_) -> None:
+        self.close()
@@ -1,61 +1,146 @@
-from typing import Optional, Union
+import itertools
+from typing import Optional, Union, Dict, Tuple
 
-from jsonasobj import load, JsonObj
 from rdflib import Graph, URIRef
 
-from fhirtordf.fhir.fhirmetavoc import FHIRMetaVoc
+from fhirtordf.fhir.fhirmetavoc import FHIRMetaVoc, FHIRSchema
+from fhirtordf.fhir.vocabularyregistry import FHIRVocabularyRegistry
 from fhirtordf.loaders.fhircollectionloader import FHIRCollection
+from fhirtordf.loaders.conversionstats import ConversionStats
+from fhirtordf.loaders.diagnostics import Diagnostics
+from fhirtordf.loaders.fhirentrypool import EntryPool
 from fhirtordf.loaders.fhirresourceloader import FHIRResource
+from fhirtordf.loaders.jsondecoder import JSONData, JSONDecoder, JSONObject, load_json
+from fhirtordf.loaders.jsonstream import JSONStream
+from fhirtordf.rdfsupport.triplesink import SinkTypes, TripleSink, as_sink, bind_prefixes
 
 
-def fhir_json_to_rdf(json_fname: str,
+def fhir_json_to_rdf(json_fname: Union[str, JSONData],
                      base_uri: str = "http://hl7.org/fhir/",
                      target_graph: Optional[Graph] = None,
                      add_ontology_header: bool = True,
                      do_continuations: bool = True,
                      replace_narrative_text: bool = False,
-                     metavoc: Optional[Union[Graph, FHIRMetaVoc]] = None) -> Graph:
+                     metavoc: Optional[Union[Graph, FHIRMetaVoc, FHIRSchema, FHIRVocabularyRegistry]] = None,
+                     fhir_release: Optional[str] = None,
+                     sink: Optional[SinkTypes] = None,
+                     raw_literals: bool = False,
+                     node_ids: Optional[str] = None,
+                     entry_pool: Optional[EntryPool] = None,
+                     json_decoder: Optional[JSONDecoder] = None,
+                     stream: bool = False,
+                     stats: Optional[ConversionStats] = None,
+                     diagnostics: Optional[Diagnostics] = None,
+                     prefixes: Optional[Dict[str, str]] = None) -> Optional[Union[Graph, TripleSink]]:
     """
     Convert a FHIR JSON resource image to RDF
-    :param json_fname: Name or URI of the file to convert
+    :param json_fname: Name or URI of the file to convert, or the JSON itself -- a resource, bundle or collection as a
+                dictionary (e.g. from json.loads) or JsonObj, or a list of them
     :param base_uri: Base URI to use for relative references.
     :param target_graph:  If supplied, add RDF to this graph. If not, start with an empty graph.
     :param add_ontology_header:  True means add owl:Ontology declaration to output
     :param do_continuations: True means follow continuation records on bundles and queries
     :param replace_narrative_text: True means replace any narrative text longer than 120 characters with
                 '<div xmlns="http://www.w3.org/1999/xhtml">(removed)</div>'
-    :param metavoc: FHIR Metadata Vocabulary (fhir.ttl) graph
-    :return: resulting graph
+    :param metavoc: FHIR Metadata Vocabulary (fhir.ttl) graph, compiled schema or registry of vocabularies
+    :param fhir_release: FHIR release to convert with if metavoc is a registry.  Default: detect it per resource
+    :param sink: If supplied, send the triples here instead of to a graph.  A sink can be a TripleSink, a function,
+                a generator based consumer or a writer (see triplesink.as_sink)
+    :param raw_literals: Emit typed literals with the lexical form from the JSON rather than parsing and normalizing
+                them.  Faster, and decimals keep their precision
+    :param node_ids: How value nodes are identified -- None (random BNodes), 'counter' or 'path'.  The latter two give
+                the same output every time a resource is converted (see FHIRResource)
+    :param entry_pool: If supplied, convert the entries of bundles and collections in this pool of worker processes.
+                The pool must have been started with the same metavoc
+    :param json_decoder: Function that decodes the JSON text of json_fname and continuation pages (e.g. orjson.loads).
+                Default: json.loads, keeping decimals as text if raw_literals is set
+    :param stream: True means parse the entries of bundles read from a file or URL one at a time, converting each as
+                soon as it has been parsed, instead of loading the whole bundle first.  A bundle whose resourceType
+                (or, if metavoc is a registry, meta) follows its entry list is loaded first all the same
+    :param stats: If supplied, add the conversion statistics -- resources, time and triples by resource type, lists,
+                extensions and cache hit rates -- to it
+    :param diagnostics: If supplied, report the parts of the JSON that were skipped or dropped -- unknown keys,
+                fhir_comments, etc. -- to it.  Nothing is reported otherwise
+    :param prefixes: If supplied, add the prefixes that the output uses to it instead of binding them in the target.
+                Lets a caller that converts several files into one graph bind them once, before serializing it
+    :return: resulting graph or, if supplied, the sink.  None if json_fname isn't a FHIR resource or collection
     """
 
-    def check_for_continuation(data_: JsonObj) -> Optional[str]:
-        if do_continuations and 'link' in data_ and isinstance(data_.link, list):
-            for link_e in data_.link:
-                if 'relation' in link_e and link_e.relation == 'next':
-                    return link_e.url
+    def check_for_continuation(data_: JSONObject) -> Optional[str]:
+        if do_continuations and 'link' in data_ and isinstance(data_['link'], list):
+            for link_e in data_['link']:
+                if 'relation' in link_e and link_e['relation'] == 'next':
+                    return link_e['url']
         return None
 
-    if target_graph is None:
-        target_graph = Graph()
+    def convert_entries(js: JSONStream) -> Tuple[JSONObject, bool]:
+        """
+        Convert the entries of js as they are parsed.  This can only be done if the members that decide how they are
+        converted -- resourceType and, with a registry, meta -- come before the entry list.  Otherwise the page is
+        parsed to the end, and returned whole for the usual conversion.
+        :return: the page, less the entries if they were converted, and whether they were
+        """
+        entries = js.entries()
+        first = next(entries, None)
+        if first is None:
+            return js.header, False
+        header = js.header
+        if 'resourceType' not in header or (isinstance(metavoc, FHIRVocabularyRegistry) and 'meta' not in header):
+            return dict(header, entry=list(itertools.chain([first], entries))), False
+        options = dict(add_ontology_header=add_ontology_header if 'resourceType' in header else False,
+                       replace_narrative_text=replace_narrative_text, fhir_release=fhir_release,
+                       release_hint=metavoc.detect(header) if isinstance(metavoc, FHIRVocabularyRegistry) else None,
+                       raw_literals=raw_literals, node_ids=node_ids, stats=stats, diagnostics=diagnostics,
+                       prefixes=collected)
+        resources = ((None, entry['resource']) for entry in itertools.chain([first], entries) if 'resource' in entry)
+        if entry_pool is not None:
+            entry_pool.convert(base_uri, resources, as_sink(target), FHIRResource.term_pool, **options)
+        else:
+            for _, resource in resources:
+                FHIRResource(metavoc, None, base_uri, resource, target=target, **options)
+        return header, True
+
+    if sink is not None:
+        target = as_sink(sink)
+    else:
+        if target_graph is None:
+            target_graph = Graph()
+        target = target_graph
+
+    # Prefixes are collected as the pages are converted and bound once at the end
+    collected = dict() if prefixes is None else prefixes
 
     if metavoc is None:
-        metavoc = FHIRMetaVoc().g
+        metavoc = FHIRMetaVoc().schema
     elif isinstance(metavoc, FHIRMetaVoc):
-        metavoc = metavoc.g
-
-    page_fname = json_fname
-    while page_fname:
-        data = load(page_fname)
-        if 'resourceType' in data and data.resourceType != 'Bundle':
-            FHIRResource(metavoc, None, base_uri, data, target=target_graph, add_ontology_header=add_ontology_header,
-                         replace_narrative_text=replace_narrative_text)
-            page_fname = check_for_continuation(data)
-        elif 'entry' in data and isinstance(data.entry, list) and 'resource' in data.entry[0]:
-            FHIRCollection(metavoc, None, base_uri, data, target=target_graph,
-                           add_ontology_header=add_ontology_header if 'resourceType' in data else False,
-                           replace_narrative_text=replace_narrative_text)
-            page_fname = check_for_continuation(data)
-        else:
-            page_fname = None
-            target_graph = None
-    return target_graph
+        metavoc = metavoc.schema
+
+    for page in json_fname if isinstance(json_fname, list) else [json_fname]:
+        while page is not None:
+            if stream and isinstance(page, str):
+                with JSONStream(page, json_decoder, raw_literals) as js:
+                    data, converted = convert_entries(js)
+                if converted:
+                    page = check_for_continuation(data)
+                    continue
+            else:
+                data = load_json(page, json_decoder, raw_literals) if isinstance(page, str) else page
+            if 'resourceType' in data and data['resourceType'] != 'Bundle':
+                FHIRResource(metavoc, None, base_uri, data, target=target, add_ontology_header=add_ontology_header,
+                             replace_narrative_text=replace_narrative_text, fhir_release=fhir_release,
+                             raw_literals=raw_literals, node_ids=node_ids, entry_pool=entry_pool, stats=stats,
+                             diagnostics=diagnostics, prefixes=collected)
+            elif 'entry' in data and isinstance(data['entry'], list) and 'resource' in data['entry'][0]:
+                FHIRCollection(metavoc, None, base_uri, data, target=target,
+                               add_ontology_header=add_ontology_header if 'resourceType' in data else False,
+                               replace_narrative_text=replace_narrative_text, fhir_release=fhir_release,
+                               raw_literals=raw_literals, node_ids=node_ids, entry_pool=entry_pool, stats=stats,
+                               diagnostics=diagnostics, prefixes=collected)
+            else:
+                return None
+            page = check_for_continuation(data)
+    if prefixes is None:
+        bind_prefixes(as_sink(target), collected)
+    if sink is not None:
+        target.flush()
+    return target_graph if sink is None else target
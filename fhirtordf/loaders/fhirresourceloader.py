@@ -1,20 +1,31 @@
 
+import hashlib
+import itertools
 import re
 import urllib
-from typing import Union, List, Optional, Dict
+from collections import Counter
+from typing import Union, List, Optional, Dict, Callable, Tuple
 from urllib.parse import urlencode
 from uuid import uuid4
 
-from jsonasobj.jsonobj import JsonObj, load, JsonObjTypes
 from rdflib import Graph, OWL, RDF, URIRef, Namespace
-from rdflib.term import Node, BNode, Literal
-
-from fhirtordf.fhir.fhirmetavoc import FHIRMetaVocEntry
+from rdflib.term import Node, BNode
+
+from fhirtordf.fhir.fhirmetavoc import FHIRSchema, FHIRMetaVoc
+from fhirtordf.fhir.vocabularyregistry import FHIRVocabularyRegistry
+from fhirtordf.loaders.conversionstats import ConversionStats
+from fhirtordf.loaders.diagnostics import Diagnostics, MISSING_ELEMENT, ENTRY_ELEMENT, FHIR_COMMENT, UNKNOWN_KEY, \
+    EXTENSION_LIST
+from fhirtordf.loaders.fhirentrypool import EntryPool
+from fhirtordf.loaders.jsondecoder import JSONObject, JSONDecoder, JSON_OBJECT_TYPES, load_json, json_dict
+from fhirtordf.rdfsupport.codesystemresolver import CodeSystemResolver
 from fhirtordf.rdfsupport.fhirgraphutils import value
-from fhirtordf.rdfsupport.namespaces import FHIR, LOINC, SNOMEDCT, namespaces
-from fhirtordf.rdfsupport.fhirresourcere import FHIR_RESOURCE_RE, FHIR_RE_BASE, FHIR_RE_RESOURCE, \
-    REPLACED_NARRATIVE_TEXT
+from fhirtordf.rdfsupport.namespaces import FHIR, LOINC, SNOMEDCT, namespaces, core_namespaces, core_namespaces_owl
+from fhirtordf.rdfsupport.fhirresourcere import REPLACED_NARRATIVE_TEXT
 from fhirtordf.rdfsupport.prettygraph import PrettyGraph
+from fhirtordf.rdfsupport.rdfcompare import subj_pred_idx_to_uri
+from fhirtordf.rdfsupport.termpool import TermPool
+from fhirtordf.rdfsupport.triplesink import SinkTypes, TripleSink, as_sink
 
 
 def loinc_uri(_: str, code: str, nsmap: Dict[str, Namespace]) -> Optional[URIRef]:
@@ -45,35 +56,94 @@ def hl7_fhir_uri(system: str, code: str, nsmap: Dict[str, Namespace]) -> Optiona
 # Map from FHIR codesystem URI to generator
 # NOTE: The "hl7.org/fhir" URI's were removed from FHIR sometime in the past couple of years.  We are not sure whether
 #       they still exist anywhere but, in any case, the tests remain for historical data
-codesystem_maps = {"http://loinc.org": loinc_uri,
-                   "http://snomed.info/sct": snomed_uri,
-                   re.compile(r"http://hl7.org/fhir/v3/*"): hl7_v3_uri,
-                   re.compile(r"http://hl7.org/fhir/v2/*"): hl7_v2_uri,
-                   re.compile(r"http://hl7.org/fhir/[a-z-]+"): hl7_fhir_uri,
-                   re.compile(r"http://terminology.hl7.org/CodeSystem/v3-*"): hl7_v3_uri,
-                   re.compile(r"http://terminology.hl7.org/CodeSystem/v2-*"): hl7_v2_uri,
-                   re.compile(r"http://terminology.hl7.org/CodeSystem/[a-z-]+"): hl7_fhir_uri}
+codesystem_resolver = CodeSystemResolver()
+codesystem_resolver.register("http://loinc.org", loinc_uri)
+codesystem_resolver.register("http://snomed.info/sct", snomed_uri)
+codesystem_resolver.register_prefix("http://hl7.org/fhir/v3", hl7_v3_uri)
+codesystem_resolver.register_prefix("http://hl7.org/fhir/v2", hl7_v2_uri)
+codesystem_resolver.register_prefix("http://hl7.org/fhir/", hl7_fhir_uri, r"[a-z-]")
+codesystem_resolver.register_prefix("http://terminology.hl7.org/CodeSystem/v3", hl7_v3_uri)
+codesystem_resolver.register_prefix("http://terminology.hl7.org/CodeSystem/v2", hl7_v2_uri)
+codesystem_resolver.register_prefix("http://terminology.hl7.org/CodeSystem/", hl7_fhir_uri, r"[a-z-]")
+
+COUNTER_NODE_IDS = 'counter'
+PATH_NODE_IDS = 'path'
+NODE_IDS = (COUNTER_NODE_IDS, PATH_NODE_IDS)
+
+NodeAllocator = Callable[[Node, URIRef, Optional[int]], Node]
+
+
+def random_node(_: Node, __: URIRef, ___: Optional[int]=None) -> BNode:
+    return BNode()
+
+
+def node_allocator(node_ids: Optional[str], resource_uri: URIRef) -> NodeAllocator:
+    """
+    Return the function that FHIRResource uses to identify the node for a value (node(subj, pred, list_idx))
+    :param node_ids: None, COUNTER_NODE_IDS or PATH_NODE_IDS (see FHIRResource)
+    :param resource_uri: URI of the resource being converted.  Counter based ids start with a digest of it, so two
+    resources converted into the same graph don't share nodes
+    :return: node allocator
+    """
+    if node_ids is None:
+        return random_node
+    if node_ids == PATH_NODE_IDS:
+        return subj_pred_idx_to_uri
+    if node_ids == COUNTER_NODE_IDS:
+        prefix = 'n' + hashlib.sha1(str(resource_uri).encode('utf-8')).hexdigest()[:12] + '_'
+        counter = itertools.count()
+
+        def counter_node(_: Node, __: URIRef, ___: Optional[int]=None) -> BNode:
+            return BNode(prefix + str(next(counter)))
+        return counter_node
+    raise ValueError("Unrecognized node_ids option: {}".format(node_ids))
 
 
 class FHIRResource:
     """ A FHIR RDF representation of a FHIR JSON resource """
-    def __init__(self, vocabulary: Graph, json_fname: Optional[str], base_uri: str,
-                 data: Optional[JsonObj]=None, target: Optional[Graph]=None, add_ontology_header: bool=True,
-                 replace_narrative_text: bool=False, is_root=True, resource_uri: Optional[URIRef]=None):
+    term_pool = TermPool()              # Literals and URIRefs shared by every conversion
+    codesystems = codesystem_resolver   # Code system URI to RDF type generator for Codings
+
+    def __init__(self, vocabulary: Union[Graph, FHIRSchema, FHIRMetaVoc, FHIRVocabularyRegistry],
+                 json_fname: Optional[str], base_uri: str,
+                 data: Optional[JSONObject]=None, target: Optional[SinkTypes]=None, add_ontology_header: bool=True,
+                 replace_narrative_text: bool=False, is_root=True, resource_uri: Optional[URIRef]=None,
+                 fhir_release: Optional[str]=None, release_hint: Optional[str]=None, raw_literals: bool=False,
+                 node_ids: Optional[str]=None, entry_pool: Optional[EntryPool]=None,
+                 json_decoder: Optional[JSONDecoder]=None, stats: Optional[ConversionStats]=None,
+                 diagnostics: Optional[Diagnostics]=None, prefixes: Optional[Dict[str, str]]=None):
         """
         Construct an RDF representation
-        :param vocabulary: FHIR Metadata Vocabulary (fhir.ttl)
+        :param vocabulary: FHIR Metadata Vocabulary (fhir.ttl), its compiled schema or a registry of vocabularies
         :param json_fname: URI or file name of resource to convert
         :param base_uri: base of resource URI -- will be combined with the resource id to generate the actual URI
-        :param data: if present load this data rather than json_fname
-        :param target: target graph -- used for collections, bundles, etc.
+        :param data: if present load this data rather than json_fname.  Either a dictionary (e.g. from json.loads) or a
+                JsonObj
+        :param target: target graph or triple sink -- used for collections, bundles, etc.  Default: a new graph.
+                Anything that isn't a TripleSink is wrapped in one (see as_sink) that is flushed when the conversion
+                is done.  A TripleSink is left for the caller to flush
         :param add_ontology_header: Add the OWL ontology header to the output
         :param replace_narrative_text: Replace long narrative text section with boilerplate
         :param is_root: True means this is a root node, False a component
         :param resource_uri: If present, this becomes the resource subject
+        :param fhir_release: FHIR release to convert with if vocabulary is a registry.  Default: detect
+        :param release_hint: FHIR release of the enclosing bundle or collection if it can't be detected
+        :param raw_literals: Emit typed literals with the lexical form from the JSON, without parsing them into python
+                values.  Decimals keep their precision (e.g. 1.50 stays "1.50")
+        :param node_ids: How value nodes are identified.  None: random BNodes.  COUNTER_NODE_IDS: BNodes numbered in
+                the order they are produced.  PATH_NODE_IDS: URIs built from the FHIR path (see subj_pred_idx_to_uri).
+                Either of the latter gives the same output every time a resource is converted
+        :param entry_pool: If present, convert the resources of Bundle entries in this pool of worker processes
+        :param json_decoder: Function that decodes the text of json_fname (e.g. orjson.loads).  Default: json.loads,
+                keeping decimals as text if raw_literals is set.  A decoder used with raw_literals should do the same
+        :param stats: If present, add the statistics for this conversion to it
+        :param diagnostics: If present, report the parts of the JSON that were skipped or dropped to it
+        :param prefixes: If present, the prefixes that the output uses are added to it instead of being bound in
+                target, so that whoever collects the output can bind them once at the end (see bind_prefixes).
+                Otherwise every prefix that the output might use is bound in target
         """
         if json_fname:
-            self.root = load(json_fname)
+            self.root = load_json(json_fname, json_decoder, raw_literals)
         elif data:
             self.root = data
         else:
@@ -85,47 +155,99 @@ class FHIRResource:
             self._resource_uri = resource_uri
         else:
             if 'id' not in self.root:
-                self.root.id = str(uuid4())
-            self._resource_uri = URIRef(self._base_uri + self.root.resourceType + '/' + self.root.id)
-        self._meta = FHIRMetaVocEntry(vocabulary, FHIR[self.root.resourceType])
-        self._g = PrettyGraph() if target is None else target
-        self._vocabulary = vocabulary
+                self.root['id'] = str(uuid4())
+            self._resource_uri = URIRef(self._base_uri + self.root['resourceType'] + '/' + self.root['id'])
+        if isinstance(vocabulary, FHIRVocabularyRegistry):
+            self._registry = vocabulary
+            self._fhir_release = fhir_release
+            self.release = vocabulary.release_for(self.root, fhir_release, release_hint)
+            self._schema = vocabulary.schema(self.release)
+        else:
+            self._registry = self._fhir_release = self.release = None
+            self._schema = FHIRSchema.for_vocabulary(vocabulary)
+        self._converters = self._schema.converters
+        self._sink = as_sink(PrettyGraph() if target is None else target)
+        self._flush_sink = self._sink is not target       # A sink that is passed in is flushed by whoever passed it
+        self._g = self._sink.graph
+        self._add = self._sink.add
         self._addl_namespaces = dict()
+        self._prefixes = prefixes
         self._add_ontology_header = add_ontology_header
         self._replace_narrative_text = replace_narrative_text
+        self.raw_literals = raw_literals
+        self.node_ids = node_ids
+        self.node = node_allocator(node_ids, self._resource_uri)
+        self.entry_pool = entry_pool
+        self.stats = stats
+        self.diagnostics = diagnostics
+        self.unknown_keys = Counter()   # type: Counter[Tuple[URIRef, str]]
+        if stats is not None:
+            self._count_triples(stats)
         self.generate(is_root)
 
     @property
     def resource_id(self) -> Optional[str]:
-        return value(self._g, self._resource_uri, FHIR.Resource.id)
+        if self._g is not None:
+            return value(self._g, self._resource_uri, FHIR.Resource.id)
+        return str(self.root['id']) if 'id' in self.root else None
+
+    @property
+    def resource_uri(self) -> URIRef:
+        return self._resource_uri
 
     @property
     def resource_type(self) -> str:
-        return self.root.resourceType
+        return self.root['resourceType']
+
+    @property
+    def schema(self) -> FHIRSchema:
+        return self._schema
 
     @property
-    def graph(self):
+    def graph(self) -> Optional[Graph]:
+        """ The target graph -- None if the triples went to some other kind of sink """
         return self._g
 
+    @property
+    def sink(self) -> TripleSink:
+        return self._sink
+
+    def _count_triples(self, stats: ConversionStats) -> None:
+        """ Count the triples that go to the sink and track the shared caches """
+        add = self._add
+
+        def counting_add(triple) -> None:
+            stats.triples += 1
+            add(triple)
+        self._add = counting_add
+        stats.track('term', self.term_pool)
+        stats.track('code system', self.codesystems)
+        stats.track('vocabulary', self._schema)
+        stats.track('reference', self._schema.reference_parser)
+
     def add_prefixes(self, nsmap: Dict[str, Namespace]) -> None:
         """
         Add the required prefix definitions
         :return:
         """
-        [self._g.bind(e[0], e[1]) for e in nsmap.items()]
+        if self._prefixes is not None:
+            self._prefixes.update(nsmap)
+        else:
+            [self._sink.bind(e[0], e[1]) for e in nsmap.items()]
 
     def add_ontology_definition(self) -> None:
         ont_uri = URIRef(str(self._resource_uri) + ".ttl")
         self.add(ont_uri, RDF.type, OWL.Ontology)\
             .add(ont_uri, OWL.imports, FHIR['fhir.ttl'])
-        if 'meta' in self.root and 'versionId' in self.root.meta:
+        if 'meta' in self.root and 'versionId' in self.root['meta']:
             ont_uri_str = str(ont_uri)
             if re.search(r'\.\w+$', ont_uri_str):
                 ont_uri_str, suffix = ont_uri_str.rsplit('.', 1)
                 suffix = '.' + suffix
             else:
                 suffix = ''
-            self.add(ont_uri, OWL.versionIRI, URIRef(ont_uri_str + '/_history/' + self.root.meta.versionId + suffix))
+            self.add(ont_uri, OWL.versionIRI,
+                     URIRef(ont_uri_str + '/_history/' + self.root['meta']['versionId'] + suffix))
 
     def add(self, subj: Node, pred: URIRef, obj: Node) -> "FHIRResource":
         """
@@ -135,10 +257,10 @@ class FHIRResource:
         :param obj:
         :return: self for chaining
         """
-        self._g.add((subj, pred, obj))
+        self._add((subj, pred, obj))
         return self
 
-    def add_value_node(self, subj: Node, pred: URIRef, val: Union[JsonObj, str, List],
+    def add_value_node(self, subj: Node, pred: URIRef, val: Union[JSONObject, str, List],
                        valuetype: Optional[URIRef]= None) -> None:
         """
         Expand val according to the range of pred and add it to the graph
@@ -147,26 +269,27 @@ class FHIRResource:
         :param val: JSON representation of target object
         :param valuetype: predicate type if it can't be directly determined
         """
-        pred_type = self._meta.predicate_type(pred) if not valuetype else valuetype
-        # Transform generic resources into specific types
-        if pred_type == FHIR.Resource:
-            pred_type = FHIR[val.resourceType]
-
-        val_meta = FHIRMetaVocEntry(self._vocabulary, pred_type)
-        for k, p in val_meta.predicates().items():
-            if isinstance(val, JsonObj) and k in val:
-                self.add_val(subj, p, val, k)
-                if pred == FHIR.CodeableConcept.coding:
-                    self.add_type_arc(subj, val)
-            elif k == "value" and val_meta.predicate_type(p) == FHIR.Element:
-                # value / Element is the wild card combination -- if there is a "value[x]" in val, emit it where the
-                # type comes from 'x'
-                for vk in val._as_dict.keys():
-                    if vk.startswith(k):
-                        self.add_val(subj, FHIR['Extension.' + vk], val, vk, self._meta.value_predicate_to_type(vk))
-            else:
-                # Can have an extension only without a primary value
-                self.add_extension_val(subj, val, k, p)
+        self._walk_from(self._expand_value_node, subj, pred, val, valuetype)
+
+    def unknown_key(self, type_uri: URIRef, key: str) -> None:
+        """
+        Record a JSON key that the vocabulary doesn't define for the type of the object it appears in
+        :param type_uri: FHIR type of the object
+        :param key: JSON key
+        """
+        self.unknown_keys[(type_uri, key)] += 1
+        if self.diagnostics is not None:
+            self.diagnostics.report(UNKNOWN_KEY, self._resource_uri, "{} has no element '{}'", type_uri, key)
+
+    def diagnose(self, code: str, fmt: str, *args) -> None:
+        """
+        Report a diagnostic for this resource if anyone is collecting them (see Diagnostics.report)
+        :param code: diagnostic code
+        :param fmt: message format
+        :param args: message arguments
+        """
+        if self.diagnostics is not None:
+            self.diagnostics.report(code, self._resource_uri, fmt, *args)
 
     def add_reference(self, subj: Node, val: str) -> None:
         """
@@ -174,11 +297,11 @@ class FHIRResource:
         :param subj: reference subject
         :param val: reference value
         """
-        match = FHIR_RESOURCE_RE.match(val)
+        ref = self._schema.reference_parser.parse(val)
         ref_uri_str = res_type = None
-        if match:
-            ref_uri_str = val if match.group(FHIR_RE_BASE) else (self._base_uri + urllib.parse.quote(val))
-            res_type = match.group(FHIR_RE_RESOURCE)
+        if ref:
+            ref_uri_str = val if ref.base else (self._base_uri + urllib.parse.quote(val))
+            res_type = ref.resource_type
         elif '://' in val:
             ref_uri_str = val
             res_type = "Resource"
@@ -186,31 +309,28 @@ class FHIRResource:
             ref_uri_str = self._base_uri + urllib.parse.quote(val)
             res_type = val.split('/', 1)[0] if '/' in val else "Resource"
         if ref_uri_str:
-            ref_uri = URIRef(ref_uri_str)
+            ref_uri = self.term_pool.uri(ref_uri_str)
             self.add(subj, FHIR.link, ref_uri)
-            self.add(ref_uri, RDF.type, FHIR[res_type])
+            self.add(ref_uri, RDF.type, self.term_pool.uri(str(FHIR) + res_type))
 
-    def add_type_arc(self, subj: Node, val: JsonObj) -> None:
+    def add_type_arc(self, subj: Node, val: JSONObject) -> None:
         if "system" in val and "code" in val:
-            for k in codesystem_maps.keys():
-                if (isinstance(k, str) and k == val.system) or (not isinstance(k, str) and k.match(val.system)):
-                    type_uri = codesystem_maps[k](val.system, urllib.parse.quote(val.code), self._addl_namespaces)
-                    if type_uri:
-                        self.add(subj, RDF.type, type_uri)
-                    break
-
-    def node_subject(self, list_idx: int, subj: Node, pred: URIRef, node: JsonObj) -> Node:
+            type_uri = self.codesystems.type_uri(val['system'], val['code'], self._addl_namespaces)
+            if type_uri:
+                self.add(subj, RDF.type, type_uri)
+
+    def node_subject(self, list_idx: int, subj: Node, pred: URIRef, node: JSONObject) -> Node:
         if pred == FHIR.Bundle.entry:
-            entry = BNode()
-            self.add(entry, FHIR.index, Literal(list_idx))
+            entry = self.node(subj, pred, list_idx)
+            self.add(entry, FHIR.index, self.term_pool.index(list_idx))
             self.add_val(entry, FHIR.Bundle.entry.fullUrl, node, 'fullUrl')
-            self.add(entry, FHIR.Bundle.entry.resource, URIRef(node.fullUrl))
+            self.add(entry, FHIR.Bundle.entry.resource, self.term_pool.uri(node['fullUrl']))
             self.add(subj, pred, entry)
-            return URIRef(node.fullUrl)
+            return self.term_pool.uri(node['fullUrl'])
         else:
-            return BNode()
+            return self.node(subj, pred, list_idx)
 
-    def add_val(self, subj: Node, pred: URIRef, json_obj: JsonObj, json_key: str,
+    def add_val(self, subj: Node, pred: URIRef, json_obj: JSONObject, json_key: str,
                 valuetype: Optional[URIRef] = None) -> Optional[BNode]:
         """
         Add the RDF representation of val to the graph as a target of subj, pred.  Note that FHIR lists are
@@ -222,65 +342,12 @@ class FHIRResource:
         :param valuetype: value type if NOT determinable by predicate
         :return: value node if target is a BNode else None
         """
-        if json_key not in json_obj:
-            print("Expecting to find object named '{}' in JSON:".format(json_key))
-            print(json_obj._as_json_dumps())
-            print("entry skipped")
-            return None
-        val = json_obj[json_key]
-        if isinstance(val, List):
-            list_idx = 0
-            for lv in val:
-                entry_bnode = BNode()
-                # TODO: this is getting messy. Refactor and clean this up
-                if pred == FHIR.Bundle.entry:
-                    entry_subj = URIRef(lv.fullUrl)
-                    self.add(entry_bnode, FHIR.index, Literal(list_idx))
-                    self.add_val(entry_bnode, FHIR.Bundle.entry.fullUrl, lv, 'fullUrl')
-                    self.add(entry_bnode, FHIR.Bundle.entry.resource, entry_subj)
-                    self.add(subj, pred, entry_bnode)
-                    entry_mv = FHIRMetaVocEntry(self._vocabulary, FHIR.BundleEntryComponent)
-                    for k, p in entry_mv.predicates().items():
-                        if k not in ['resource', 'fullUrl'] and k in lv:
-                            print("---> adding {}".format(k))
-                            self.add_val(subj, p, lv, k)
-                    FHIRResource(self._vocabulary, None,  self._base_uri, lv.resource, self._g,
-                                 False, self._replace_narrative_text, False, resource_uri=entry_subj)
-                else:
-                    self.add(entry_bnode, FHIR.index, Literal(list_idx))
-                    if isinstance(lv, JsonObj):
-                        self.add_value_node(entry_bnode, pred, lv, valuetype)
-                    else:
-                        vt = self._meta.predicate_type(pred)
-                        atom_type = self._meta.primitive_datatype_nostring(vt) if vt else None
-                        self.add(entry_bnode, FHIR.value, Literal(lv, datatype=atom_type))
-                    self.add(subj, pred, entry_bnode)
-                list_idx += 1
-        else:
-            vt = self._meta.predicate_type(pred) if not valuetype else valuetype
-            if self._meta.is_atom(pred):
-                if self._replace_narrative_text and pred == FHIR.Narrative.div and len(val) > 120:
-                    val = REPLACED_NARRATIVE_TEXT
-                self.add(subj, pred, Literal(val))
-            else:
-                v = BNode()
-                if self._meta.is_primitive(vt):
-                    self.add(v, FHIR.value, Literal(str(val), datatype=self._meta.primitive_datatype_nostring(vt, val)))
-                else:
-                    self.add_value_node(v, pred, val, valuetype)
-                self.add(subj, pred, v)
-                if pred == FHIR.Reference.reference:
-                    self.add_reference(subj, val)
-                elif pred == FHIR.RelatedArtifact.resource:
-                    self.add_reference(v, val)
-                self.add_extension_val(v, json_obj, json_key)
-                return v
-        return None
+        return self._walk_from(self._expand_val, subj, pred, json_obj, json_key, valuetype)
 
     def add_extension_val(self,
                           subj: Node,
                           json_obj:
-                          Union[JsonObj, List[JsonObjTypes]],
+                          Union[JSONObject, List],
                           key: str,
                           pred: Optional[URIRef] = None) -> None:
         """
@@ -324,43 +391,252 @@ class FHIRResource:
         :param key: name of element that is possibly extended (as indicated by "_" prefix)
         :param pred: predicate for the contained elements. Only used in situations 3) (?) and 4 
         """
+        self._walk_from(self._expand_extension_val, subj, json_obj, key, pred)
+
+    # Traversal.  The JSON is walked with an explicit work stack rather than by recursion, so deeply nested resources
+    # can't exhaust the python stack.  Each _expand_ method does the work of the corresponding add_ method for one
+    # level of the JSON.  Rather than descending into a nested object, list entry or extension, it appends a frame --
+    # (method, arguments) -- to the frames list.  Frames are moved onto the work stack in reverse, so the stack pops
+    # them in the order that they were appended.  The generated converters (see convertergen) work the same way.
+
+    def _walk_from(self, expand, *args) -> Optional[BNode]:
+        """
+        Run expand(*args) and then all of the frames that it (transitively) produces
+        :param expand: _expand_ method
+        :param args: arguments to expand (less the frames list)
+        :return: whatever expand returns
+        """
+        stack = []
+        frames = []
+        rval = expand(frames, *args)
+        pop = stack.pop
+        while True:
+            if frames:
+                frames.reverse()
+                stack.extend(frames)
+                frames.clear()
+            if not stack:
+                return rval
+            expand, args = pop()
+            expand(frames, *args)
+
+    def _expand_value_node(self, frames: List, subj: Node, pred: URIRef, val: Union[JSONObject, str, List],
+                           valuetype: Optional[URIRef]) -> None:
+        """ add_value_node for the work stack """
+        pred_type = self._schema.predicate_type(pred) if not valuetype else valuetype
+        contained = pred_type == FHIR.Resource
+        if contained:
+            pred_type = self.term_pool.uri(str(FHIR) + val['resourceType'])
+
+        if not isinstance(val, JSON_OBJECT_TYPES):
+            return
+        converter = self._converters.get(pred_type) if self._converters else None
+        if converter is not None:
+            converter(frames, self, subj, pred, val)
+            return
+
+        properties = self._schema.properties(pred_type)
+        choices = self._schema.choice_properties(pred_type)
+        for k in json_dict(val):
+            prop = properties.get(k)
+            if prop is not None:
+                self._expand_val(frames, subj, prop.predicate, val, k, None)
+                continue
+            prop = choices.get(k)
+            if prop is not None:
+                self._expand_val(frames, subj, prop.predicate, val, k, prop.range)
+            elif k[:1] == '_':
+                prop = properties.get(k[1:])
+                if prop is not None:
+                    if k[1:] not in val:
+                        frames.append((self._expand_extension_val, (subj, val, k[1:], prop.predicate)))
+                elif k[1:] not in choices:
+                    self.unknown_key(pred_type, k)
+            elif not (contained and k == 'resourceType'):
+                self.unknown_key(pred_type, k)
+        if pred == FHIR.CodeableConcept.coding:
+            self.add_type_arc(subj, val)
+
+    def _expand_val(self, frames: List, subj: Node, pred: URIRef, json_obj: JSONObject, json_key: str,
+                    valuetype: Optional[URIRef]) -> Optional[BNode]:
+        """ add_val for the work stack """
+        if json_key not in json_obj:
+            self.diagnose(MISSING_ELEMENT, "Expecting to find '{}' in the JSON for {} -- skipped", json_key, subj)
+            return None
+        val = json_obj[json_key]
+        if isinstance(val, List):
+            if self.stats is not None:
+                self.stats.lists += 1
+            if val and pred == FHIR.Bundle.entry and self.entry_pool is not None:
+                self._expand_pooled_entries(frames, subj, pred, val)
+            elif val:
+                frames.append((self._expand_list_entry, (subj, pred, val, 0, valuetype)))
+            return None
+        vt = self._schema.predicate_type(pred) if not valuetype else valuetype
+        if self._schema.is_atom(pred):
+            if self._replace_narrative_text and pred == FHIR.Narrative.div and len(val) > 120:
+                val = REPLACED_NARRATIVE_TEXT
+            self._add((subj, pred, self.term_pool.literal(val)))
+            return None
+        v = self.node(subj, pred)
+        if self._schema.is_primitive(vt):
+            datatype = self._schema.primitive_datatype_nostring(vt, val)
+            self._add((v, FHIR.value, self.term_pool.raw_literal(val, datatype) if self.raw_literals
+                       else self.term_pool.literal(str(val), datatype)))
+        else:
+            frames.append((self._expand_value_node, (v, pred, val, valuetype)))
+        self._add((subj, pred, v))
+        if pred == FHIR.Reference.reference:
+            self.add_reference(subj, val)
+        elif pred == FHIR.RelatedArtifact.resource:
+            self.add_reference(v, val)
+        if '_' + json_key in json_obj:
+            frames.append((self._expand_extension_val, (v, json_obj, json_key, None)))
+        return v
+
+    def _expand_list_entry(self, frames: List, subj: Node, pred: URIRef, val: List, list_idx: int,
+                           valuetype: Optional[URIRef]) -> None:
+        """ Entry list_idx of a list valued add_val, followed by a frame for the next entry """
+        lv = val[list_idx]
+        if pred == FHIR.Bundle.entry:
+            self._expand_bundle_entry(frames, subj, pred, lv, list_idx)
+        else:
+            entry_bnode = self.node(subj, pred, list_idx)
+            self._add((entry_bnode, FHIR.index, self.term_pool.index(list_idx)))
+            if isinstance(lv, JSON_OBJECT_TYPES):
+                frames.append((self._expand_value_node, (entry_bnode, pred, lv, valuetype)))
+            else:
+                vt = self._schema.predicate_type(pred)
+                atom_type = self._schema.primitive_datatype_nostring(vt) if vt else None
+                self._add((entry_bnode, FHIR.value, self.term_pool.raw_literal(lv, atom_type) if self.raw_literals
+                           else self.term_pool.literal(lv, atom_type)))
+            self._add((subj, pred, entry_bnode))
+        if list_idx + 1 < len(val):
+            frames.append((self._expand_list_entry, (subj, pred, val, list_idx + 1, valuetype)))
+
+    def _add_entry_elements(self, frames: List, subj: Node, pred: URIRef, lv: JSONObject, list_idx: int) -> URIRef:
+        """
+        Add Bundle entry list_idx, less its resource
+        :return: URI of the entry's resource
+        """
+        entry_bnode = self.node(subj, pred, list_idx)
+        self._add((entry_bnode, FHIR.index, self.term_pool.index(list_idx)))
+        entry_subj = self.term_pool.uri(lv['fullUrl'])
+        self._expand_val(frames, entry_bnode, FHIR.Bundle.entry.fullUrl, lv, 'fullUrl', None)
+        self._add((entry_bnode, FHIR.Bundle.entry.resource, entry_subj))
+        for k, prop in self._schema.properties(FHIR.BundleEntryComponent).items():
+            if k not in ['resource', 'fullUrl'] and k in lv:
+                self.diagnose(ENTRY_ELEMENT, "Bundle entry {} element '{}'", lv['fullUrl'], k)
+                self._expand_val(frames, subj, prop.predicate, lv, k, None)
+        self._add((subj, pred, entry_bnode))
+        return entry_subj
+
+    def _expand_bundle_entry(self, frames: List, subj: Node, pred: URIRef, lv: JSONObject, list_idx: int) -> None:
+        """ Bundle entry.  The resource is walked in place unless it needs a different FHIR release """
+        entry_subj = self._add_entry_elements(frames, subj, pred, lv, list_idx)
+        release = self._registry.release_for(lv['resource'], self._fhir_release, self.release) \
+            if self._registry else None
+        if release != self.release:
+            frames.append((self._nested_resource, (entry_subj, lv['resource'])))
+        elif 'resourceType' not in lv['resource']:
+            raise ValueError("{} is not a FHIR resource".format(lv['fullUrl']))
+        elif self.stats is not None:
+            frames.append((self._begin_stats, (lv['resource']['resourceType'], )))
+            frames.append((self._expand_resource, (entry_subj, lv['resource'])))
+            frames.append((self._end_stats, ()))
+        else:
+            frames.append((self._expand_resource, (entry_subj, lv['resource'])))
+
+    def _expand_pooled_entries(self, frames: List, subj: Node, pred: URIRef, val: List) -> None:
+        """ Bundle entries whose resources are converted by the entry pool """
+        resources = [(self._add_entry_elements(frames, subj, pred, lv, list_idx), lv['resource'])
+                     for list_idx, lv in enumerate(val)]
+        self.entry_pool.convert(self._base_uri, resources, self._sink, self.term_pool, add_ontology_header=False,
+                                replace_narrative_text=self._replace_narrative_text, is_root=False,
+                                fhir_release=self._fhir_release, release_hint=self.release,
+                                raw_literals=self.raw_literals, node_ids=self.node_ids, stats=self.stats,
+                                diagnostics=self.diagnostics, prefixes=self._prefixes)
+
+    def _nested_resource(self, _: List, subj: URIRef, json_obj: JSONObject) -> None:
+        """ Convert a bundle entry that belongs to another FHIR release """
+        nested = FHIRResource(self._registry, None, self._base_uri, json_obj, self._sink, False,
+                              self._replace_narrative_text, False, resource_uri=subj, fhir_release=self._fhir_release,
+                              release_hint=self.release, raw_literals=self.raw_literals, node_ids=self.node_ids,
+                              entry_pool=self.entry_pool, stats=self.stats, diagnostics=self.diagnostics,
+                              prefixes=self._prefixes)
+        self.unknown_keys.update(nested.unknown_keys)
+
+    def _begin_stats(self, _: List, resource_type: str) -> None:
+        self.stats.begin(resource_type)
+
+    def _end_stats(self, _: List) -> None:
+        self.stats.end()
+
+    def _expand_extension_val(self, frames: List, subj: Node, json_obj: Union[JSONObject, List],
+                              key: str, pred: Optional[URIRef]) -> None:
+        """ add_extension_val for the work stack """
         extendee_name = "_" + key
         if extendee_name in json_obj:
-            if not isinstance(subj, BNode):
+            if not isinstance(subj, BNode) and self.node_ids != PATH_NODE_IDS:
                 raise NotImplementedError("Extension to something other than a simple BNode")
-            if isinstance(json_obj[extendee_name], list):
+            if self.stats is not None:
+                self.stats.extensions += 1
+            extendee = json_obj[extendee_name]
+            if isinstance(extendee, list):
                 if not pred:
-                    raise NotImplemented("Case 3 not implemented")
-                entry_idx = 0
-                for extension in json_obj[extendee_name]:
-                    entry = BNode()
-                    self.add(entry, FHIR.index, Literal(entry_idx))
-                    self.add_val(entry, FHIR.Element.extension, extension, 'extension')
-                    self.add(subj, pred, entry)
-                    entry_idx += 1
-            elif 'fhir_comments' in json_obj[extendee_name] and len(json_obj[extendee_name]) == 1:
-                # TODO: determine whether and how fhir comments should be represented in RDF.
-                # for the moment we just drop them
-                print("fhir_comment ignored")
-                print(json_obj[extendee_name]._as_json_dumps())
-                pass
+                    # Case 3 -- there is nothing to attach a list of extensions to
+                    self.diagnose(EXTENSION_LIST, "List of extensions for single valued '{}' -- skipped", key)
+                    return
+                for entry_idx, extension in enumerate(extendee):
+                    entry = self.node(subj, pred, entry_idx)
+                    self._add((entry, FHIR.index, self.term_pool.index(entry_idx)))
+                    self._expand_val(frames, entry, FHIR.Element.extension, extension, 'extension', None)
+                    self._add((subj, pred, entry))
+            elif 'fhir_comments' in extendee and len(extendee) == 1:
+                self.diagnose(FHIR_COMMENT, "fhir_comments on '{}' dropped: {}", key, extendee['fhir_comments'])
             else:
-                self.add_val(subj, FHIR.Element.extension, json_obj[extendee_name], 'extension')
-
-    def add_resource(self, subj: URIRef, json_obj: JsonObj):
-        self.add(subj, RDF.type, FHIR[json_obj.resourceType])
-        for k, p in self._meta.predicates().items():
-            if k in json_obj:
-                self.add_val(subj, p, json_obj, k)
-
-    def generate(self, is_root: bool) -> Graph:
+                self._expand_val(frames, subj, FHIR.Element.extension, extendee, 'extension', None)
+
+    def _expand_resource(self, frames: List, subj: URIRef, json_obj: JSONObject) -> None:
+        """ add_resource for the work stack """
+        resource_type = self.term_pool.uri(str(FHIR) + json_obj['resourceType'])
+        self._add((subj, RDF.type, resource_type))
+        converter = self._converters.get(resource_type) if self._converters else None
+        if converter is not None:
+            converter(frames, self, subj, None, json_obj, root=True)
+            return
+        properties = self._schema.properties(resource_type)
+        for k in json_dict(json_obj):
+            prop = properties.get(k)
+            if prop is not None:
+                self._expand_val(frames, subj, prop.predicate, json_obj, k, None)
+            elif k != 'resourceType' and not (k[:1] == '_' and k[1:] in properties):
+                self.unknown_key(resource_type, k)
+
+    def add_resource(self, subj: URIRef, json_obj: JSONObject) -> None:
+        self._walk_from(self._expand_resource, subj, json_obj)
+
+    def generate(self, is_root: bool) -> Optional[Graph]:
+        if self.stats is not None:
+            self.stats.begin(self.root['resourceType'])
+            try:
+                return self._generate(is_root)
+            finally:
+                self.stats.end()
+        return self._generate(is_root)
+
+    def _generate(self, is_root: bool) -> Optional[Graph]:
         if is_root:
-            self.add_prefixes(namespaces)
+            # Collected prefixes are limited to the ones that the output uses
+            self.add_prefixes(namespaces if self._prefixes is None else
+                              core_namespaces_owl if self._add_ontology_header else core_namespaces)
             if self._add_ontology_header:
                 self.add_ontology_definition()
             self.add(self._resource_uri, FHIR.nodeRole, FHIR.treeRoot)
         self.add_resource(self._resource_uri, self.root)
         self.add_prefixes(self._addl_namespaces)
+        if self._flush_sink:
+            self._sink.flush()
         return self._g
 
     def __str__(self):
@@ -0,0 +1,71 @@
+"""
+JSON input for the loaders.  The loaders walk plain dictionaries and lists (what json.loads returns) and also accept
+jsonasobj JsonObj images.  The decoder that turns JSON text into dictionaries is pluggable, so a faster one
+(e.g. orjson.loads) can be substituted for json.loads.
+"""
+import json
+from functools import partial
+from typing import Union, Dict, Any, List, Callable
+from urllib.request import Request, urlopen
+
+from jsonasobj import JsonObj
+
+JSONObject = Union[Dict[str, Any], JsonObj]
+JSONData = Union[JSONObject, List[Any]]
+JSONDecoder = Callable[[Union[str, bytes]], Any]
+
+JSON_OBJECT_TYPES = (dict, JsonObj)     # for isinstance
+
+
+def default_decoder(raw_literals: bool=False) -> JSONDecoder:
+    """
+    Return the standard decoder
+    :param raw_literals: True means keep decimals as the text that appears in the JSON rather than converting them to
+    floats (see FHIRResource raw_literals)
+    :return: decoder
+    """
+    return partial(json.loads, parse_float=str) if raw_literals else json.loads
+
+
+def read_json(source: str) -> bytes:
+    """
+    Read the JSON text in source
+    :param source: file name or URL
+    :return: JSON text
+    """
+    if '://' in source:
+        req = Request(source)
+        req.add_header("Accept", "application/json, text/json;q=0.9")
+        with urlopen(req) as response:
+            return response.read()
+    with open(source, 'rb') as f:
+        return f.read()
+
+
+def load_json(source: str, decoder: JSONDecoder=None, raw_literals: bool=False) -> JSONData:
+    """
+    Load the JSON in source
+    :param source: file name or URL
+    :param decoder: decoder to use.  Default: default_decoder(raw_literals)
+    :param raw_literals: passed to default_decoder
+    :return: decoded JSON
+    """
+    return (decoder or default_decoder(raw_literals))(read_json(source))
+
+
+def json_dict(obj: JSONObject) -> Dict[str, Any]:
+    """
+    Return the dictionary behind a JSON object.  A JsonObj's dictionary is its __dict__, so nothing is copied
+    :param obj: JSON object
+    :return: dictionary
+    """
+    return obj if type(obj) is dict else vars(obj)
+
+
+def json_dumps(obj: JSONData) -> str:
+    """
+    Return obj as indented JSON text (for messages)
+    :param obj: JSON object or list
+    :return: JSON text
+    """
+    return json.dumps(obj, indent='   ', default=lambda o: vars(o) if isinstance(o, JsonObj) else str(o))
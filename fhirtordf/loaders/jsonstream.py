@@ -0,0 +1,167 @@
+"""
+Incremental parsing of large bundles and search sets.  The members of the outer JSON object are decoded one at a
+time and the elements of a Bundle's "entry" array are handed out as soon as each one is complete, so only the largest
+single entry, rather than the whole bundle, has to be held in memory.
+"""
+import io
+import re
+from typing import Union, Optional, Iterator, TextIO, Dict, Any
+from urllib.request import Request, urlopen
+
+from fhirtordf.loaders.jsondecoder import JSONDecoder, JSONObject, default_decoder
+
+DEFAULT_CHUNK_SIZE = 1 << 16            # Characters read at a time
+
+_ws_re = re.compile(r'[ \t\n\r]*')
+_string_re = re.compile(r'"[^"\\]*(?:\\.[^"\\]*)*"', re.S)
+_bracket_re = re.compile(r'[\[\]{}"]')
+_scalar_end_re = re.compile(r'[ \t\n\r,\]}]')
+
+
+class JSONStream:
+    """ A JSON object whose "entry" elements are decoded one at a time """
+    def __init__(self, source: Union[str, TextIO], decoder: Optional[JSONDecoder]=None, raw_literals: bool=False,
+                 chunk_size: int=DEFAULT_CHUNK_SIZE) -> None:
+        """
+        :param source: file name, URL or open text stream
+        :param decoder: decoder for the individual members and entries.  Default: default_decoder(raw_literals)
+        :param raw_literals: passed to default_decoder
+        :param chunk_size: number of characters to read at a time
+        """
+        if isinstance(source, str):
+            if '://' in source:
+                req = Request(source)
+                req.add_header("Accept", "application/json, text/json;q=0.9")
+                self._f = io.TextIOWrapper(urlopen(req), encoding='utf-8')
+            else:
+                self._f = open(source, encoding='utf-8')
+            self._close = True
+        else:
+            self._f = source
+            self._close = False
+        self.source = source
+        self._decoder = decoder or default_decoder(raw_literals)
+        self.chunk_size = chunk_size
+        self.header = dict()            # type: Dict[str, Any]
+        self.entry_count = 0
+        self._buf = ''
+        self._pos = 0
+        self._eof = False
+
+    def entries(self) -> Iterator[JSONObject]:
+        """
+        Parse the source, yielding the elements of its entry list as they are decoded.  Every other member of the outer
+        object goes into self.header.  Entries are only streamed if the object is a Bundle or a collection without a
+        resourceType -- the entry list of any other resource type (e.g. List) is decoded into the header as well.
+        """
+        self._expect('{')
+        if self._skip_ws() == '}':
+            self._pos += 1
+            return
+        while True:
+            key = self._value()
+            self._expect(':')
+            if key == 'entry' and self.header.get('resourceType', 'Bundle') == 'Bundle' and self._skip_ws() == '[':
+                self._pos += 1
+                if self._skip_ws() == ']':
+                    self._pos += 1
+                else:
+                    while True:
+                        entry = self._value()
+                        self.entry_count += 1
+                        yield entry
+                        if self._next(']'):
+                            break
+            else:
+                self.header[key] = self._value()
+            if self._next('}'):
+                break
+
+    def close(self) -> None:
+        if self._close:
+            self._f.close()
+
+    def __enter__(self) -> "JSONStream":
+        return self
+
+    def __exit__(self, *_) -> None:
+        self.close()
+
+    def _more(self, size: int) -> bool:
+        """
+        Drop the part of the buffer that has been parsed and read at least size more characters
+        :return: False if there was nothing left to read
+        """
+        data = '' if self._eof else self._f.read(max(size, self.chunk_size))
+        self._buf = self._buf[self._pos:] + data
+        self._pos = 0
+        self._eof = not data
+        return bool(data)
+
+    def _skip_ws(self) -> str:
+        """ Move past any white space and return the next character ('' at the end of the source) """
+        while True:
+            self._pos = _ws_re.match(self._buf, self._pos).end()
+            if self._pos < len(self._buf):
+                return self._buf[self._pos]
+            if not self._more(self.chunk_size):
+                return ''
+
+    def _error(self, expected: str) -> ValueError:
+        return ValueError("{}: expecting {} at '{}'".format(self.source, expected,
+                                                            self._buf[self._pos:self._pos + 20]))
+
+    def _expect(self, c: str) -> None:
+        if self._skip_ws() != c:
+            raise self._error("'{}'".format(c))
+        self._pos += 1
+
+    def _next(self, close: str) -> bool:
+        """ Move past the separator after a member or element.  Return True if it was close, False if a comma """
+        c = self._skip_ws()
+        if c not in (',', close):
+            raise self._error("',' or '{}'".format(close))
+        self._pos += 1
+        return c == close
+
+    def _value_end(self) -> int:
+        """ Return the end of the value that starts at the current position, -1 if it isn't all in the buffer """
+        buf = self._buf
+        start = self._pos
+        c = buf[start]
+        if c == '"':
+            m = _string_re.match(buf, start)
+            return m.end() if m else -1
+        if c in '{[':
+            depth = 0
+            pos = start
+            while True:
+                m = _bracket_re.search(buf, pos)
+                if not m:
+                    return -1
+                if m.group() == '"':
+                    m = _string_re.match(buf, m.start())
+                    if not m:
+                        return -1
+                else:
+                    depth += 1 if m.group() in '{[' else -1
+                    if not depth:
+                        return m.end()
+                pos = m.end()
+        m = _scalar_end_re.search(buf, start)
+        return m.start() if m else len(buf) if self._eof else -1
+
+    def _value(self) -> Any:
+        """ Decode the value at the current position, reading as much more of the source as it takes """
+        if not self._skip_ws():
+            raise self._error("a value")
+        end = self._value_end()
+        while end < 0:
+            if self._eof:
+                raise self._error("the end of a value")
+            # Read at least as much again as what is buffered, so a large value is rescanned a bounded number of times
+            self._more(len(self._buf) - self._pos)
+            end = self._value_end()
+        text = self._buf[self._pos:end]
+        self._pos = end
+        return self._decoder(text)
@@ -0,0 +1,129 @@
+"""
+Map code system URIs to the functions that generate an RDF type for a code in the system.  A generator has the
+signature generator(system, quoted_code, nsmap) -> Optional[URIRef] and can add the prefixes that the type URI
+uses to nsmap.
+
+Systems are resolved by an exact match first and then by the longest registered prefix.  Both the generator chosen
+for a system and the type generated for each (system, code) are cached, as the same handful of systems and codes
+recur throughout FHIR data.
+"""
+import re
+import urllib.parse
+from collections import OrderedDict
+from typing import Callable, Dict, Optional, Tuple, List, Any
+
+from rdflib import URIRef, Namespace
+
+CodeSystemGenerator = Callable[[str, str, Dict[str, Namespace]], Optional[URIRef]]
+
+DEFAULT_MAX_SYSTEMS = 1000              # Entries in the system -> generator LRU cache
+DEFAULT_MAX_CODES = 100000              # Entries in the (system, code) cache before it is emptied
+
+_ENTRIES = None                         # Trie key for the generators registered for the prefix ending at a node
+
+
+class CodeSystemResolver:
+    """ Registry of code system type generators """
+    def __init__(self, max_systems: int=DEFAULT_MAX_SYSTEMS, max_codes: int=DEFAULT_MAX_CODES) -> None:
+        """
+        :param max_systems: number of system to generator decisions to remember
+        :param max_codes: number of (system, code) types to hold.  The table is emptied when it reaches this size
+        """
+        self.max_systems = max_systems
+        self.max_codes = max_codes
+        self._systems = dict()              # type: Dict[str, CodeSystemGenerator]
+        self._trie = dict()                 # type: Dict[Any, Any]
+        self._decisions = OrderedDict()     # type: OrderedDict[str, Optional[CodeSystemGenerator]]
+        self._codes = dict()                # type: Dict[Tuple[str, str], Tuple[Optional[URIRef], Tuple]]
+        self.hits = 0
+        self.misses = 0
+
+    def register(self, system: str, generator: CodeSystemGenerator) -> None:
+        """
+        Use generator for code system system
+        :param system: code system URI
+        :param generator: type generator
+        """
+        self._systems[system] = generator
+        self.clear_cache()
+
+    def register_prefix(self, prefix: str, generator: CodeSystemGenerator, pattern: Optional[str]=None) -> None:
+        """
+        Use generator for the code systems that start with prefix.  A prefix registered more than once uses
+        the most recent registration whose pattern matches
+        :param prefix: code system URI prefix
+        :param generator: type generator
+        :param pattern: regular expression that the remainder of the system URI must (start to) match, if any
+        """
+        node = self._trie
+        for c in prefix:
+            node = node.setdefault(c, dict())
+        node.setdefault(_ENTRIES, []).insert(0, (re.compile(pattern) if pattern else None, generator))
+        self.clear_cache()
+
+    def _lookup(self, system: str) -> Optional[CodeSystemGenerator]:
+        generator = self._systems.get(system)
+        if generator is not None:
+            return generator
+        node = self._trie
+        candidates = []         # type: List[Tuple[int, List]]
+        for i, c in enumerate(system):
+            if _ENTRIES in node:
+                candidates.append((i, node[_ENTRIES]))
+            node = node.get(c)
+            if node is None:
+                break
+        else:
+            if _ENTRIES in node:
+                candidates.append((len(system), node[_ENTRIES]))
+        for i, entries in reversed(candidates):
+            for pattern, generator in entries:
+                if pattern is None or pattern.match(system, i):
+                    return generator
+        return None
+
+    def generator(self, system: str) -> Optional[CodeSystemGenerator]:
+        """
+        Return the generator for system
+        :param system: code system URI
+        :return: generator if the system is known
+        """
+        try:
+            generator = self._decisions[system]
+            self._decisions.move_to_end(system)
+        except KeyError:
+            generator = self._decisions[system] = self._lookup(system)
+            if len(self._decisions) > self.max_systems:
+                self._decisions.popitem(last=False)
+        return generator
+
+    def type_uri(self, system: str, code: str, nsmap: Dict[str, Namespace]) -> Optional[URIRef]:
+        """
+        Return the RDF type for code in system
+        :param system: code system URI
+        :param code: code (unquoted)
+        :param nsmap: map of prefixes used in the output.  Receives any prefix the type URI needs
+        :return: type URI if the system is known and the generator produced one
+        """
+        key = (system, code)
+        cached = self._codes.get(key)
+        if cached is None:
+            self.misses += 1
+            generator = self.generator(system)
+            prefixes = dict()
+            type_uri = generator(system, urllib.parse.quote(code), prefixes) if generator is not None else None
+            if len(self._codes) >= self.max_codes:
+                self._codes.clear()
+            cached = self._codes[key] = (type_uri, tuple(prefixes.items()))
+        else:
+            self.hits += 1
+        type_uri, prefixes = cached
+        for prefix, namespace in prefixes:
+            nsmap.setdefault(prefix, namespace)
+        return type_uri
+
+    def clear_cache(self) -> None:
+        """ Forget the cached decisions and types (but not the registrations) and reset the counts """
+        self._decisions.clear()
+        self._codes.clear()
+        self.hits = self.misses = 0
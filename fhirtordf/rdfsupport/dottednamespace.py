@@ -1,6 +1,19 @@
 
+from typing import Dict
+
 from rdflib import Namespace, URIRef
 
+# Every DottedURIRef built by attribute access.  The names come from code rather than data, so this stays small, and
+# the hot paths that test 'pred == FHIR.Bundle.entry' don't build and validate two new URIs each time.
+_interned = dict()                      # type: Dict[str, DottedURIRef]
+
+
+def _dotted_uri(value: str) -> "DottedURIRef":
+    uri = _interned.get(value)
+    if uri is None:
+        uri = _interned[value] = DottedURIRef(value)
+    return uri
+
 
 class DottedNamespace(Namespace):
     """
@@ -11,12 +24,12 @@ class DottedNamespace(Namespace):
 
     def __getattribute__(self, item: str) -> "DottedURIRef":
         if item == 'index':
-            return DottedURIRef(str(self) + item)
+            return _dotted_uri(str(self) + item)
         else:
             return super().__getattribute__(item)
 
     def __getattr__(self, item: str) -> "DottedURIRef":
-        return DottedURIRef(str(self) + item)
+        return _dotted_uri(str(self) + item)
 
     def __eq__(self, other):
         return super().__eq__(other)
@@ -33,7 +46,7 @@ class DottedURIRef(URIRef):
         return URIRef.__new__(cls, value, base)
 
     def __getattr__(self, item: str) -> "DottedURIRef":
-        return DottedURIRef(str(self) + '.' + item)
+        return _dotted_uri(str(self) + '.' + item)
 
     def __eq__(self, other):
         if isinstance(self, URIRef) and isinstance(other, URIRef):
@@ -28,6 +28,10 @@ namespaces = {"fhir": str(FHIR),
               "loinc": str(LOINC),
               "rxnorm": str(RXNORM)}
 
+# The namespaces that every conversion uses, without and with the ontology header
+core_namespaces = {k: namespaces[k] for k in ("fhir", "rdf", "xsd")}
+core_namespaces_owl = dict(core_namespaces, owl=namespaces["owl"])
+
 
 class AnonNS:
     _nsnum = 0
@@ -0,0 +1,85 @@
+"""
+N-Triples and N-Quads encoding of individual terms and statements.  Used by the streaming writer
+(see triplesink.WriterSink) so that output can be produced one statement at a time rather than by serializing a graph.
+"""
+import re
+from typing import Optional, Tuple
+
+from rdflib.term import Node, Literal, BNode
+
+# Characters that can't appear in an IRIREF and the escapes for string literals (N-Triples 1.1, section 2.4 and 2.5)
+_iri_escapes = re.compile(r'[\x00-\x20<>"{}|^`\\]')
+_literal_escapes = re.compile(r'[\\"\n\r]')
+_non_ascii = re.compile(r'[^\x00-\x7f]')
+
+_LITERAL_ESCAPES = {'\\': '\\\\', '"': '\\"', '\n': '\\n', '\r': '\\r'}
+
+
+def _uchar(c: str) -> str:
+    cp = ord(c)
+    return '\\u{:04X}'.format(cp) if cp <= 0xFFFF else '\\U{:08X}'.format(cp)
+
+
+def _uchar_match(m) -> str:
+    return _uchar(m.group())
+
+
+def _literal_match(m) -> str:
+    return _LITERAL_ESCAPES[m.group()]
+
+
+def nt_iri(iri: str) -> str:
+    """
+    Return the N-Triples representation of iri
+    :param iri: IRI to encode
+    :return: <iri> with any illegal characters escaped
+    """
+    return '<' + _iri_escapes.sub(_uchar_match, iri) + '>'
+
+
+def nt_literal(lit: Literal) -> str:
+    """
+    Return the N-Triples representation of lit
+    :param lit: literal to encode
+    :return: quoted and escaped lexical form followed by the language tag or datatype if any
+    """
+    quoted = '"' + _literal_escapes.sub(_literal_match, str(lit)) + '"'
+    if lit.language:
+        return quoted + '@' + lit.language
+    if lit.datatype:
+        return quoted + '^^' + nt_iri(lit.datatype)
+    return quoted
+
+
+def nt_term(node: Node) -> str:
+    """
+    Return the N-Triples representation of node
+    :param node: URIRef, BNode or Literal
+    :return: encoded node
+    """
+    if isinstance(node, Literal):
+        return nt_literal(node)
+    if isinstance(node, BNode):
+        return '_:' + node
+    return nt_iri(node)
+
+
+def nt_statement(triple: Tuple[Node, Node, Node], graph_name: Optional[Node]=None) -> str:
+    """
+    Return triple as an N-Triples statement or, if graph_name is supplied, an N-Quads statement
+    :param triple: subject, predicate, object
+    :param graph_name: graph name for N-Quads
+    :return: statement, including the closing ' .' and newline
+    """
+    s, p, o = triple
+    return nt_term(s) + ' ' + nt_iri(p) + ' ' + nt_term(o) + \
+        (' ' + nt_term(graph_name) if graph_name is not None else '') + ' .\n'
+
+
+def ascii_escape(text: str) -> str:
+    """
+    Replace every non-ASCII character in text with its \\u or \\U escape (the original, ASCII only, N-Triples)
+    :param text: N-Triples text
+    :return: ASCII text
+    """
+    return text if text.isascii() else _non_ascii.sub(_uchar_match, text)
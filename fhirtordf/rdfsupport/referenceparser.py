@@ -0,0 +1,91 @@
+"""
+A parser for FHIR resource references ([base]type/id[/_history/version]).  It accepts exactly what FHIR_RESOURCE_RE
+accepts, but splits the reference on its slashes and looks the resource type up in a set rather than running a
+regular expression with an alternative for every resource type.  That set can come from the vocabulary being used
+(see FHIRSchema.reference_parser), so references to resource types of later FHIR releases are recognized too.
+"""
+import re
+from typing import Iterable, NamedTuple, Optional, Dict, List
+
+from fhirtordf.rdfsupport.fhirresourcere import FHIR_RESOURCE_TYPES
+
+DEFAULT_MAX_SIZE = 100000               # Maximum number of parsed references before the table is emptied
+
+_HISTORY = '/_history/'
+_id_re = re.compile(r'[A-Za-z0-9.-]{1,64}')
+_base_path_re = re.compile(r'[A-Za-z0-9.:%$/]*')
+
+
+class FHIRReference(NamedTuple):
+    base: Optional[str]                 # e.g. 'http://hl7.org/fhir/'.  None for a relative reference
+    resource_type: str                  # e.g. 'Patient'
+    id: str
+    version: Optional[str]              # version if the reference is to a _history entry
+
+
+class ReferenceParser:
+    """ Memoizing parser for FHIR resource references """
+    def __init__(self, resource_types: Iterable[str]=FHIR_RESOURCE_TYPES, max_size: int=DEFAULT_MAX_SIZE) -> None:
+        """
+        :param resource_types: names of the resource types that can be referenced
+        :param max_size: number of references to remember.  The table is emptied when it reaches this size
+        """
+        self.resource_types = frozenset(resource_types)
+        self.max_size = max_size
+        self._parsed = dict()           # type: Dict[str, Optional[FHIRReference]]
+        self.hits = 0
+        self.misses = 0
+
+    def _parse(self, ref: str) -> Optional[FHIRReference]:
+        version = None
+        if _HISTORY in ref:
+            ref, version = ref.rsplit(_HISTORY, 1)
+            if not _id_re.fullmatch(version):
+                return None
+        parts = ref.rsplit('/', 2)
+        if len(parts) < 2:
+            return None
+        if len(parts) == 2:
+            base = None
+            resource_type, resource_id = parts
+        else:
+            base = parts[0] + '/'
+            resource_type, resource_id = parts[1:]
+            scheme, sep, path = base.partition('://')
+            if not sep or scheme not in ('http', 'https') or not _base_path_re.fullmatch(path):
+                return None
+        if resource_type not in self.resource_types or not _id_re.fullmatch(resource_id):
+            return None
+        return FHIRReference(base, resource_type, resource_id, version)
+
+    def parse(self, ref: str) -> Optional[FHIRReference]:
+        """
+        Parse a reference
+        :param ref: absolute or relative reference
+        :return: the parsed reference or None if ref isn't a reference to a known resource type
+        """
+        try:
+            rval = self._parsed[ref]
+            self.hits += 1
+        except KeyError:
+            self.misses += 1
+            if len(self._parsed) >= self.max_size:
+                self._parsed.clear()
+            rval = self._parsed[ref] = self._parse(ref)
+        return rval
+
+    def parse_all(self, refs: Iterable[str]) -> List[Optional[FHIRReference]]:
+        """
+        Parse a number of references
+        :param refs: references to parse
+        :return: list of parsed references (or None) in the same order as refs
+        """
+        return [self.parse(ref) for ref in refs]
+
+    def clear(self) -> None:
+        """ Forget the parsed references and reset the counts """
+        self._parsed.clear()
+        self.hits = self.misses = 0
+
+
+default_reference_parser = ReferenceParser()
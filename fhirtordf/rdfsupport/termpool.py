@@ -0,0 +1,132 @@
+"""
+Interned rdflib terms.  Constructing a Literal normalizes its lexical form (and, for dates, numbers and the like,
+parses it) and constructing a URIRef validates it.  FHIR data repeats the same codes, dates, list indices and
+references over and over, so FHIRResource takes its terms from a shared TermPool instead of building new ones.
+"""
+from typing import Optional, Any, Dict, Tuple
+
+from rdflib import Literal, URIRef
+
+DEFAULT_MAX_INDEX = 1000                # fhir:index literals built up front
+DEFAULT_MAX_SIZE = 100000               # Maximum entries in each table before it is emptied
+
+
+def raw_literal(lexical: str, datatype: URIRef) -> Literal:
+    """
+    Build a typed literal that keeps lexical exactly as it is.  Unlike Literal(lexical, datatype=datatype), the lexical
+    form isn't parsed into a python value (Literal.value is None) or normalized (a decimal "1.50" stays "1.50")
+    :param lexical: lexical form
+    :param datatype: datatype
+    :return: literal
+    """
+    lit = str.__new__(Literal, lexical)
+    lit._language = None
+    lit._datatype = datatype
+    lit._value = None
+    return lit
+
+
+class TermPool:
+    """ A bounded pool of Literals and URIRefs """
+    def __init__(self, max_size: int=DEFAULT_MAX_SIZE, max_index: int=DEFAULT_MAX_INDEX) -> None:
+        """
+        :param max_size: maximum number of literals (and URIRefs) to hold.  A table that reaches it is emptied
+        :param max_index: number of index literals (0, 1, ...) to build up front
+        """
+        self.max_size = max_size
+        self._indices = tuple(Literal(i) for i in range(max_index))
+        self._literals = dict()         # type: Dict[Tuple[str, Optional[URIRef]], Literal]
+        self._uris = dict()             # type: Dict[str, URIRef]
+        self._raw_literals = dict()     # type: Dict[Tuple[str, URIRef], Literal]
+        self.hits = 0
+        self.misses = 0
+
+    def index(self, idx: int) -> Literal:
+        """
+        Return the literal for list index idx
+        :param idx: index
+        :return: integer literal
+        """
+        if idx < len(self._indices):
+            self.hits += 1
+            return self._indices[idx]
+        self.misses += 1
+        return Literal(idx)
+
+    def literal(self, value: Any, datatype: Optional[URIRef]=None) -> Literal:
+        """
+        Return Literal(value, datatype=datatype).  Only string values are pooled
+        :param value: lexical form
+        :param datatype: literal datatype
+        :return: literal
+        """
+        if type(value) is not str:
+            return Literal(value, datatype=datatype)
+        key = (value, datatype)
+        lit = self._literals.get(key)
+        if lit is None:
+            self.misses += 1
+            if len(self._literals) >= self.max_size:
+                self._literals.clear()
+            lit = self._literals[key] = Literal(value, datatype=datatype)
+        else:
+            self.hits += 1
+        return lit
+
+    def raw_literal(self, value: Any, datatype: Optional[URIRef]) -> Literal:
+        """
+        Return a raw literal (see raw_literal above) for a JSON value
+        :param value: JSON value -- str, bool, int, float or Decimal
+        :param datatype: literal datatype.  If None, the value is an ordinary literal
+        :return: literal
+        """
+        if datatype is None:
+            return self.literal(value)
+        key = (('true' if value else 'false') if type(value) is bool else str(value), datatype)
+        lit = self._raw_literals.get(key)
+        if lit is None:
+            self.misses += 1
+            if len(self._raw_literals) >= self.max_size:
+                self._raw_literals.clear()
+            lit = self._raw_literals[key] = raw_literal(*key)
+        else:
+            self.hits += 1
+        return lit
+
+    def uri(self, value: str) -> URIRef:
+        """
+        Return URIRef(value)
+        :param value: URI
+        :return: URIRef
+        """
+        uri = self._uris.get(value)
+        if uri is None:
+            self.misses += 1
+            if len(self._uris) >= self.max_size:
+                self._uris.clear()
+            uri = self._uris[value] = URIRef(value)
+        else:
+            self.hits += 1
+        return uri
+
+    @property
+    def size(self) -> int:
+        """ Number of pooled terms, not counting the index literals """
+        return len(self._literals) + len(self._raw_literals) + len(self._uris)
+
+    @property
+    def hit_rate(self) -> float:
+        """ Fraction of the terms asked for that were already in the pool """
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def clear(self) -> None:
+        """ Empty the pool and reset the counts """
+        self._literals.clear()
+        self._raw_literals.clear()
+        self._uris.clear()
+        self.hits = self.misses = 0
+
+    def __str__(self) -> str:
+        return "{} terms, {} hits, {} misses ({:.1%} hit rate)".format(self.size, self.hits, self.misses,
+                                                                       self.hit_rate)
@@ -0,0 +1,151 @@
+"""
+Triple sinks -- the destinations that FHIRResource emits triples into.  An rdflib Graph is one kind of sink, but
+triples can just as well go to a callable, a generator based consumer or a writer without ever being stored.
+"""
+import inspect
+from typing import Tuple, Callable, Generator, Union, Optional, Any, Dict
+
+from rdflib import Graph, Namespace
+from rdflib.term import Node
+
+from fhirtordf.rdfsupport.ntriples import nt_term, nt_iri, ascii_escape
+
+Triple = Tuple[Node, Node, Node]
+
+DEFAULT_BUFFER_SIZE = 1000              # Statements
+
+
+class TripleSink:
+    """ Receiver of the triples produced by a conversion """
+    def add(self, triple: Triple) -> None:
+        """
+        Accept a triple
+        :param triple: subject, predicate, object
+        """
+        raise NotImplementedError()
+
+    def bind(self, prefix: str, namespace: Namespace) -> None:
+        """
+        Record a prefix that the output uses.  Sinks that don't serialize qualified names ignore it
+        :param prefix: prefix
+        :param namespace: corresponding namespace
+        """
+        pass
+
+    @property
+    def graph(self) -> Optional[Graph]:
+        """ The graph the triples are added to, if any """
+        return None
+
+    def flush(self) -> None:
+        """ Pass on anything that has been buffered """
+        pass
+
+    def close(self) -> None:
+        """ Flush anything that has been buffered and release the sink """
+        self.flush()
+
+
+class GraphSink(TripleSink):
+    """ Add triples to an rdflib graph """
+    def __init__(self, g: Graph) -> None:
+        self._g = g
+        self.add = g.add
+
+    def bind(self, prefix: str, namespace: Namespace) -> None:
+        self._g.bind(prefix, namespace)
+
+    @property
+    def graph(self) -> Optional[Graph]:
+        return self._g
+
+
+class CallableSink(TripleSink):
+    """ Pass each triple to a function """
+    def __init__(self, f: Callable[[Triple], Any]) -> None:
+        self.add = f
+
+
+class GeneratorSink(TripleSink):
+    """ Send each triple to a generator based consumer (one that loops on 'triple = yield') """
+    def __init__(self, consumer: Generator[None, Triple, None]) -> None:
+        if inspect.getgeneratorstate(consumer) == inspect.GEN_CREATED:
+            next(consumer)
+        self._consumer = consumer
+        self.add = consumer.send
+
+    def close(self) -> None:
+        self._consumer.close()
+
+
+class WriterSink(TripleSink):
+    """
+    Write each triple to a text stream as an N-Triples statement or, if a graph name is supplied, an N-Quads
+    statement.  Statements are collected and written in blocks of buffer_size
+    """
+    def __init__(self, out, graph_name: Optional[Node]=None, ascii_only: bool=False,
+                 buffer_size: int=DEFAULT_BUFFER_SIZE) -> None:
+        """
+        :param out: text stream to write to
+        :param graph_name: graph name for N-Quads output
+        :param ascii_only: True means escape all non-ASCII characters (the 'nt' rather than the 'nt11' format)
+        :param buffer_size: number of statements to collect before writing
+        """
+        self._out = out
+        self._ascii_only = ascii_only
+        self._buffer_size = buffer_size
+        self._buffer = []
+        self._append = self._buffer.append
+        self._terminator = (' ' + nt_term(graph_name) if graph_name is not None else '') + ' .\n'
+        self._predicates = dict()           # Predicate IRI to encoded form -- bounded by the vocabulary
+
+    def add(self, triple: Triple) -> None:
+        s, p, o = triple
+        ptext = self._predicates.get(p)
+        if ptext is None:
+            ptext = self._predicates[p] = ' ' + nt_iri(p) + ' '
+        self._append(nt_term(s) + ptext + nt_term(o) + self._terminator)
+        if len(self._buffer) >= self._buffer_size:
+            self.flush()
+
+    def flush(self) -> None:
+        if self._buffer:
+            text = ''.join(self._buffer)
+            self._out.write(ascii_escape(text) if self._ascii_only else text)
+            self._buffer.clear()
+
+    def close(self) -> None:
+        self.flush()
+        self._out.flush()
+
+
+SinkTypes = Union[Graph, TripleSink, Callable[[Triple], Any], Generator[None, Triple, None]]
+
+
+def as_sink(target: Union[SinkTypes, Any]) -> TripleSink:
+    """
+    Return the sink for target
+    :param target: sink, graph, generator based consumer, writer (anything with a 'write' method) or function
+    :return: corresponding sink
+    """
+    if isinstance(target, TripleSink):
+        return target
+    if isinstance(target, Graph):
+        return GraphSink(target)
+    if inspect.isgenerator(target):
+        return GeneratorSink(target)
+    if hasattr(target, 'write'):
+        return WriterSink(target)
+    if callable(target):
+        return CallableSink(target)
+    raise TypeError("Unrecognized triple sink: {}".format(type(target).__name__))
+
+
+def bind_prefixes(sink: TripleSink, prefixes: Dict[str, str]) -> None:
+    """
+    Bind the prefixes collected by one or more conversions (see FHIRResource prefixes) in sink
+    :param sink: target sink
+    :param prefixes: prefix to namespace map
+    """
+    for prefix, namespace in sorted(prefixes.items()):
+        sink.bind(prefix, Namespace(namespace))
@@ -2,8 +2,8 @@ from typing import Tuple, NamedTuple, Union, Optional
 
 from rdflib import URIRef
 
-from fhirtordf.rdfsupport.fhirresourcere import FHIR_RESOURCE_RE, FHIR_RE_ID, FHIR_RE_BASE, FHIR_RE_RESOURCE
 from fhirtordf.rdfsupport.namespaces import FHIR
+from fhirtordf.rdfsupport.referenceparser import ReferenceParser, default_reference_parser
 
 
 class FHIR_RESOURCE(NamedTuple):
@@ -12,19 +12,21 @@ class FHIR_RESOURCE(NamedTuple):
     resource: str
 
 
-def parse_fhir_resource_uri(uri: Union[URIRef, str]) -> FHIR_RESOURCE:
+def parse_fhir_resource_uri(uri: Union[URIRef, str],
+                            parser: ReferenceParser=default_reference_parser) -> FHIR_RESOURCE:
     """
-    Use the FHIR Regular Expression for Resource URI's to determine the namespace and type
+    Use the FHIR reference syntax for Resource URI's to determine the namespace and type
     of a given URI.  As an example, "http://hl7.org/fhir/Patient/p123" maps to the tuple
     ``('Patient', 'http://hl7.org/fhir')
 
     :param uri:  URI to parse
+    :param parser: reference parser.  Default: one that knows the STU3 resource types
     :return: FHIR_RESOURCE (namespace, type, resource)
     """
     uri_str = str(uri)
-    m = FHIR_RESOURCE_RE.match(uri_str)
-    if m:
-        return FHIR_RESOURCE(URIRef(m.group(FHIR_RE_BASE)), FHIR[m.group(FHIR_RE_RESOURCE)], m.group(FHIR_RE_ID))
+    ref = parser.parse(uri_str)
+    if ref:
+        return FHIR_RESOURCE(URIRef(ref.base), FHIR[ref.resource_type], ref.id)
     else:
         # Not in the FHIR format - we can only do namespace and name
         namespace, name = uri_str.rsplit('#', 1) if '#' in uri_str \
@@ -0,0 +1,91 @@
+import os
+import shutil
+import unittest
+
+from rdflib.compare import to_isomorphic
+
+from fhirtordf.fhir.picklejar import picklejarfactory
+from fhirtordf.rdfsupport.namespaces import FHIR
+from tests.utils import test_fmv_loc, test_data_directory
+from tests.utils.base_test_case import make_and_clear_directory
+
+
+class ConverterGenTestCase(unittest.TestCase):
+    current_cache_directory = None
+
+    @classmethod
+    def setUpClass(cls):
+        cls.current_cache_directory = picklejarfactory.cache_directory
+        cls.cache_directory = os.path.join(os.path.split(os.path.abspath(__file__))[0], 'data', 'convertercache')
+        make_and_clear_directory(cls.cache_directory)
+        picklejarfactory.cache_directory = cls.cache_directory
+        cls.fmv_loc = os.path.join(cls.cache_directory, 'fhir.ttl')
+        shutil.copyfile(test_fmv_loc, cls.fmv_loc)
+
+    @classmethod
+    def tearDownClass(cls):
+        picklejarfactory.cache_directory = cls.current_cache_directory
+        shutil.rmtree(cls.cache_directory)
+
+    def test_generate(self):
+        from fhirtordf.fhir.fhirmetavoc import FHIRMetaVoc
+        from fhirtordf.fhir.convertergen import converter_file_name
+        from fhirtordf.loaders.fhirjsonloader import fhir_json_to_rdf
+        from fhirtordf.loaders.fhirresourceloader import FHIRResource
+        from jsonasobj import load, JsonObj
+
+        mv = FHIRMetaVoc(self.fmv_loc)
+        self.assertIsNone(mv.schema.converters)
+        fname = mv.generate_converters(['Observation'])
+        self.assertEqual(converter_file_name(self.cache_directory, self.fmv_loc), fname)
+        self.assertIn(FHIR.Observation, mv.schema.converters)
+        self.assertIn(FHIR.Coding, mv.schema.converters)
+        self.assertNotIn(FHIR.Patient, mv.schema.converters)
+
+        # The converters are picked up along with the cached schema
+        mv2 = FHIRMetaVoc(self.fmv_loc)
+        self.assertTrue(mv2.from_cache)
+        self.assertEqual(set(mv.schema.converters), set(mv2.schema.converters))
+
+        # ... and produce the same output as the generic walker
+        for fname in ('observation-example-bmd.json', 'observation-example-f001-glucose.json'):
+            json_fname = os.path.join(test_data_directory, fname)
+            generated = fhir_json_to_rdf(json_fname, metavoc=mv2)
+            generated_paths = fhir_json_to_rdf(json_fname, metavoc=mv2, node_ids='path')
+            generated_obj_paths = fhir_json_to_rdf(load(json_fname), metavoc=mv2, node_ids='path')
+            converters, mv2.schema.converters = mv2.schema.converters, None
+            generic = fhir_json_to_rdf(json_fname, metavoc=mv2)
+            generic_paths = fhir_json_to_rdf(json_fname, metavoc=mv2, node_ids='path')
+            mv2.schema.converters = converters
+            self.assertEqual(to_isomorphic(generic), to_isomorphic(generated), fname)
+            self.assertEqual(set(generic_paths), set(generated_paths), fname)
+            self.assertEqual(set(generic_paths), set(generated_obj_paths), fname)
+
+        # ... and report the keys that the vocabulary doesn't define in the same way
+        observation = load(os.path.join(test_data_directory, 'observation-example-f001-glucose.json'))
+        observation.bogusTop = 1
+        observation.code.bogus = 2
+        observation.contained = [JsonObj(resourceType="Observation", id="o1", status="final")]
+        generated = FHIRResource(mv2.schema, None, "http://hl7.org/fhir/", observation).unknown_keys
+        converters, mv2.schema.converters = mv2.schema.converters, None
+        generic = FHIRResource(mv2.schema, None, "http://hl7.org/fhir/", observation).unknown_keys
+        mv2.schema.converters = converters
+        self.assertEqual({(FHIR.Observation, 'bogusTop'): 1, (FHIR.CodeableConcept, 'bogus'): 1}, dict(generated))
+        self.assertEqual(generic, generated)
+
+        # A change in vocabulary signature retires the converters
+        st = os.stat(self.fmv_loc)
+        os.utime(self.fmv_loc, (st.st_atime, st.st_mtime + 10))
+        self.assertIsNone(FHIRMetaVoc(self.fmv_loc).schema.converters)
+
+    def test_errors(self):
+        from fhirtordf.fhir.fhirmetavoc import FHIRMetaVoc
+
+        with self.assertRaises(ValueError):
+            FHIRMetaVoc(self.fmv_loc).generate_converters(['NoSuchResource'])
+        with self.assertRaises(ValueError):
+            FHIRMetaVoc(self.fmv_loc, cache_mv_file=False).generate_converters()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,162 @@
+import gc
+import unittest
+from typing import Dict
+
+from rdflib import RDF, OWL, XSD, RDFS, Graph, URIRef
+
+from fhirtordf.rdfsupport.namespaces import FHIR, W5
+
+
+def load_json(text: str):
+    from jsonasobj import loads
+    return loads(text)
+
+
+def graph_predicates(g: Graph, subj: URIRef) -> Dict[str, URIRef]:
+    """ Reference (uncached) implementation of FHIRMetaVocEntry.predicates() """
+    from fhirtordf.fhir.fhirmetavoc import FHIRMetaVocEntry
+
+    rval = dict()
+    for parent in g.objects(subj, RDFS.subClassOf):
+        if isinstance(parent, URIRef) and not str(parent).startswith(str(W5)):
+            rval.update(**graph_predicates(g, parent))
+    for s in g.subjects(RDFS.domain, subj):
+        rval[FHIRMetaVocEntry._to_str(s)] = s
+    return rval
+
+
+class FHIRSchemaTestCase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        from tests.utils.base_test_case import FHIRGraph
+        cls.fhir_ontology = FHIRGraph()
+
+    def test_matches_metavoc(self):
+        """ The compiled schema must answer exactly the way the live vocabulary does """
+        from fhirtordf.fhir.fhirmetavoc import FHIRMetaVocEntry, FHIRSchema
+
+        schema = FHIRSchema(self.fhir_ontology)
+        for cls in sorted(self.fhir_ontology.subjects(RDF.type, OWL.Class)):
+            m = FHIRMetaVocEntry(self.fhir_ontology, cls)
+            self.assertEqual(graph_predicates(self.fhir_ontology, cls), schema.predicates(cls), str(cls))
+            for k, prop in schema.properties(cls).items():
+                self.assertEqual(k, prop.name)
+                self.assertEqual(m.predicate_type(prop.predicate), prop.range)
+                self.assertEqual(m.is_atom(prop.predicate), prop.is_atom)
+                self.assertEqual(m.is_primitive(prop.range), prop.is_primitive)
+                self.assertEqual(m.primitive_datatype(prop.range), prop.datatype)
+                self.assertEqual(m.primitive_datatype_nostring(prop.range),
+                                 schema.primitive_datatype_nostring(prop.range))
+
+    def test_lookups(self):
+        from fhirtordf.fhir.fhirmetavoc import FHIRSchema
+
+        schema = FHIRSchema(self.fhir_ontology)
+        self.assertEqual(FHIR.code, schema.predicate_type(FHIR.Account.status))
+        self.assertTrue(schema.is_atom(FHIR.Narrative.div))
+        self.assertFalse(schema.is_atom(FHIR.Extension.valueString))
+        with self.assertRaises(TypeError):
+            schema.is_atom(FHIR.Account.noSuchThing)
+        self.assertEqual(FHIR.Quantity, schema.value_predicate_to_type('valueQuantity'))
+        self.assertEqual(FHIR.string, schema.value_predicate_to_type('valueString'))
+        self.assertEqual(XSD.gYearMonth, schema.primitive_datatype_nostring(FHIR.dateTime, "2009-11"))
+        self.assertIsNone(schema.primitive_datatype_nostring(FHIR.uri))
+
+    def test_value_datatypes(self):
+        """ The precomputed datatype tables must honor the fhir_dates and fhir_oids switches """
+        from fhirtordf.fhir.fhirmetavoc import FHIRMetaVocEntry, FHIRSchema
+
+        schema = FHIRSchema.for_vocabulary(self.fhir_ontology)
+        m = FHIRMetaVocEntry(self.fhir_ontology, "Account")
+        primitives = set(self.fhir_ontology.subjects(RDFS.subClassOf, FHIR.Primitive))
+        self.assertIn(FHIR.dateTime, primitives)
+        try:
+            for fhir_dates in (True, False):
+                for fhir_oids in (True, False):
+                    FHIRMetaVocEntry.fhir_dates = fhir_dates
+                    FHIRMetaVocEntry.fhir_oids = fhir_oids
+                    for t in primitives:
+                        for v in (None, "2009", "2009-11", "2009-11-30", "2009-11-30+10", "2009-11-30T09:00:00Z"):
+                            self.assertEqual(m.primitive_datatype_nostring(t, v),
+                                             schema.primitive_datatype_nostring(t, v), "{} {}".format(t, v))
+        finally:
+            FHIRMetaVocEntry.fhir_dates = True
+            FHIRMetaVocEntry.fhir_oids = True
+        self.assertEqual(XSD.gYear, schema.primitive_datatype_nostring(FHIR.instant, "2009"))
+        self.assertEqual(XSD.boolean, schema.primitive_datatype_nostring(FHIR.boolean, True))
+        self.assertIsNone(schema.primitive_datatype_nostring(FHIR.oid, "urn:oid:1.2.3"))
+        self.assertIsNone(schema.primitive_datatype_nostring(FHIR.Quantity))
+
+    def test_choice_properties(self):
+        from fhirtordf.fhir.fhirmetavoc import FHIRSchema
+        from fhirtordf.loaders.fhirresourceloader import FHIRResource
+
+        schema = FHIRSchema(self.fhir_ontology)
+        choices = schema.choice_properties(FHIR.Extension)
+        self.assertEqual(FHIR['Extension.valueQuantity'], choices['valueQuantity'].predicate)
+        self.assertEqual(FHIR.Quantity, choices['valueQuantity'].range)
+        self.assertEqual(FHIR.string, choices['valueString'].range)
+        self.assertTrue(choices['valueString'].is_primitive)
+        self.assertNotIn('url', choices)
+        self.assertIs(choices, schema.choice_properties(FHIR.Extension))
+        self.assertEqual({}, schema.choice_properties(FHIR.Observation))
+        self.assertIn('defaultValueString', schema.choice_properties(FHIR.ElementDefinition))
+        self.assertFalse(schema.is_atom(FHIR['ElementDefinition.defaultValueString']))
+        self.assertEqual(FHIR.string, schema.predicate_type(FHIR['ElementDefinition.defaultValueString']))
+
+        # Open choices other than Extension.value are emitted under their own predicates
+        g = FHIRResource(schema, None, "http://hl7.org/fhir/",
+                         data=load_json('{"resourceType": "Parameters", "id": "p1", "parameter": '
+                                        '[{"name": "n", "valueCode": "c", "part": [{"name": "m", "valueInteger": 1}]}]'
+                                        '}')).graph
+        self.assertEqual(1, len(list(g.subject_objects(FHIR['Parameters.parameter.valueCode']))))
+        self.assertEqual(1, len(list(g.subject_objects(FHIR['Parameters.parameter.part.valueInteger']))))
+        self.assertEqual(0, len(list(g.subject_objects(FHIR['Extension.valueCode']))))
+
+    def test_for_vocabulary(self):
+        from fhirtordf.fhir.fhirmetavoc import FHIRSchema
+
+        schema = FHIRSchema.for_vocabulary(self.fhir_ontology)
+        self.assertIs(schema, FHIRSchema.for_vocabulary(self.fhir_ontology))
+        self.assertIs(schema, FHIRSchema.for_vocabulary(schema))
+
+    def test_predicate_cache(self):
+        from fhirtordf.fhir.fhirmetavoc import FHIRSchema, FHIRMetaVocEntry
+        from fhirtordf.loaders.fhirresourceloader import FHIRResource
+
+        FHIRSchema.clear_cache()
+        schema = FHIRSchema.for_vocabulary(self.fhir_ontology)
+        self.assertEqual((0, 0, 0), schema.cache_info())
+
+        # FHIRMetaVocEntry and FHIRResource instances share the same memoized maps
+        coding_preds = FHIRMetaVocEntry(self.fhir_ontology, FHIR.Coding).predicates()
+        self.assertIs(coding_preds, FHIRMetaVocEntry(self.fhir_ontology, FHIR.Coding).predicates())
+        self.assertEqual((1, 1), schema.cache_info()[:2])
+        FHIRResource(self.fhir_ontology, None, "http://hl7.org/fhir/",
+                     data=load_json('{"resourceType": "Account", "id": "a1", "type": '
+                                    '{"coding": [{"system": "http://x.org", "code": "1"}]}}'))
+        hits, misses, _ = schema.cache_info()
+        FHIRResource(self.fhir_ontology, None, "http://hl7.org/fhir/",
+                     data=load_json('{"resourceType": "Account", "id": "a2", "type": '
+                                    '{"coding": [{"system": "http://x.org", "code": "2"}]}}'))
+        self.assertEqual(misses, schema.cache_info().misses)
+        self.assertLess(hits, schema.cache_info().hits)
+
+        # Each vocabulary is compiled once, no matter how the callers alternate between them, and is forgotten when
+        # its graph goes away
+        compilations = FHIRSchema.compilations
+        other = Graph()
+        other.add((FHIR.Thing.name, RDFS.domain, FHIR.Thing))
+        self.assertEqual({'name': FHIR.Thing.name}, FHIRMetaVocEntry(other, FHIR.Thing).predicates())
+        other_schema = FHIRSchema.for_vocabulary(other)
+        self.assertIs(schema, FHIRSchema.for_vocabulary(self.fhir_ontology))
+        self.assertIs(other_schema, FHIRSchema.for_vocabulary(other))
+        self.assertEqual(compilations + 1, FHIRSchema.compilations)
+        self.assertIs(coding_preds, FHIRMetaVocEntry(self.fhir_ontology, FHIR.Coding).predicates())
+        cached = len(FHIRSchema._schemas)
+        del other
+        gc.collect()
+        self.assertEqual(cached - 1, len(FHIRSchema._schemas))
+
+if __name__ == '__main__':
+    unittest.main()
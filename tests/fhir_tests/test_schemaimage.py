@@ -0,0 +1,118 @@
+import os
+import shutil
+import unittest
+
+from rdflib import RDF, OWL
+
+from fhirtordf.fhir.picklejar import picklejarfactory
+from fhirtordf.rdfsupport.namespaces import FHIR
+from tests.utils import test_fmv_loc
+from tests.utils.base_test_case import make_and_clear_directory
+
+
+class SchemaImageTestCase(unittest.TestCase):
+    current_cache_directory = None
+
+    @classmethod
+    def setUpClass(cls):
+        cls.current_cache_directory = picklejarfactory.cache_directory
+        cls.cache_directory = os.path.join(os.path.split(os.path.abspath(__file__))[0], 'data', 'schemacache')
+        make_and_clear_directory(cls.cache_directory)
+        picklejarfactory.cache_directory = cls.cache_directory
+        cls.fmv_loc = os.path.join(cls.cache_directory, 'fhir.ttl')
+        shutil.copyfile(test_fmv_loc, cls.fmv_loc)
+
+    @classmethod
+    def tearDownClass(cls):
+        picklejarfactory.cache_directory = cls.current_cache_directory
+        shutil.rmtree(cls.cache_directory)
+
+    def test_image(self):
+        from fhirtordf.fhir.fhirmetavoc import FHIRMetaVoc, FHIRMetaVocEntry
+        from fhirtordf.fhir.schemaimage import image_file_name
+
+        mv = FHIRMetaVoc(self.fmv_loc)
+        self.assertFalse(mv.from_cache)
+        self.assertTrue(os.path.exists(image_file_name(self.cache_directory, self.fmv_loc)))
+
+        # Second load comes from the image and never parses fhir.ttl
+        mv2 = FHIRMetaVoc(self.fmv_loc)
+        self.assertTrue(mv2.from_cache)
+        self.assertIsNone(mv2._g)
+        for cls in mv.g.subjects(RDF.type, OWL.Class):
+            self.assertEqual(mv.schema.properties(cls), mv2.schema.properties(cls))
+
+        # Metadata entries are answered from the image as well
+        entry = mv2.entry_for("Account")
+        graph_entry = FHIRMetaVocEntry(mv.g, "Account")
+        for pred in entry.predicates().values():
+            t = entry.predicate_type(pred)
+            self.assertEqual(graph_entry.predicate_type(pred), t)
+            self.assertEqual(graph_entry.is_atom(pred), entry.is_atom(pred))
+            self.assertEqual(graph_entry.is_primitive(t), entry.is_primitive(t))
+            self.assertEqual(graph_entry.primitive_datatype_nostring(t), entry.primitive_datatype_nostring(t))
+        self.assertIsNone(mv2._g)
+
+        # A change in signature falls back to fhir.ttl
+        st = os.stat(self.fmv_loc)
+        os.utime(self.fmv_loc, (st.st_atime, st.st_mtime + 10))
+        mv3 = FHIRMetaVoc(self.fmv_loc)
+        self.assertFalse(mv3.from_cache)
+        self.assertTrue(FHIRMetaVoc(self.fmv_loc).from_cache)
+
+    def test_lazy_load(self):
+        from fhirtordf.fhir.fhirmetavoc import FHIRMetaVoc
+        from fhirtordf.loaders.fhirresourceloader import FHIRResource
+        from jsonasobj import loads
+
+        mv = FHIRMetaVoc(self.fmv_loc)
+        lazy_mv = FHIRMetaVoc(self.fmv_loc, lazy_load=True)
+        self.assertTrue(lazy_mv.from_cache)
+        lazy = lazy_mv.schema
+        self.assertIn('Observation', lazy.pending_shards)
+        self.assertIn('Patient', lazy.pending_shards)
+        self.assertNotIn('Quantity', lazy.pending_shards)
+        self.assertEqual([], FHIRMetaVoc(self.fmv_loc).schema.pending_shards)
+        self.assertEqual(mv.schema.resource_types, lazy.resource_types)
+
+        # A shard is loaded the first time its resource type, a component or a property is looked up
+        FHIRResource(lazy, None, "http://hl7.org/fhir/",
+                     data=loads('{"resourceType": "Observation", "id": "o1", "status": "final", '
+                                '"component": [{"code": {"text": "x"}}]}'))
+        self.assertNotIn('Observation', lazy.pending_shards)
+        self.assertIn('Patient', lazy.pending_shards)
+        self.assertEqual(mv.schema.predicate_type(FHIR.Patient.link.other), lazy.predicate_type(FHIR.Patient.link.other))
+        self.assertNotIn('Patient', lazy.pending_shards)
+        self.assertEqual(mv.schema.is_atom(FHIR.Account.status), lazy.is_atom(FHIR.Account.status))
+        self.assertNotIn('Account', lazy.pending_shards)
+
+        for cls in mv.g.subjects(RDF.type, OWL.Class):
+            self.assertEqual(mv.schema.properties(cls), lazy.properties(cls))
+        self.assertEqual([], lazy.pending_shards)
+
+    def test_no_cache(self):
+        from fhirtordf.fhir.fhirmetavoc import FHIRMetaVoc
+
+        self.assertFalse(FHIRMetaVoc(self.fmv_loc, cache_mv_file=False).from_cache)
+
+    def test_bad_image(self):
+        from fhirtordf.fhir.schemaimage import load_schema_image, save_schema_image, IMAGE_MAGIC
+
+        fname = os.path.join(self.cache_directory, 'test.img')
+        save_schema_image(fname, 'x', (1, 2), ([1], 'a'), {'s1': (2, 'b'), 's2': ([3], 'c')})
+        image = load_schema_image(fname, 'x', (1, 2))
+        self.assertEqual(([1], 'a'), image.tables)
+        self.assertEqual(['s1', 's2'], image.shards)
+        self.assertEqual(([3], 'c'), image.shard('s2'))
+        self.assertEqual((2, 'b'), image.shard('s1'))
+        image.close()
+        self.assertIsNone(load_schema_image(fname, 'x', (1, 3)))
+        self.assertIsNone(load_schema_image(fname, 'y', (1, 2)))
+        with open(fname, 'wb') as f:
+            f.write(IMAGE_MAGIC + b'\x00')
+        self.assertIsNone(load_schema_image(fname, 'x', (1, 2)))
+        self.assertIsNone(load_schema_image(fname + 'x', 'x', (1, 2)))
+
+
+if __name__ == '__main__':
+    unittest.main()
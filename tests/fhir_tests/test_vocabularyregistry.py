@@ -0,0 +1,93 @@
+import os
+import unittest
+
+from rdflib import Graph
+from rdflib.compare import to_isomorphic
+
+from fhirtordf.rdfsupport.namespaces import FHIR
+from tests import FHIR_R4_TTL
+from tests.issue_tests import ISSUE_TEST_DATA_DIR
+
+
+def load_json(text: str):
+    from jsonasobj import loads
+    return loads(text)
+
+
+class VocabularyRegistryTestCase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        from tests.utils.base_test_case import FHIRGraph
+        from fhirtordf.fhir.fhirmetavoc import FHIRSchema
+        cls.stu3_ontology = FHIRGraph()
+        r4_ontology = Graph()
+        r4_ontology.load(FHIR_R4_TTL, format="turtle")
+        cls.r4_schema = FHIRSchema(r4_ontology)
+
+    def test_fhir_release(self):
+        from fhirtordf.fhir.vocabularyregistry import fhir_release
+
+        self.assertEqual('R4', fhir_release('4.0.1'))
+        self.assertEqual('R4', fhir_release('4.0'))
+        self.assertEqual('STU3', fhir_release('3.0.2'))
+        self.assertEqual('R4', fhir_release('r4'))
+        self.assertEqual('9.9.9', fhir_release('9.9.9'))
+
+    def test_registry(self):
+        from fhirtordf.fhir.vocabularyregistry import FHIRVocabularyRegistry
+
+        registry = FHIRVocabularyRegistry()
+        stu3 = registry.register('STU3', self.stu3_ontology)
+        r4 = registry.register('4.0.1', self.r4_schema, profiles=['http://hl7.org/fhir/us/core/'])
+        self.assertEqual(['STU3', 'R4'], registry.releases)
+        self.assertIs(r4, registry.schema('r4'))
+        with self.assertRaises(ValueError):
+            registry.schema('R5')
+
+        # Common URI's are shared between the releases
+        self.assertIs(stu3.predicates(FHIR.Account)['status'], r4.predicates(FHIR.Account)['status'])
+
+        def resource(profile: str = None):
+            meta = ', "meta": {{"profile": ["{}"]}}'.format(profile) if profile else ''
+            return load_json('{{"resourceType": "Patient", "id": "p1"{}}}'.format(meta))
+
+        self.assertEqual('R4', registry.detect(resource('http://hl7.org/fhir/StructureDefinition/Patient|4.0.1')))
+        self.assertEqual('R4', registry.detect(resource('http://hl7.org/fhir/us/core/StructureDefinition/patient')))
+        self.assertIsNone(registry.detect(resource('http://hl7.org/fhir/StructureDefinition/Patient|5.0.0')))
+        self.assertIsNone(registry.detect(resource()))
+
+        self.assertEqual('STU3', registry.release_for(resource('http://x.org/p|4.0.1'), 'STU3'))
+        self.assertEqual('STU3', registry.release_for(resource(), hint='STU3'))
+        self.assertEqual('R4', registry.release_for(resource('http://x.org/p|4.0.1'), hint='STU3'))
+        with self.assertRaises(ValueError):
+            registry.release_for(resource())
+        registry.default = 'R4'
+        self.assertEqual('R4', registry.release_for(resource()))
+        with self.assertRaises(ValueError):
+            registry.release_for(resource(), 'R5')
+
+    def test_routing(self):
+        from fhirtordf.fhir.vocabularyregistry import FHIRVocabularyRegistry
+        from fhirtordf.loaders.fhirjsonloader import fhir_json_to_rdf
+        from fhirtordf.loaders.fhircollectionloader import FHIRCollection
+
+        registry = FHIRVocabularyRegistry(default='STU3')
+        registry.register('STU3', self.stu3_ontology)
+        registry.register('R4', self.r4_schema)
+        test_json = os.path.join(ISSUE_TEST_DATA_DIR, 'issue_15.json')
+        expected = to_isomorphic(fhir_json_to_rdf(test_json, metavoc=self.r4_schema))
+        self.assertEqual(expected, to_isomorphic(fhir_json_to_rdf(test_json, metavoc=registry, fhir_release='R4')))
+        self.assertNotEqual(expected, to_isomorphic(fhir_json_to_rdf(test_json, metavoc=registry)))
+
+        # Entries that don't identify their release take it from the bundle
+        collection = FHIRCollection(registry, None, "http://hl7.org/fhir/", data=load_json(
+            '{"resourceType": "Bundle", "type": "collection", '
+            '"meta": {"profile": ["http://hl7.org/fhir/StructureDefinition/Bundle|4.0.1"]}, "entry": ['
+            '{"resource": {"resourceType": "Patient", "id": "p1"}}, '
+            '{"resource": {"resourceType": "Patient", "id": "p2", '
+            '"meta": {"profile": ["http://hl7.org/fhir/StructureDefinition/Patient|3.0.1"]}}}]}'))
+        self.assertEqual(['R4', 'STU3'], [entry.release for entry in collection.entries])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+import io
+import json
+import os
+import pickle
+import unittest
+
+from tests.utils import test_data_directory
+
+
+class ConversionStatsTestCase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        from tests.utils.base_test_case import FHIRGraph
+        cls.fhir_ontology = FHIRGraph()
+
+    def test_timing(self):
+        from fhirtordf.loaders.conversionstats import ConversionStats
+
+        stats = ConversionStats()
+        stats.begin('Bundle')
+        stats.triples += 2
+        stats.begin('Patient')
+        stats.triples += 5
+        stats.end()
+        stats.begin('Patient')
+        stats.triples += 1
+        stats.end()
+        stats.triples += 1
+        stats.end()
+        self.assertEqual({'Bundle': 3, 'Patient': 6}, {t: ts.triples for t, ts in stats.types.items()})
+        self.assertEqual(2, stats.types['Patient'].count)
+        self.assertEqual(3, stats.resources)
+        self.assertAlmostEqual(stats.seconds, stats.types['Bundle'].seconds + stats.types['Patient'].seconds)
+
+        other = ConversionStats()
+        other.begin('Patient')
+        other.triples += 4
+        other.end()
+        other.lists = 2
+        stats.merge(pickle.loads(pickle.dumps(other)))
+        self.assertEqual((3, 10, 13, 2), (stats.types['Patient'].count, stats.types['Patient'].triples,
+                                          stats.triples, stats.lists))
+
+    def test_conversion(self):
+        from fhirtordf.loaders.conversionstats import ConversionStats
+        from fhirtordf.loaders.fhirjsonloader import fhir_json_to_rdf
+        from fhirtordf.loaders.fhirresourceloader import FHIRResource
+
+        fname = os.path.join(test_data_directory, 'smartonfhir_testdata', 'json', 'obs_sample.json')
+        stats = ConversionStats()
+        triples = []
+        fhir_json_to_rdf(fname, metavoc=self.fhir_ontology, sink=triples.append, stats=stats)
+        self.assertEqual(len(triples), stats.triples)
+        self.assertEqual({'Observation': 9}, {t: ts.count for t, ts in stats.types.items()})
+        self.assertEqual(stats.triples, stats.types['Observation'].triples)
+        self.assertLess(0, stats.lists)
+        self.assertEqual({'term', 'code system', 'vocabulary', 'reference'}, set(stats.cache_counts()))
+        self.assertLess(0, sum(stats.cache_counts()['term']))
+
+        # Bundle entries are reported under their own type
+        with open(fname) as f:
+            bundle = json.load(f)
+        bundle.update(resourceType='Bundle', id='b1', type='collection')
+        for entry in bundle['entry']:
+            entry['fullUrl'] = "http://hl7.org/fhir/Observation/" + entry['resource']['id']
+        stats = ConversionStats()
+        FHIRResource(self.fhir_ontology, None, "http://hl7.org/fhir/", bundle, stats=stats)
+        self.assertEqual({'Bundle': 1, 'Observation': 9}, {t: ts.count for t, ts in stats.types.items()})
+        self.assertEqual(stats.triples, sum(ts.triples for ts in stats.types.values()))
+
+        out = io.StringIO()
+        stats.write_json(out)
+        report = json.loads(out.getvalue())
+        self.assertEqual(10, report['resources'])
+        self.assertIn('Observation', report['types'])
+        self.assertIn('Bundle', str(stats))
+
+
+if __name__ == '__main__':
+    unittest.main()
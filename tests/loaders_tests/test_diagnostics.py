@@ -0,0 +1,109 @@
+import io
+import os
+import pickle
+import unittest
+from contextlib import redirect_stdout
+
+from jsonasobj import load
+
+from fhirtordf.fhir.fhirmetavoc import FHIRSchema
+from tests.utils import test_data_directory
+
+
+class CountingArg:
+    """ Message argument that counts the times it is formatted """
+    def __init__(self):
+        self.formatted = 0
+
+    def __format__(self, format_spec):
+        self.formatted += 1
+        return "arg"
+
+
+class DiagnosticsTestCase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        from tests.utils.base_test_case import FHIRGraph
+        cls.fhir_schema = FHIRSchema.for_vocabulary(FHIRGraph())
+
+    def test_samples(self):
+        from fhirtordf.loaders.diagnostics import Diagnostics, Diagnostic, UNKNOWN_KEY, FHIR_COMMENT
+
+        arg = CountingArg()
+        diagnostics = Diagnostics(max_samples=2)
+        for _ in range(5):
+            diagnostics.report(UNKNOWN_KEY, "http://example.org/fhir/Patient/p1", "key {}", arg)
+        diagnostics.report(FHIR_COMMENT, "http://example.org/fhir/Patient/p1", "comment")
+        self.assertEqual(6, len(diagnostics))
+        self.assertEqual({UNKNOWN_KEY: 5, FHIR_COMMENT: 1}, dict(diagnostics.counts))
+        self.assertEqual([Diagnostic(UNKNOWN_KEY, "http://example.org/fhir/Patient/p1", "key arg")] * 2,
+                         diagnostics.samples[UNKNOWN_KEY])
+        # Messages past the sample limit are never formatted
+        self.assertEqual(2, arg.formatted)
+        sample = dict(code=UNKNOWN_KEY, resource="http://example.org/fhir/Patient/p1", message="key arg")
+        self.assertEqual(dict(count=5, samples=[sample] * 2), diagnostics.as_dict()[UNKNOWN_KEY])
+
+        # Every diagnostic goes to a callback
+        seen = []
+        diagnostics = Diagnostics(max_samples=2, callback=seen.append)
+        for _ in range(5):
+            diagnostics.report(UNKNOWN_KEY, "p1", "key {}", arg)
+        self.assertEqual(5, len(seen))
+        self.assertEqual(2, len(diagnostics.samples[UNKNOWN_KEY]))
+
+        # The callback doesn't go along to other processes.  Merged samples are passed to it
+        copy = pickle.loads(pickle.dumps(diagnostics))
+        self.assertIsNone(copy.callback)
+        diagnostics.merge(copy)
+        self.assertEqual(10, diagnostics.counts[UNKNOWN_KEY])
+        self.assertEqual(2, len(diagnostics.samples[UNKNOWN_KEY]))
+        self.assertEqual(7, len(seen))
+
+    def test_conversion(self):
+        from fhirtordf.loaders.diagnostics import Diagnostics, UNKNOWN_KEY, FHIR_COMMENT, ENTRY_ELEMENT
+        from fhirtordf.loaders.fhirjsonloader import fhir_json_to_rdf
+        from fhirtordf.loaders.fhirresourceloader import FHIRResource
+
+        patient = load(os.path.join(test_data_directory, 'patient-example.json'))
+        patient.bogusKey = "ignored"
+        patient._birthDate = load(io.StringIO('{"fhir_comments": ["a comment"]}'))
+
+        # Nothing is printed, with or without a collector
+        for diagnostics in (None, Diagnostics()):
+            output = io.StringIO()
+            with redirect_stdout(output):
+                fhir_json_to_rdf(patient, metavoc=self.fhir_schema, diagnostics=diagnostics)
+            self.assertEqual("", output.getvalue())
+        self.assertEqual({UNKNOWN_KEY: 1, FHIR_COMMENT: 1}, dict(diagnostics.counts))
+        self.assertEqual("http://hl7.org/fhir/Patient has no element 'bogusKey'",
+                         diagnostics.samples[UNKNOWN_KEY][0].message)
+        self.assertEqual("http://hl7.org/fhir/Patient/example", diagnostics.samples[UNKNOWN_KEY][0].resource)
+        self.assertIn("a comment", diagnostics.samples[FHIR_COMMENT][0].message)
+
+        bundle = load(io.StringIO('{"resourceType": "Bundle", "id": "b1", "type": "searchset", "entry": []}'))
+        bundle.entry.append(load(io.StringIO('{"fullUrl": "http://hl7.org/fhir/Patient/example", '
+                                             '"search": {"mode": "match"}}')))
+        bundle.entry[0].resource = patient
+        diagnostics = Diagnostics()
+        FHIRResource(self.fhir_schema, None, "http://hl7.org/fhir/", bundle, diagnostics=diagnostics)
+        self.assertEqual({UNKNOWN_KEY: 1, FHIR_COMMENT: 1, ENTRY_ELEMENT: 1}, dict(diagnostics.counts))
+
+    def test_extension_list(self):
+        from fhirtordf.loaders.diagnostics import Diagnostics, EXTENSION_LIST
+        from fhirtordf.loaders.fhirresourceloader import FHIRResource
+
+        patient = load(os.path.join(test_data_directory, 'patient-example.json'))
+        expected = set(FHIRResource(self.fhir_schema, None, "http://hl7.org/fhir/", patient, node_ids='path').graph)
+
+        # A list of extensions for a single value is skipped, along with the extensions, and the value is kept
+        patient._gender = load(io.StringIO('[{"extension": [{"url": "http://example.org/x", "valueString": "x"}]}]'))
+        diagnostics = Diagnostics()
+        g = FHIRResource(self.fhir_schema, None, "http://hl7.org/fhir/", patient, node_ids='path',
+                         diagnostics=diagnostics).graph
+        self.assertEqual(expected, set(g))
+        self.assertEqual({EXTENSION_LIST: 1}, dict(diagnostics.counts))
+        self.assertIn("'gender'", diagnostics.samples[EXTENSION_LIST][0].message)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -87,6 +87,77 @@ class FHIRCollectionTestCase(unittest.TestCase):
              'Observation/SMART-Observation-1685-lab.ttl'], generated_files)
         print("\n*****> Check outputs in {}".format(output_dir))
 
+    def test_iter_collection(self):
+        """ The lazy form of a collection has to produce the same triples, one entry at a time """
+        from rdflib import Graph
+        from fhirtordf.loaders.fhircollectionloader import FHIRCollection, iter_collection
+        from fhirtordf.loaders.jsondecoder import load_json
+        from fhirtordf.rdfsupport.namespaces import FHIR
+
+        fname = os.path.join(self.test_input_directory, 'smartonfhir_testdata', 'json', 'obs_sample.json')
+        base = "https://sb-fhir-dstu2.smarthealthit.org/api/smartdstu2/open/"
+        expected = Graph()
+        FHIRCollection(self.fhir_ontology, fname, base, target=expected, node_ids='path')
+
+        prefixes = dict()
+        uris = []
+        triples = set()
+        for uri, entry_triples in iter_collection(self.fhir_ontology, fname, base, node_ids='path',
+                                                  prefixes=prefixes):
+            self.assertIsInstance(entry_triples, list)
+            uris.append(uri)
+            triples.update(entry_triples)
+        self.assertEqual(9, len(uris))
+        self.assertEqual(base + 'Observation/SMART-Observation-5-smokingstatus', str(uris[0]))
+        self.assertEqual(set(expected), triples)
+        self.assertEqual(str(FHIR), prefixes['fhir'])
+
+        # Subgraphs carry their own prefixes, and streaming the entries makes no difference
+        for stream in (False, True):
+            triples = set()
+            for uri, g in iter_collection(self.fhir_ontology, fname, base, node_ids='path', subgraphs=True,
+                                          stream=stream):
+                self.assertIn((uri, FHIR.nodeRole, FHIR.treeRoot), g)
+                self.assertEqual(str(FHIR), str(dict(g.namespaces())['fhir']))
+                triples.update(g)
+            self.assertEqual(set(expected), triples)
+
+        # Entries that are passed in are left alone.  Entries that are read in are let go as they are converted
+        data = load_json(fname)
+        entries = iter_collection(self.fhir_ontology, None, base, data, node_ids='path')
+        next(entries)
+        self.assertTrue(all(entry is not None for entry in data['entry']))
+
+    def test_stream_meta_after_entries(self):
+        """ The release of a streamed collection is detected from meta, even when it comes after the entries """
+        import json
+        import tempfile
+        from unittest.mock import patch
+        from fhirtordf.fhir.vocabularyregistry import FHIRVocabularyRegistry
+        from fhirtordf.loaders.fhircollectionloader import iter_collection
+
+        registry = FHIRVocabularyRegistry()
+        registry.register('STU3', self.fhir_ontology)
+        fname = os.path.join(self.test_input_directory, 'smartonfhir_testdata', 'json', 'obs_sample.json')
+        with open(fname) as f:
+            collection = dict(resourceType="Bundle", **json.load(f))
+        collection['meta'] = {"profile": ["http://hl7.org/fhir/StructureDefinition/Bundle|3.0.1"]}
+        with tempfile.TemporaryDirectory() as tmpdir:
+            reordered = os.path.join(tmpdir, 'meta_last.json')
+            with open(reordered, 'w') as f:
+                json.dump(collection, f)
+            detected = []
+            registry_detect = FHIRVocabularyRegistry.detect
+
+            def detect(self, resource):
+                detected.append(registry_detect(self, resource))
+                return detected[-1]
+            with patch.object(FHIRVocabularyRegistry, 'detect', detect):
+                uris = [uri for uri, _ in iter_collection(registry, reordered, "http://hl7.org/fhir/", stream=True)]
+        self.assertEqual(9, len(uris))
+        # The first detection is of the collection itself
+        self.assertEqual('STU3', detected[0])
+
 
 if __name__ == '__main__':
     unittest.main()
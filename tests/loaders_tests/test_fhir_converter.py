@@ -0,0 +1,83 @@
+import os
+import unittest
+
+from jsonasobj import load
+from rdflib import Graph
+
+from fhirtordf.fhir.fhirmetavoc import FHIRSchema
+from fhirtordf.rdfsupport.namespaces import FHIR, SNOMEDCT
+from fhirtordf.rdfsupport.triplesink import TripleSink
+from tests.utils import test_data_directory
+
+
+class CountingSink(TripleSink):
+    """ Collect the triples and count the prefix bindings """
+    def __init__(self):
+        self.triples = set()
+        self.binds = 0
+        self.add = self.triples.add
+
+    def bind(self, prefix, namespace):
+        self.binds += 1
+
+
+class FHIRConverterTestCase(unittest.TestCase):
+    """ A conversion session has to produce the same triples as converting each resource on its own """
+    @classmethod
+    def setUpClass(cls):
+        from tests.utils.base_test_case import FHIRGraph
+        cls.fhir_schema = FHIRSchema.for_vocabulary(FHIRGraph())
+
+    fnames = ['patient-example.json', 'observation-example-f001-glucose.json', 'observation-example-bmd.json']
+
+    def test_convert_many(self):
+        from fhirtordf.loaders.fhirconverter import FHIRConverter
+        from fhirtordf.loaders.fhirresourceloader import FHIRResource
+
+        expected = Graph()
+        for fname in self.fnames:
+            FHIRResource(self.fhir_schema, os.path.join(test_data_directory, fname), "http://hl7.org/fhir",
+                         target=expected, node_ids='path')
+
+        # File names and JSON objects can be mixed
+        converter = FHIRConverter(self.fhir_schema, "http://hl7.org/fhir", node_ids='path')
+        g = converter.convert_many([os.path.join(test_data_directory, self.fnames[0])] +
+                                   [load(os.path.join(test_data_directory, fname)) for fname in self.fnames[1:]])
+        self.assertIs(converter.graph, g)
+        self.assertEqual(set(expected), set(g))
+        # Only the prefixes that are used are bound
+        prefixes = dict(g.namespaces())
+        self.assertLess(set(prefixes.items()), set(expected.namespaces()))
+        self.assertEqual(str(FHIR), str(prefixes['fhir']))
+        self.assertEqual(str(SNOMEDCT), str(prefixes['sct']))
+        self.assertNotIn('w5', prefixes)
+        self.assertNotIn('rxnorm', prefixes)
+
+        resource = converter.convert(os.path.join(test_data_directory, self.fnames[0]))
+        self.assertEqual('Patient', resource.resource_type)
+        self.assertEqual(set(expected), set(g))
+
+    def test_prefixes_bound_once(self):
+        from fhirtordf.loaders.fhirconverter import FHIRConverter
+        from fhirtordf.loaders.fhirresourceloader import FHIRResource
+
+        sink = CountingSink()
+        for fname in self.fnames:
+            FHIRResource(self.fhir_schema, os.path.join(test_data_directory, fname), "http://hl7.org/fhir/",
+                         target=sink, node_ids='path')
+        unshared = sink
+
+        sink = CountingSink()
+        converter = FHIRConverter(self.fhir_schema, target=sink, node_ids='path')
+        self.assertIs(sink, converter.convert_many(os.path.join(test_data_directory, fname) for fname in self.fnames))
+        self.assertEqual(unshared.triples, sink.triples)
+        # Nothing is bound until the end, and then only once
+        self.assertEqual(0, sink.binds)
+        converter.flush()
+        converter.flush()
+        self.assertEqual(len(converter.prefixes), sink.binds)
+        self.assertLess(sink.binds, unshared.binds)
+
+
+if __name__ == '__main__':
+    unittest.main()
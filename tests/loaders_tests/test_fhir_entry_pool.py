@@ -0,0 +1,109 @@
+import io
+import os
+import unittest
+
+from jsonasobj import load
+from rdflib import Graph
+from rdflib.compare import to_isomorphic
+
+from fhirtordf.fhir.fhirmetavoc import FHIRSchema
+from tests.utils import test_data_directory
+
+
+class FHIREntryPoolTestCase(unittest.TestCase):
+    """ Entries converted in worker processes have to produce the same triples as a serial conversion """
+    @classmethod
+    def setUpClass(cls):
+        from tests.utils.base_test_case import FHIRGraph
+        from fhirtordf.loaders.fhirentrypool import EntryPool
+
+        cls.fhir_schema = FHIRSchema.for_vocabulary(FHIRGraph())
+        cls.pool = EntryPool(cls.fhir_schema, workers=2, batch_size=4)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.pool.close()
+
+    def test_collection(self):
+        from fhirtordf.loaders.conversionstats import ConversionStats
+        from fhirtordf.loaders.diagnostics import Diagnostics
+        from fhirtordf.loaders.fhirconverter import FHIRConverter
+        from fhirtordf.loaders.fhirjsonloader import fhir_json_to_rdf
+        from fhirtordf.loaders.jsondecoder import load_json
+
+        fname = os.path.join(test_data_directory, 'smartonfhir_testdata', 'json', 'obs_sample.json')
+        for options in ({}, {'raw_literals': True}):
+            serial = fhir_json_to_rdf(fname, metavoc=self.fhir_schema, **options)
+            pooled = fhir_json_to_rdf(fname, metavoc=self.fhir_schema, entry_pool=self.pool, **options)
+            self.assertEqual(to_isomorphic(serial), to_isomorphic(pooled), options)
+            self.assertEqual(sorted(serial.namespaces()), sorted(pooled.namespaces()))
+
+        # Entries go into the sink in order
+        serial = io.StringIO()
+        fhir_json_to_rdf(fname, metavoc=self.fhir_schema, sink=serial, node_ids='path')
+        pooled = io.StringIO()
+        fhir_json_to_rdf(fname, metavoc=self.fhir_schema, sink=pooled, node_ids='path', entry_pool=self.pool)
+        self.assertEqual(serial.getvalue(), pooled.getvalue())
+        streamed = io.StringIO()
+        fhir_json_to_rdf(fname, metavoc=self.fhir_schema, sink=streamed, node_ids='path', entry_pool=self.pool,
+                         stream=True)
+        self.assertEqual(serial.getvalue(), streamed.getvalue())
+        session = io.StringIO()
+        converter = FHIRConverter(self.fhir_schema, target=session, add_ontology_header=False, node_ids='path',
+                                  entry_pool=self.pool)
+        converter.convert_many(entry['resource'] for entry in load_json(fname)['entry'])
+        converter.flush()
+        self.assertEqual(serial.getvalue(), session.getvalue())
+
+        # Statistics come back from the workers
+        serial_stats = ConversionStats()
+        fhir_json_to_rdf(fname, metavoc=self.fhir_schema, sink=io.StringIO(), stats=serial_stats)
+        pooled_stats = ConversionStats()
+        fhir_json_to_rdf(fname, metavoc=self.fhir_schema, sink=io.StringIO(), entry_pool=self.pool,
+                         stats=pooled_stats)
+        self.assertEqual((serial_stats.resources, serial_stats.triples, serial_stats.lists),
+                         (pooled_stats.resources, pooled_stats.triples, pooled_stats.lists))
+        self.assertIn('term', pooled_stats.cache_counts())
+
+        # So do diagnostics
+        collection = load_json(fname)
+        for entry in collection['entry']:
+            entry['resource']['bogusKey'] = 1
+        serial_diagnostics = Diagnostics()
+        fhir_json_to_rdf(collection, metavoc=self.fhir_schema, sink=io.StringIO(), diagnostics=serial_diagnostics)
+        pooled_diagnostics = Diagnostics()
+        fhir_json_to_rdf(collection, metavoc=self.fhir_schema, sink=io.StringIO(), entry_pool=self.pool,
+                         diagnostics=pooled_diagnostics)
+        self.assertGreaterEqual(serial_diagnostics.counts['unknown-key'], len(collection['entry']))
+        self.assertEqual(serial_diagnostics.counts, pooled_diagnostics.counts)
+
+    def test_bundle(self):
+        from fhirtordf.loaders.fhirresourceloader import FHIRResource
+
+        bundle = load(os.path.join(test_data_directory, 'synthea_data', 'Adams301_Keyshawn30_74.json'))
+        for idx, entry in enumerate(bundle.entry):
+            entry.resource.id = entry.resource.id if 'id' in entry.resource else "r{}".format(idx)
+            entry.fullUrl = "http://example.org/fhir/{}/{}".format(entry.resource.resourceType, entry.resource.id)
+        serial = FHIRResource(self.fhir_schema, None, "http://hl7.org/fhir/", bundle).graph
+        pooled = FHIRResource(self.fhir_schema, None, "http://hl7.org/fhir/", bundle, entry_pool=self.pool).graph
+        self.assertEqual(to_isomorphic(serial), to_isomorphic(pooled))
+        triples = []
+        FHIRResource(self.fhir_schema, None, "http://hl7.org/fhir/", bundle, target=triples.append,
+                     node_ids='path', entry_pool=self.pool)
+        g = Graph()
+        FHIRResource(self.fhir_schema, None, "http://hl7.org/fhir/", bundle, target=g, node_ids='path')
+        self.assertEqual(set(g), set(triples))
+
+    def test_errors(self):
+        from fhirtordf.loaders.fhirresourceloader import FHIRResource
+
+        bundle = load(os.path.join(test_data_directory, 'synthea_data', 'Adams301_Keyshawn30_74.json'))
+        bundle.entry[0].fullUrl = "http://example.org/fhir/Patient/p1"
+        del bundle.entry[0].resource.resourceType
+        bundle.entry = bundle.entry[:1]
+        with self.assertRaises(ValueError):
+            FHIRResource(self.fhir_schema, None, "http://hl7.org/fhir/", bundle, entry_pool=self.pool)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,223 @@
+import itertools
+import os
+import time
+import unittest
+from typing import Union, List, Optional, Type
+from unittest.mock import patch
+
+from jsonasobj import JsonObj, load
+from rdflib import Graph, RDF, URIRef
+from rdflib.compare import to_isomorphic
+from rdflib.term import Node, BNode
+
+from fhirtordf.fhir.fhirmetavoc import FHIRSchema
+from fhirtordf.loaders.fhirresourceloader import FHIRResource, PATH_NODE_IDS
+from fhirtordf.loaders.jsondecoder import JSONObject, JSON_OBJECT_TYPES, json_dict
+from fhirtordf.rdfsupport.fhirresourcere import REPLACED_NARRATIVE_TEXT
+from fhirtordf.rdfsupport.namespaces import FHIR
+from tests.utils import test_data_directory, SKIP_BENCHMARKS
+
+
+class RecursiveFHIRResource(FHIRResource):
+    """ The recursive walk that the work stack replaced.  Kept as the reference for the triples and the benchmark """
+    def add_resource(self, subj: URIRef, json_obj: JSONObject) -> None:
+        resource_type = FHIR[json_obj['resourceType']]
+        self.add(subj, RDF.type, resource_type)
+        properties = self.schema.properties(resource_type)
+        for k in json_dict(json_obj):
+            if k in properties:
+                self.add_val(subj, properties[k].predicate, json_obj, k)
+
+    def add_value_node(self, subj: Node, pred: URIRef, val: Union[JSONObject, str, List],
+                       valuetype: Optional[URIRef] = None) -> None:
+        pred_type = self.schema.predicate_type(pred) if not valuetype else valuetype
+        if pred_type == FHIR.Resource:
+            pred_type = FHIR[val['resourceType']]
+        if not isinstance(val, JSON_OBJECT_TYPES):
+            return
+        properties = self.schema.properties(pred_type)
+        choices = self.schema.choice_properties(pred_type)
+        for k in json_dict(val):
+            if k in properties:
+                self.add_val(subj, properties[k].predicate, val, k)
+            elif k in choices:
+                self.add_val(subj, choices[k].predicate, val, k, choices[k].range)
+            elif k[:1] == '_' and k[1:] in properties and k[1:] not in val:
+                self.add_extension_val(subj, val, k[1:], properties[k[1:]].predicate)
+        if pred == FHIR.CodeableConcept.coding:
+            self.add_type_arc(subj, val)
+
+    def add_val(self, subj: Node, pred: URIRef, json_obj: JSONObject, json_key: str,
+                valuetype: Optional[URIRef] = None) -> Optional[BNode]:
+        if json_key not in json_obj:
+            return None
+        val = json_obj[json_key]
+        if isinstance(val, List):
+            for list_idx, lv in enumerate(val):
+                entry_bnode = self.node(subj, pred, list_idx)
+                self.add(entry_bnode, FHIR.index, self.term_pool.index(list_idx))
+                if pred == FHIR.Bundle.entry:
+                    entry_subj = self.term_pool.uri(lv['fullUrl'])
+                    self.add_val(entry_bnode, FHIR.Bundle.entry.fullUrl, lv, 'fullUrl')
+                    self.add(entry_bnode, FHIR.Bundle.entry.resource, entry_subj)
+                    for k, prop in self.schema.properties(FHIR.BundleEntryComponent).items():
+                        if k not in ['resource', 'fullUrl'] and k in lv:
+                            self.add_val(subj, prop.predicate, lv, k)
+                    RecursiveFHIRResource(self.schema, None, self._base_uri, lv['resource'], self.sink, False,
+                                          self._replace_narrative_text, False, resource_uri=entry_subj,
+                                          raw_literals=self.raw_literals, node_ids=self.node_ids)
+                elif isinstance(lv, JSON_OBJECT_TYPES):
+                    self.add_value_node(entry_bnode, pred, lv, valuetype)
+                else:
+                    vt = self.schema.predicate_type(pred)
+                    atom_type = self.schema.primitive_datatype_nostring(vt) if vt else None
+                    self.add(entry_bnode, FHIR.value, self.term_pool.raw_literal(lv, atom_type) if self.raw_literals
+                             else self.term_pool.literal(lv, atom_type))
+                self.add(subj, pred, entry_bnode)
+            return None
+        vt = self.schema.predicate_type(pred) if not valuetype else valuetype
+        if self.schema.is_atom(pred):
+            if self._replace_narrative_text and pred == FHIR.Narrative.div and len(val) > 120:
+                val = REPLACED_NARRATIVE_TEXT
+            self.add(subj, pred, self.term_pool.literal(val))
+            return None
+        v = self.node(subj, pred)
+        if self.schema.is_primitive(vt):
+            datatype = self.schema.primitive_datatype_nostring(vt, val)
+            self.add(v, FHIR.value, self.term_pool.raw_literal(val, datatype) if self.raw_literals
+                     else self.term_pool.literal(str(val), datatype))
+        else:
+            self.add_value_node(v, pred, val, valuetype)
+        self.add(subj, pred, v)
+        if pred == FHIR.Reference.reference:
+            self.add_reference(subj, val)
+        elif pred == FHIR.RelatedArtifact.resource:
+            self.add_reference(v, val)
+        self.add_extension_val(v, json_obj, json_key)
+        return v
+
+    def add_extension_val(self, subj: Node, json_obj: Union[JSONObject, List], key: str,
+                          pred: Optional[URIRef] = None) -> None:
+        extendee_name = "_" + key
+        if extendee_name in json_obj:
+            if not isinstance(subj, BNode) and self.node_ids != PATH_NODE_IDS:
+                raise NotImplementedError("Extension to something other than a simple BNode")
+            extendee = json_obj[extendee_name]
+            if isinstance(extendee, list):
+                for entry_idx, extension in enumerate(extendee if pred else []):
+                    entry = self.node(subj, pred, entry_idx)
+                    self.add(entry, FHIR.index, self.term_pool.index(entry_idx))
+                    self.add_val(entry, FHIR.Element.extension, extension, 'extension')
+                    self.add(subj, pred, entry)
+            elif not ('fhir_comments' in extendee and len(extendee) == 1):
+                self.add_val(subj, FHIR.Element.extension, extendee, 'extension')
+
+
+class FHIRResourceWalkTestCase(unittest.TestCase):
+    """ The work stack walk of the JSON has to produce the same triples as the recursive walk it replaced """
+    @classmethod
+    def setUpClass(cls):
+        from tests.utils.base_test_case import FHIRGraph
+        cls.fhir_schema = FHIRSchema.for_vocabulary(FHIRGraph())
+
+    def convert(self, source: Union[str, JsonObj], resource_class: Type[FHIRResource] = FHIRResource) -> Graph:
+        if isinstance(source, str):
+            source = load(os.path.join(test_data_directory, source))
+        ids = itertools.count()
+        with patch('fhirtordf.loaders.fhirresourceloader.uuid4', lambda: "id{}".format(next(ids))):
+            return resource_class(self.fhir_schema, None, "http://hl7.org/fhir/", source).graph
+
+    @staticmethod
+    def bundle(copies: int=1) -> JsonObj:
+        """ The synthea collection as a Bundle resource, with its entries repeated copies times """
+        fname = os.path.join(test_data_directory, 'synthea_data', 'Adams301_Keyshawn30_74.json')
+        bundle = load(fname)
+        for _ in range(copies - 1):
+            bundle.entry += load(fname).entry
+        for idx, entry in enumerate(bundle.entry):
+            entry.fullUrl = "http://example.org/fhir/{}/e{}".format(entry.resource.resourceType, idx)
+        return bundle
+
+    def test_same_triples(self):
+        for source in ['patient-example.json', 'observation-example-f001-glucose.json',
+                       'observation-example-bmd.json', self.bundle()]:
+            walked = self.convert(source)
+            recursive = self.convert(source, RecursiveFHIRResource)
+            self.assertEqual(len(recursive), len(walked), source)
+            self.assertEqual(to_isomorphic(recursive), to_isomorphic(walked), source)
+
+    @staticmethod
+    def nested_patient(depth: int) -> JsonObj:
+        """ A patient with depth levels of nested extensions """
+        ext = JsonObj(url="http://example.org/ext/{}".format(depth), valueString="innermost")
+        for level in range(depth - 1, 0, -1):
+            ext = JsonObj(url="http://example.org/ext/{}".format(level), extension=[ext])
+        return JsonObj(resourceType="Patient", id="nested", extension=[ext])
+
+    def test_deep_nesting(self):
+        patient = self.nested_patient(2000)
+        with self.assertRaises(RecursionError):
+            self.convert(patient, RecursiveFHIRResource)
+        g = self.convert(patient)
+        self.assertEqual(2000, len(set(g.subjects(FHIR.Extension.url, None))))
+
+    def test_deep_nesting_converters(self):
+        """ The generated converters are steps of the work stack walk as well """
+        from fhirtordf.fhir.convertergen import generate_converters
+
+        patient = self.nested_patient(2000)
+        expected = self.convert(patient)
+        converters = dict()
+        exec(compile(generate_converters(self.fhir_schema, 'nested', (), ['Patient']), '<converters>', 'exec'),
+             converters)
+        self.assertIn(FHIR.Extension, converters['CONVERTERS'])
+        self.fhir_schema.converters = converters['CONVERTERS']
+        try:
+            g = self.convert(patient)
+        finally:
+            self.fhir_schema.converters = None
+        self.assertEqual(2000, len(set(g.subjects(FHIR.Extension.url, None))))
+        self.assertEqual(len(expected), len(g))
+
+    def test_unknown_keys(self):
+        patient = load(os.path.join(test_data_directory, 'patient-example.json'))
+        expected = set(FHIRResource(self.fhir_schema, None, "http://hl7.org/fhir/", patient, node_ids='path').graph)
+        patient.bogusKey = "ignored"
+        patient.name[0].nickname = ["ignored"]
+        patient.name[1].nickname = ["ignored"]
+        r = FHIRResource(self.fhir_schema, None, "http://hl7.org/fhir/", patient, node_ids='path')
+        self.assertEqual(expected, set(r.graph))
+        self.assertEqual({(FHIR.Patient, 'bogusKey'): 1, (FHIR.HumanName, 'nickname'): 2}, dict(r.unknown_keys))
+
+        # Keys in the entries of a bundle are collected as well
+        bundle = self.bundle()
+        before = FHIRResource(self.fhir_schema, None, "http://hl7.org/fhir/", bundle).unknown_keys
+        bundle.entry[0].resource.bogusKey = 1
+        after = FHIRResource(self.fhir_schema, None, "http://hl7.org/fhir/", bundle).unknown_keys
+        self.assertEqual({(FHIR[bundle.entry[0].resource.resourceType], 'bogusKey'): 1}, dict(after - before))
+
+        # The resourceType of a contained resource names its type -- it isn't a key of that type
+        patient = load(os.path.join(test_data_directory, 'patient-example.json'))
+        patient.contained = [JsonObj(resourceType="Organization", id="o1", name="Contained")]
+        r = FHIRResource(self.fhir_schema, None, "http://hl7.org/fhir/", patient, node_ids='path')
+        self.assertIn(FHIR.Organization, set(r.graph.objects(None, RDF.type)))
+        self.assertEqual({}, dict(r.unknown_keys))
+        patient.contained[0].bogusKey = 1
+        r = FHIRResource(self.fhir_schema, None, "http://hl7.org/fhir/", patient, node_ids='path')
+        self.assertEqual({(FHIR.Organization, 'bogusKey'): 1}, dict(r.unknown_keys))
+
+    @unittest.skipIf(SKIP_BENCHMARKS, "Benchmarks skipped")
+    def test_benchmark(self):
+        bundle = self.bundle(100)
+        for name, resource_class in (("Work stack", FHIRResource), ("Recursive", RecursiveFHIRResource)):
+            best = None
+            for _ in range(5):
+                start = time.perf_counter()
+                self.convert(bundle, resource_class)
+                elapsed = time.perf_counter() - start
+                best = elapsed if best is None else min(best, elapsed)
+            print("{} walk: {:.3f}s".format(name, best))
+
+
+if __name__ == '__main__':
+    unittest.main()
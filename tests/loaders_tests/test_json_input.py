@@ -0,0 +1,68 @@
+import json
+import os
+import unittest
+
+from jsonasobj import load
+
+from tests.utils import test_data_directory
+
+
+class JSONInputTestCase(unittest.TestCase):
+    """ Dictionaries, JsonObjs and files all convert the same way """
+    @classmethod
+    def setUpClass(cls):
+        from tests.utils.base_test_case import FHIRGraph
+        cls.fhir_ontology = FHIRGraph()
+
+    def test_dict_input(self):
+        from fhirtordf.loaders.fhirjsonloader import fhir_json_to_rdf
+
+        for fname in ('patient-example.json', 'observation-example-f001-glucose.json',
+                      os.path.join('smartonfhir_testdata', 'json', 'obs_sample.json')):
+            json_fname = os.path.join(test_data_directory, fname)
+            with open(json_fname) as f:
+                data = json.load(f)
+            expected = set(fhir_json_to_rdf(load(json_fname), metavoc=self.fhir_ontology, node_ids='path'))
+            self.assertEqual(expected, set(fhir_json_to_rdf(json_fname, metavoc=self.fhir_ontology,
+                                                            node_ids='path')), fname)
+            g = fhir_json_to_rdf(data, metavoc=self.fhir_ontology, node_ids='path')
+            self.assertEqual(expected, set(g), fname)
+
+    def test_list_input(self):
+        from fhirtordf.loaders.fhirjsonloader import fhir_json_to_rdf
+
+        resources = []
+        for fname in ('patient-example.json', 'account-example.json'):
+            with open(os.path.join(test_data_directory, fname)) as f:
+                resources.append(json.load(f))
+        expected = set(fhir_json_to_rdf(resources[0], metavoc=self.fhir_ontology, node_ids='path')) | \
+            set(fhir_json_to_rdf(resources[1], metavoc=self.fhir_ontology, node_ids='path'))
+        self.assertEqual(expected, set(fhir_json_to_rdf(resources, metavoc=self.fhir_ontology, node_ids='path')))
+        self.assertIsNone(fhir_json_to_rdf([resources[0], {'nothing': 'here'}], metavoc=self.fhir_ontology))
+
+    def test_decoder(self):
+        from fhirtordf.loaders.fhirjsonloader import fhir_json_to_rdf
+        from fhirtordf.loaders.jsondecoder import default_decoder
+
+        decoded = []
+
+        def decoder(text):
+            decoded.append(text)
+            return json.loads(text)
+
+        json_fname = os.path.join(test_data_directory, 'observation-example-f001-glucose.json')
+        g = fhir_json_to_rdf(json_fname, metavoc=self.fhir_ontology, json_decoder=decoder)
+        self.assertEqual(1, len(decoded))
+        self.assertEqual(len(fhir_json_to_rdf(json_fname, metavoc=self.fhir_ontology)), len(g))
+
+        # Raw literal mode keeps decimals as they are written
+        self.assertEqual({'v': '1.50'}, default_decoder(True)('{"v": 1.50}'))
+        self.assertEqual({'v': 1.5}, default_decoder()('{"v": 1.50}'))
+        obs = default_decoder(True)('{"resourceType": "Observation", "id": "o1", "status": "final", '
+                                    '"code": {"text": "x"}, "valueQuantity": {"value": 1.50}}')
+        g = fhir_json_to_rdf(obs, metavoc=self.fhir_ontology, raw_literals=True)
+        self.assertIn('1.50', [str(o) for o in g.objects()])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,88 @@
+import io
+import itertools
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from tests.utils import test_data_directory
+
+
+class JSONStreamTestCase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        from tests.utils.base_test_case import FHIRGraph
+        cls.fhir_ontology = FHIRGraph()
+
+    def test_parse(self):
+        from fhirtordf.loaders.jsonstream import JSONStream
+
+        for fname in (os.path.join('synthea_data', 'Adams301_Keyshawn30_74.json'),
+                      os.path.join('smartonfhir_testdata', 'json', 'obs_sample.json'), 'patient-example.json'):
+            json_fname = os.path.join(test_data_directory, fname)
+            with open(json_fname) as f:
+                expected = json.load(f)
+            # Small chunks make values span reads
+            for chunk_size in (7, 1000, 1 << 16):
+                with JSONStream(json_fname, chunk_size=chunk_size) as js:
+                    entries = list(js.entries())
+                    data = dict(js.header, entry=entries) if entries else js.header
+                    self.assertEqual(expected, data, fname)
+                    self.assertEqual(len(entries), js.entry_count)
+
+        js = JSONStream(io.StringIO('{"resourceType": "Bundle", "entry": [1, {"x": "]}\\"{"}, 2.50], "total": 3}'),
+                        raw_literals=True, chunk_size=1)
+        self.assertEqual([1, {'x': ']}"{'}, '2.50'], list(js.entries()))
+        self.assertEqual({'resourceType': 'Bundle', 'total': 3}, js.header)
+
+        # Only Bundle entries are streamed
+        js = JSONStream(io.StringIO('{"resourceType": "List", "entry": [{"item": {"reference": "Patient/1"}}]}'))
+        self.assertEqual([], list(js.entries()))
+        self.assertEqual([{"item": {"reference": "Patient/1"}}], js.header['entry'])
+
+        for bad in ('[1]', '{"a" 1}', '{"entry": [1 2]}', '{"a": 1', '{"a": "1}'):
+            with self.assertRaises(ValueError, msg=bad):
+                list(JSONStream(io.StringIO(bad)).entries())
+
+    def test_convert(self):
+        from fhirtordf.loaders.fhirjsonloader import fhir_json_to_rdf
+
+        for fname in (os.path.join('smartonfhir_testdata', 'json', 'obs_sample.json'), 'patient-example.json'):
+            json_fname = os.path.join(test_data_directory, fname)
+            for options in ({}, {'raw_literals': True}):
+                expected = io.StringIO()
+                fhir_json_to_rdf(json_fname, metavoc=self.fhir_ontology, sink=expected, node_ids='path', **options)
+                streamed = io.StringIO()
+                fhir_json_to_rdf(json_fname, metavoc=self.fhir_ontology, sink=streamed, node_ids='path', stream=True,
+                                 **options)
+                self.assertEqual(expected.getvalue(), streamed.getvalue(), fname)
+
+    def test_header_after_entries(self):
+        """ Members of a bundle that follow its entries have to be taken into account all the same """
+        from fhirtordf.loaders.fhirjsonloader import fhir_json_to_rdf
+        from rdflib import Graph, OWL, RDF
+
+        with open(os.path.join(test_data_directory, 'synthea_data', 'Adams301_Keyshawn30_74.json')) as f:
+            bundle = json.load(f)
+        self.assertEqual(['type', 'entry', 'resourceType'], list(bundle))
+        reordered = dict(resourceType=bundle['resourceType'], type=bundle['type'], entry=bundle['entry'])
+        with tempfile.TemporaryDirectory() as tmpdir:
+            for data in (bundle, reordered):
+                json_fname = os.path.join(tmpdir, 'bundle.json')
+                with open(json_fname, 'w') as f:
+                    json.dump(data, f)
+                graphs = []
+                for stream in (False, True):
+                    ids = itertools.count()
+                    with patch('fhirtordf.loaders.fhirresourceloader.uuid4', lambda: "id{}".format(next(ids))):
+                        graphs.append(fhir_json_to_rdf(json_fname, metavoc=self.fhir_ontology, node_ids='path',
+                                                       target_graph=Graph(), stream=stream))
+                expected, streamed = graphs
+                self.assertEqual(727, len(expected))
+                self.assertEqual(set(expected), set(streamed))
+                self.assertEqual(len(bundle['entry']), len(list(streamed.subjects(RDF.type, OWL.Ontology))))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,55 @@
+import io
+import os
+import unittest
+
+from rdflib import BNode
+
+from tests.utils import test_data_directory
+
+
+class NodeIdsTestCase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        from tests.utils.base_test_case import FHIRGraph
+        cls.fhir_ontology = FHIRGraph()
+
+    def convert(self, fname: str, **kwargs):
+        from fhirtordf.loaders.fhirjsonloader import fhir_json_to_rdf
+        return fhir_json_to_rdf(os.path.join(test_data_directory, fname), metavoc=self.fhir_ontology, **kwargs)
+
+    def nt(self, fname: str, node_ids: str) -> str:
+        out = io.StringIO()
+        self.convert(fname, sink=out, node_ids=node_ids)
+        return out.getvalue()
+
+    def test_path_ids(self):
+        from fhirtordf.rdfsupport.rdfcompare import skolemize
+
+        for fname in ('patient-example.json', 'observation-example-f001-glucose.json', 'account-example.json'):
+            expected = set(skolemize(self.convert(fname)))
+            g = self.convert(fname, node_ids='path')
+            self.assertFalse(any(isinstance(n, BNode) for t in g for n in t), fname)
+            self.assertEqual(expected, set(g), fname)
+            self.assertEqual(self.nt(fname, 'path'), self.nt(fname, 'path'))
+
+    def test_counter_ids(self):
+        from rdflib.compare import to_isomorphic
+
+        fname = 'observation-example-f001-glucose.json'
+        first = self.nt(fname, 'counter')
+        self.assertEqual(first, self.nt(fname, 'counter'))
+        self.assertIn('_:n', first)
+        self.assertEqual(to_isomorphic(self.convert(fname)), to_isomorphic(self.convert(fname, node_ids='counter')))
+
+        # Two resources in one graph don't share nodes
+        g = self.convert(fname, node_ids='counter')
+        n = len(g)
+        self.convert('observation-example-bmd.json', target_graph=g, node_ids='counter')
+        self.assertEqual(n + len(self.convert('observation-example-bmd.json', node_ids='counter')), len(g))
+
+        with self.assertRaises(ValueError):
+            self.convert(fname, node_ids='random')
+
+
+if __name__ == '__main__':
+    unittest.main()
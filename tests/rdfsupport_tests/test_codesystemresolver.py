@@ -0,0 +1,91 @@
+import unittest
+
+from rdflib import URIRef, Namespace
+
+
+class CodeSystemResolverTestCase(unittest.TestCase):
+    def test_resolution(self):
+        from fhirtordf.rdfsupport.codesystemresolver import CodeSystemResolver
+
+        def gen(name):
+            return lambda system, code, nsmap: URIRef(name + ':' + code)
+
+        r = CodeSystemResolver()
+        exact, short, long, lower = gen('exact'), gen('short'), gen('long'), gen('lower')
+        r.register("http://example.org/cs", exact)
+        r.register_prefix("http://example.org/", short)
+        r.register_prefix("http://example.org/cs/v3", long)
+        r.register_prefix("http://lower.org/", lower, r"[a-z-]")
+
+        self.assertIs(exact, r.generator("http://example.org/cs"))
+        self.assertIs(short, r.generator("http://example.org/cs/v2"))
+        self.assertIs(long, r.generator("http://example.org/cs/v3"))
+        self.assertIs(long, r.generator("http://example.org/cs/v3-ActCode"))
+        self.assertIs(short, r.generator("http://example.org/"))
+        self.assertIs(lower, r.generator("http://lower.org/code-system"))
+        self.assertIsNone(r.generator("http://lower.org/CodeSystem"))
+        self.assertIsNone(r.generator("http://lower.org/"))
+        self.assertIsNone(r.generator("http://example.com/"))
+        self.assertEqual(URIRef('long:a%20b'), r.type_uri("http://example.org/cs/v3", "a b", dict()))
+        self.assertIsNone(r.type_uri("urn:oid:1.2.3", "a", dict()))
+
+        # Registration takes effect for systems that were already resolved
+        r.register_prefix("http://lower.org/C", exact)
+        self.assertIs(exact, r.generator("http://lower.org/CodeSystem"))
+        r.register("http://example.org/cs/v3", short)
+        self.assertEqual(URIRef('short:a%20b'), r.type_uri("http://example.org/cs/v3", "a b", dict()))
+
+    def test_caches(self):
+        from fhirtordf.rdfsupport.codesystemresolver import CodeSystemResolver
+
+        calls = []
+
+        def gen(system, code, nsmap):
+            calls.append(code)
+            nsmap.setdefault('ex', Namespace(system + '/'))
+            return URIRef(system + '/' + code) if code.isdigit() else None
+
+        r = CodeSystemResolver(max_systems=2, max_codes=3)
+        r.register_prefix("http://example.org/", gen)
+        for _ in range(3):
+            nsmap = dict(ex=Namespace("http://other.org/"))
+            self.assertEqual(URIRef("http://example.org/1/17"), r.type_uri("http://example.org/1", "17", nsmap))
+            self.assertEqual(Namespace("http://other.org/"), nsmap['ex'])
+            nsmap = dict()
+            self.assertIsNone(r.type_uri("http://example.org/1", "x", nsmap))
+            self.assertEqual(dict(ex=Namespace("http://example.org/1/")), nsmap)
+        self.assertEqual(['17', 'x'], calls)
+        self.assertEqual((4, 2), (r.hits, r.misses))
+
+        # Both caches are bounded
+        for i in range(5):
+            r.type_uri("http://example.org/{}".format(i), "1", dict())
+        self.assertEqual(2, len(r._decisions))
+        self.assertLessEqual(len(r._codes), 3)
+        r.clear_cache()
+        self.assertEqual((0, 0), (r.hits, r.misses))
+
+    def test_fhir_systems(self):
+        from fhirtordf.loaders.fhirresourceloader import codesystem_resolver
+        from fhirtordf.rdfsupport.namespaces import LOINC, SNOMEDCT
+
+        nsmap = dict()
+        self.assertEqual(LOINC['8867-4'], codesystem_resolver.type_uri("http://loinc.org", "8867-4", nsmap))
+        self.assertEqual(SNOMEDCT['36629006'],
+                         codesystem_resolver.type_uri("http://snomed.info/sct", "36629006", nsmap))
+        self.assertIsNone(codesystem_resolver.type_uri("http://snomed.info/sct", "abc", nsmap))
+        self.assertEqual(URIRef("http://terminology.hl7.org/CodeSystem/v3-ActCode/AMB"),
+                         codesystem_resolver.type_uri("http://terminology.hl7.org/CodeSystem/v3-ActCode", "AMB",
+                                                      nsmap))
+        self.assertEqual(URIRef("http://hl7.org/fhir/v2/0203/MR"),
+                         codesystem_resolver.type_uri("http://hl7.org/fhir/v2/0203", "MR", nsmap))
+        self.assertEqual(URIRef("http://hl7.org/fhir/observation-category/vital-signs"),
+                         codesystem_resolver.type_uri("http://hl7.org/fhir/observation-category", "vital-signs",
+                                                      nsmap))
+        self.assertIsNone(codesystem_resolver.type_uri("http://hl7.org/fhir/ObservationCategory", "x", nsmap))
+        self.assertEqual({'loinc', 'sct', 'v3-http://terminology.hl7.org/CodeSystem/v3-ActCode', 'v2-0203',
+                          'observation-category'}, set(nsmap.keys()))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,57 @@
+import io
+import unittest
+
+from rdflib import Graph, URIRef, Literal, BNode, XSD, ConjunctiveGraph
+from rdflib.compare import to_isomorphic
+
+from fhirtordf.rdfsupport.namespaces import FHIR
+
+
+class NTriplesTestCase(unittest.TestCase):
+    def test_terms(self):
+        from fhirtordf.rdfsupport.ntriples import nt_term, nt_statement, ascii_escape
+
+        self.assertEqual('<http://hl7.org/fhir/Patient/f001>', nt_term(URIRef("http://hl7.org/fhir/Patient/f001")))
+        self.assertEqual('<http://example.org/a\\u0020b\\u003Cc\\u003E>', nt_term(URIRef("http://example.org/a b<c>")))
+        self.assertEqual('"Line 1\\nLine 2 \\"quoted\\" C:\\\\"', nt_term(Literal('Line 1\nLine 2 "quoted" C:\\')))
+        self.assertEqual('"chat"@fr', nt_term(Literal("chat", lang="fr")))
+        self.assertEqual('"17"^^<http://www.w3.org/2001/XMLSchema#integer>', nt_term(Literal(17)))
+        self.assertEqual('_:b1', nt_term(BNode('b1')))
+        self.assertEqual('<http://a> <http://b> "c" <http://g> .\n',
+                         nt_statement((URIRef("http://a"), URIRef("http://b"), Literal("c")), URIRef("http://g")))
+        self.assertEqual('"Gr\\u00FC\\u00DFe \\U0001F600"', ascii_escape('"Grüße \U0001F600"'))
+
+    def test_writer(self):
+        from fhirtordf.rdfsupport.triplesink import WriterSink
+
+        triples = [(URIRef("http://example.org/p/" + str(i)), FHIR.Patient.name,
+                    Literal('Zoë "{}"\n\t\\x'.format(i))) for i in range(25)]
+        triples.append((BNode(), FHIR.nodeRole, FHIR.treeRoot))
+        triples.append((URIRef("http://example.org/p/1"), FHIR.Patient.birthDate,
+                        Literal("1944-11-17", datatype=XSD.date)))
+        expected = Graph()
+        [expected.add(t) for t in triples]
+
+        for ascii_only in (False, True):
+            out = io.StringIO()
+            sink = WriterSink(out, ascii_only=ascii_only, buffer_size=10)
+            [sink.add(t) for t in triples]
+            self.assertEqual(20, out.getvalue().count('\n'))
+            sink.close()
+            self.assertEqual(ascii_only, out.getvalue().isascii())
+            g = Graph()
+            g.parse(data=out.getvalue(), format="nt")
+            self.assertEqual(to_isomorphic(expected), to_isomorphic(g))
+
+        out = io.StringIO()
+        sink = WriterSink(out, graph_name=URIRef("http://example.org/graph"))
+        [sink.add(t) for t in triples]
+        sink.close()
+        g = ConjunctiveGraph()
+        g.parse(data=out.getvalue(), format="nquads")
+        self.assertEqual({URIRef("http://example.org/graph")}, {c.identifier for c in g.contexts()})
+        self.assertEqual(to_isomorphic(expected), to_isomorphic(g.get_context(URIRef("http://example.org/graph"))))
+
+
+if __name__ == '__main__':
+    unittest.main()
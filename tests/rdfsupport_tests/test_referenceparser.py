@@ -0,0 +1,58 @@
+import unittest
+
+from fhirtordf.rdfsupport.fhirresourcere import FHIR_RESOURCE_RE, FHIR_RE_BASE, FHIR_RE_RESOURCE, FHIR_RE_ID, \
+    FHIR_RE_VERSION
+from fhirtordf.rdfsupport.referenceparser import ReferenceParser, FHIRReference
+
+
+class ReferenceParserTestCase(unittest.TestCase):
+    references = ["http://fhir.org/hl7/Patient/sample12345", "http://fhir.org/hl7/Patient", "Account/example",
+                  "Account", "http://fhir.org/hl7/Zatient/sample12345",
+                  "http://fhir.org/hl7/Patient/sample12345/_history/3", "http://fhir.org/hl7/Patient/sample_12345",
+                  "http://fhir.org/hl7/Patient/" + 'a' * 64, "http://fhir.org/hl7/Patient/" + 'a' * 65,
+                  "Patient/p1/_history/" + 'a' * 65, "Patient/p1/_history/", "Patient/p1/_history/a/b",
+                  "Patient/p1/_history/2/_history/3", "https://example.org:8080/a%20b/$x/Patient/p1",
+                  "http://Patient/p1", "http:///Observation/o.1-2", "http:/Patient/p1", "ftp://example.org/Patient/p1",
+                  "xhttp://example.org/Patient/p1", "/Patient/p1", "http://example.org/a b/Patient/p1",
+                  "http://example.org/_a/Patient/p1", "Patient/", "/", "", "#p1", "urn:uuid:1234",
+                  "Patient/p1/", "http://example.org/Patient/p1/_history/v1.2"]
+
+    def test_same_as_re(self):
+        parser = ReferenceParser()
+        for ref in self.references:
+            m = FHIR_RESOURCE_RE.match(ref)
+            expected = FHIRReference(m.group(FHIR_RE_BASE), m.group(FHIR_RE_RESOURCE), m.group(FHIR_RE_ID),
+                                     m.group(FHIR_RE_VERSION)) if m else None
+            self.assertEqual(expected, parser.parse(ref), ref)
+
+    def test_memo(self):
+        parser = ReferenceParser(['Patient'], max_size=2)
+        self.assertEqual(FHIRReference(None, 'Patient', 'p1', None), parser.parse('Patient/p1'))
+        self.assertIsNone(parser.parse('Observation/o1'))
+        self.assertIs(parser.parse('Patient/p1'), parser.parse('Patient/p1'))
+        self.assertEqual((2, 2), (parser.hits, parser.misses))
+        self.assertEqual([FHIRReference('http://example.org/', 'Patient', 'p2', '1'), None,
+                          FHIRReference(None, 'Patient', 'p1', None)],
+                         parser.parse_all(['http://example.org/Patient/p2/_history/1', 'Patient', 'Patient/p1']))
+        self.assertLessEqual(len(parser._parsed), 2)
+        parser.clear()
+        self.assertEqual((0, 0), (parser.hits, parser.misses))
+
+    def test_vocabulary_types(self):
+        from tests.utils.base_test_case import FHIRGraph
+        from fhirtordf.fhir.fhirmetavoc import FHIRSchema
+
+        schema = FHIRSchema(FHIRGraph())
+        self.assertIn('Patient', schema.resource_types)
+        self.assertNotIn('DomainResource', schema.resource_types)
+        self.assertNotIn('HumanName', schema.resource_types)
+        self.assertIs(schema.reference_parser, schema.reference_parser)
+
+        # A resource type that isn't in the STU3 list
+        ref = "http://example.org/fhir/MedicationKnowledge/mk1"
+        self.assertIsNone(FHIR_RESOURCE_RE.match(ref))
+        self.assertEqual('MedicationKnowledge', schema.reference_parser.parse(ref).resource_type)
+
+
+if __name__ == '__main__':
+    unittest.main()
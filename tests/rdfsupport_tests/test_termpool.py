@@ -0,0 +1,101 @@
+import unittest
+from decimal import Decimal
+
+from rdflib import Literal, URIRef, XSD
+
+
+class TermPoolTestCase(unittest.TestCase):
+    def test_pool(self):
+        from fhirtordf.rdfsupport.termpool import TermPool
+
+        pool = TermPool(max_size=3, max_index=10)
+        self.assertIs(pool.index(3), pool.index(3))
+        self.assertEqual(Literal(3), pool.index(3))
+        self.assertEqual(Literal(12), pool.index(12))
+        self.assertEqual((3, 1), (pool.hits, pool.misses))
+        pool.clear()
+
+        d = pool.literal("2017-03-21", XSD.date)
+        self.assertEqual(Literal("2017-03-21", datatype=XSD.date), d)
+        self.assertIs(d, pool.literal("2017-03-21", XSD.date))
+        self.assertIsNot(d, pool.literal("2017-03-21"))
+        self.assertEqual(Literal(True), pool.literal(True))
+        self.assertEqual(Literal(1), pool.literal(1))
+        self.assertEqual(2, pool.size)
+
+        u = pool.uri("http://hl7.org/fhir/Patient/example")
+        self.assertIsInstance(u, URIRef)
+        self.assertIs(u, pool.uri("http://hl7.org/fhir/Patient/example"))
+        self.assertIs(u, pool.uri("http://hl7.org/fhir/Patient/example"))
+        self.assertEqual(3, pool.size)
+        self.assertEqual((3, 3), (pool.hits, pool.misses))
+        self.assertEqual(0.5, pool.hit_rate)
+        self.assertEqual("3 terms, 3 hits, 3 misses (50.0% hit rate)", str(pool))
+
+        # A full table is emptied rather than grown
+        pool.literal("a")
+        pool.literal("b")
+        self.assertEqual(2, pool.size)
+
+        pool.clear()
+        self.assertEqual((0, 0, 0, 0.0), (pool.size, pool.hits, pool.misses, pool.hit_rate))
+
+    def test_conversion(self):
+        import os
+        from fhirtordf.loaders.fhirresourceloader import FHIRResource
+        from fhirtordf.rdfsupport.termpool import TermPool
+        from tests.utils import test_data_directory
+        from tests.utils.base_test_case import FHIRGraph
+
+        fhir_ontology = FHIRGraph()
+        save_pool = FHIRResource.term_pool
+        try:
+            FHIRResource.term_pool = TermPool()
+            fname = os.path.join(test_data_directory, 'observation-example-f001-glucose.json')
+            FHIRResource(fhir_ontology, fname, "http://hl7.org/fhir/")
+            misses = FHIRResource.term_pool.misses
+            self.assertTrue(misses > 0)
+            FHIRResource(fhir_ontology, fname, "http://hl7.org/fhir/")
+            self.assertEqual(misses, FHIRResource.term_pool.misses)
+        finally:
+            FHIRResource.term_pool = save_pool
+
+    def test_raw_literals(self):
+        from fhirtordf.rdfsupport.termpool import TermPool, raw_literal
+
+        lit = raw_literal("1.50", XSD.decimal)
+        self.assertEqual("1.50", str(lit))
+        self.assertEqual(XSD.decimal, lit.datatype)
+        self.assertIsNone(lit.value)
+        self.assertEqual(Literal("1.50", datatype=XSD.decimal, normalize=False), lit)
+        self.assertEqual('"1.50"^^<http://www.w3.org/2001/XMLSchema#decimal>', lit.n3())
+
+        pool = TermPool()
+        self.assertIs(pool.raw_literal(Decimal("1.50"), XSD.decimal), pool.raw_literal("1.50", XSD.decimal))
+        self.assertEqual("true", str(pool.raw_literal(True, XSD.boolean)))
+        self.assertEqual("2017-03-21T10:00:00+01:00", str(pool.raw_literal("2017-03-21T10:00:00+01:00", XSD.dateTime)))
+        self.assertEqual(Literal("text"), pool.raw_literal("text", None))
+
+    def test_raw_conversion(self):
+        from jsonasobj import loads
+        from fhirtordf.loaders.fhirresourceloader import FHIRResource
+        from fhirtordf.rdfsupport.namespaces import FHIR
+        from tests.utils.base_test_case import FHIRGraph
+
+        fhir_ontology = FHIRGraph()
+        json_text = """{"resourceType": "Observation", "id": "o1", "status": "final",
+                        "code": {"text": "glucose"},
+                        "effectiveDateTime": "2013-04-02T09:30:10+01:00",
+                        "valueQuantity": {"value": 6.30, "unit": "mmol/l"}}"""
+        for raw, expected in ((False, "6.3"), (True, "6.30")):
+            g = FHIRResource(fhir_ontology, None, "http://hl7.org/fhir/",
+                             loads(json_text, parse_float=Decimal) if raw else loads(json_text),
+                             raw_literals=raw).graph
+            values = {o for o in g.objects(None, FHIR.value) if isinstance(o, Literal) and o.datatype}
+            self.assertIn(Literal(expected, datatype=XSD.decimal, normalize=False), values)
+            self.assertIn(Literal("2013-04-02T09:30:10+01:00", datatype=XSD.dateTime), values)
+            self.assertEqual(raw, all(o.value is None for o in values))
+
+
+if __name__ == '__main__':
+    unittest.main()
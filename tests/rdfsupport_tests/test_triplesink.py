@@ -0,0 +1,110 @@
+import io
+import os
+import unittest
+
+from rdflib import Graph
+from rdflib.compare import to_isomorphic
+
+from fhirtordf.rdfsupport.triplesink import as_sink, TripleSink, GraphSink, CallableSink, GeneratorSink, WriterSink
+from tests.utils import test_data_directory
+
+
+class TripleSinkTestCase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        from tests.utils.base_test_case import FHIRGraph
+        cls.fhir_ontology = FHIRGraph()
+        cls.json_fname = os.path.join(test_data_directory, 'observation-example-f001-glucose.json')
+
+    def convert(self, **kwargs):
+        from fhirtordf.loaders.fhirjsonloader import fhir_json_to_rdf
+        return fhir_json_to_rdf(self.json_fname, metavoc=self.fhir_ontology, **kwargs)
+
+    def test_as_sink(self):
+        def consumer():
+            while True:
+                yield
+
+        g = Graph()
+        self.assertIsInstance(as_sink(g), GraphSink)
+        self.assertIs(g, as_sink(g).graph)
+        self.assertIsInstance(as_sink(list().append), CallableSink)
+        self.assertIsInstance(as_sink(consumer()), GeneratorSink)
+        self.assertIsInstance(as_sink(io.StringIO()), WriterSink)
+        sink = CallableSink(print)
+        self.assertIs(sink, as_sink(sink))
+        self.assertIsNone(sink.graph)
+        with self.assertRaises(TypeError):
+            as_sink(17)
+        with self.assertRaises(NotImplementedError):
+            TripleSink().add((None, None, None))
+
+    def test_sinks(self):
+        from fhirtordf.loaders.fhirresourceloader import FHIRResource
+
+        expected = to_isomorphic(self.convert())
+
+        triples = []
+        self.assertIsInstance(self.convert(sink=triples.append), CallableSink)
+        g = Graph()
+        [g.add(t) for t in triples]
+        self.assertEqual(expected, to_isomorphic(g))
+
+        def consumer(target: Graph):
+            while True:
+                target.add((yield))
+
+        g = Graph()
+        self.convert(sink=consumer(g))
+        self.assertEqual(expected, to_isomorphic(g))
+
+        out = io.StringIO()
+        self.convert(sink=out)
+        g = Graph()
+        g.parse(data=out.getvalue(), format="nt")
+        self.assertEqual(expected, to_isomorphic(g))
+
+        # Without a graph, the resource id comes from the JSON
+        triples = []
+        resource = FHIRResource(self.fhir_ontology, self.json_fname, "http://hl7.org/fhir/", target=triples.append)
+        self.assertIsNone(resource.graph)
+        self.assertEqual('f001', resource.resource_id)
+        self.assertEqual(len(expected), len(set(triples)))
+
+    def test_writer_target(self):
+        """ A writer that is passed as a target gets all of the output once the conversion is done """
+        from fhirtordf.loaders.fhircollectionloader import FHIRCollection
+        from fhirtordf.loaders.fhirresourceloader import FHIRResource
+
+        def parse(out: io.StringIO) -> Graph:
+            g = Graph()
+            g.parse(data=out.getvalue(), format="nt")
+            return g
+
+        out = io.StringIO()
+        FHIRResource(self.fhir_ontology, self.json_fname, "http://hl7.org/fhir/", target=out, node_ids='path')
+        expected = FHIRResource(self.fhir_ontology, self.json_fname, "http://hl7.org/fhir/", node_ids='path').graph
+        self.assertEqual(to_isomorphic(expected), to_isomorphic(parse(out)))
+
+        collection_fname = os.path.join(test_data_directory, 'smartonfhir_testdata', 'json', 'obs_sample.json')
+        base = "https://sb-fhir-dstu2.smarthealthit.org/api/smartdstu2/open/"
+        out = io.StringIO()
+        FHIRCollection(self.fhir_ontology, collection_fname, base, target=out, node_ids='path')
+        expected = Graph()
+        FHIRCollection(self.fhir_ontology, collection_fname, base, target=expected, node_ids='path')
+        self.assertEqual(to_isomorphic(expected), to_isomorphic(parse(out)))
+        triples = []
+        FHIRCollection(self.fhir_ontology, collection_fname, base, target=triples.append, node_ids='path')
+        self.assertEqual(len(triples), len(out.getvalue().splitlines()))
+
+        # A sink that is passed in is left for the caller to flush
+        out = io.StringIO()
+        sink = WriterSink(out)
+        FHIRCollection(self.fhir_ontology, collection_fname, base, target=sink, node_ids='path')
+        self.assertEqual('', out.getvalue())
+        sink.flush()
+        self.assertEqual(to_isomorphic(expected), to_isomorphic(parse(out)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -37,6 +37,34 @@ class JSONToRDFTestCase(unittest.TestCase, OutputRedirector):
             print(comp_result)
         self.assertTrue(len(comp_result) == 0)
 
+    def test_streaming_formats(self):
+        from fhirtordf.fhirtordf import main
+
+        test_directory = os.path.join(os.path.split(os.path.abspath(__file__))[0], '..', 'data')
+        infname = os.path.join(test_directory, "patient-example.json")
+        testfname = os.path.join(test_directory, "patient-example.ttl")
+        outfname = os.path.join(test_directory, "patient-example-out.nt")
+        test_graph = Graph()
+        test_graph.load(testfname, format="turtle")
+
+        args = "-i {} -o {} -s --format nt".format(infname, outfname)
+        self.assertTrue(main(args.split()))
+        with open(outfname) as f:
+            text = f.read()
+        os.remove(outfname)
+        self.assertTrue(text.isascii())
+        out_graph = Graph()
+        out_graph.parse(data=text, format="nt")
+        self.assertEqual('', rdf_compare(test_graph, out_graph, ignore_owl_version=True, ignore_type_arcs=True))
+
+        args = "-i {} --format nt11".format(infname)
+        output = self._push_stdout()
+        self.assertTrue(main(args.split()))
+        self._pop_stdout()
+        out_graph = Graph()
+        out_graph.parse(data=output.getvalue(), format="nt")
+        self.assertEqual('', rdf_compare(test_graph, out_graph, ignore_owl_version=True, ignore_type_arcs=True))
+
     def test_fhir_files(self):
         from fhirtordf.fhirtordf import main
 
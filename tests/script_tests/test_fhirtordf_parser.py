@@ -17,6 +17,9 @@ noargs_text = """usage: fhirtordf [-h] [-i [INFILE [INFILE ...]]] [-id INDIR]
                  [--fmvcache FMVCACHE] [--maxsize MAXSIZE]
                  [-sd [SKIPDIRS [SKIPDIRS ...]]] [-sf [SKIPFNS [SKIPFNS ...]]]
                  [--format {json-ld,n3,nt,nt11,ntriples,pretty-xml,trig,ttl,turtle,xml}]
+                 [-rl] [-ni {counter,path}] [-w WORKERS] [-st] [--stats]
+                 [--statsjson STATSJSON] [--diagnostics]
+                 [--diagnosticsjson DIAGNOSTICSJSON]
 fhirtordf: error: Either an input file or an input directory must be supplied
 """
 
@@ -26,6 +29,9 @@ help_text = f"""usage: fhirtordf [-h] [-i [INFILE [INFILE ...]]] [-id INDIR]
                  [--fmvcache FMVCACHE] [--maxsize MAXSIZE]
                  [-sd [SKIPDIRS [SKIPDIRS ...]]] [-sf [SKIPFNS [SKIPFNS ...]]]
                  [--format {{json-ld,n3,nt,nt11,ntriples,pretty-xml,trig,ttl,turtle,xml}}]
+                 [-rl] [-ni {{counter,path}}] [-w WORKERS] [-st] [--stats]
+                 [--statsjson STATSJSON] [--diagnostics]
+                 [--diagnosticsjson DIAGNOSTICSJSON]
 
 Convert FHIR JSON into RDF
 
@@ -63,6 +69,21 @@ optional arguments:
                         Skip file names containing text
   --format {{json-ld,n3,nt,nt11,ntriples,pretty-xml,trig,ttl,turtle,xml}}
                         Output format (default: turtle)
+  -rl, --rawliterals    Keep the JSON lexical form of typed literals
+  -ni {{counter,path}}, --nodeids {{counter,path}}
+                        Identify value nodes by a counter or by their FHIR
+                        path
+  -w WORKERS, --workers WORKERS
+                        Convert bundle entries in this many worker processes
+  -st, --stream         Convert bundle entries as they are parsed. Turns off
+                        --maxsize
+  --stats               Print conversion statistics on stderr
+  --statsjson STATSJSON
+                        Write conversion statistics to this file as JSON
+  --diagnostics         Print the parts of the input that were skipped or
+                        dropped on stderr
+  --diagnosticsjson DIAGNOSTICSJSON
+                        Write the diagnostics to this file as JSON
 """
 
 save_sample_output = False           # True means create a fres text copy for sample patient
@@ -17,3 +17,4 @@ else:
 
 SKIP_CONTINUATION_TESTS = True          # Skip the continuation test (takes a lot of time)
 SKIP_ALL_FHIR_ELEMENTS = True           # Skip the fhir server tests (takes a really big lot of time)
+SKIP_BENCHMARKS = True                  # Skip the timing comparisons